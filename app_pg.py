@@ -4,26 +4,93 @@ import plotly.express as px
 import plotly.graph_objects as go
 import streamlit as st
 from dotenv import load_dotenv
-
-from src.db import ENGINE
-from src.models.survival import dwell_label, fit_km
-from src.models.timeseries import starts_per_minute, prophet_forecast
+from sqlalchemy.exc import ProgrammingError
+
+from src import metrics
+from src.concurrency import concurrent_viewers
+from src.kpi_state import fetch_kpis
+from src.event_cache import EventCache, postgres_source, CACHE_ID_OVERLAP
+from src.panels import PANELS, load as load_panel_df, ts_datetime, window_sec
+from src.rollups import ROLLUPS, DISTINCT_MODE, load_rollup, distinct_viewers
+from src.models.survival import IncrementalKM
+from src.models.forecast_service import ForecastService
+from src.models.batch_forecast import load_forecasts
 
 load_dotenv()
+KPI_STATE_URL = os.getenv("KPI_STATE_URL", "")  # consumer's /kpis; empty = compute in SQL
 st.set_page_config(page_title="Real-Time Viewer Dashboard (Kafka → Postgres)", layout="wide")
 st.title("Real-Time Viewer Behavior")
 
+@st.cache_resource
+def metrics_server():
+    # /metrics on the dashboard port for the whole Streamlit process (PROFILE_SAMPLE adds cProfile dumps)
+    return metrics.start("dashboard")
+
+metrics_server()
+
+@st.cache_resource
+def event_cache():
+    # raw-projection panels share one process-wide delta cache (src/event_cache.py)
+    horizon = max(window_sec(p) for p in PANELS.values() if p.columns and p.cached)
+    return EventCache(postgres_source(), horizon_sec=horizon, overlap=CACHE_ID_OVERLAP)
+
+@st.cache_resource
+def survival_km():
+    # bootstrapped once from SQL up to the cache's watermark, then fed every new batch; batches
+    # another session's refresh delivers before the bootstrap lands are held and merged into it
+    cache = event_cache()
+    cache.refresh()
+    km = IncrementalKM(window_sec=window_sec(PANELS["session_events"]))
+    km.hold()
+    watermark = cache.subscribe(km.observe_cols)
+    boot = load_panel_df("session_events", max_id=watermark)
+    km.bootstrap(boot["ts"].to_numpy(), boot["viewer_id"].to_numpy(), boot["event_type"].astype(object).to_numpy())
+    return km
+
+@st.cache_resource
+def forecast_service():
+    # one background Prophet worker per process, shared by all sessions
+    return ForecastService()
+
+@st.cache_data(ttl=3)
+def load_agg_panel(name):
+    return load_panel_df(name)
+
+def load_panel(name):
+    # each panel fetches only its own window/columns/aggregate (src/panels.py)
+    panel = PANELS[name]
+    if not panel.columns:
+        return load_agg_panel(name)
+    cache = event_cache()
+    cache.refresh()
+    return cache.frame(window_sec(panel), columns=panel.columns)
+
 @st.cache_data(ttl=3)
-def load_events():
-    # last 24h from Postgres
-    return pd.read_sql(
-        "SELECT * FROM events WHERE ts > now() - interval '24 hours'",
-        ENGINE,
-        parse_dates=['ts']
-    )
-
-df = load_events()
-if df.empty:
+def load_eps_rollup():
+    # per-second counts (last 5 min) maintained by the consumer
+    return load_rollup("second", "5 minutes", columns=("events",)).rename(columns={"bucket": "sec"})
+
+@st.cache_data(ttl=30)
+def load_spm_rollup():
+    # starts per minute (last 24h), tz-naive for Prophet
+    spm = load_rollup("minute", "24 hours", columns=("starts",)).rename(columns={"bucket": "ts"})
+    spm["ts"] = spm["ts"].dt.tz_convert(None)
+    return spm
+
+@st.cache_data(ttl=60)
+def load_batch_forecasts():
+    try:
+        return load_forecasts()
+    except ProgrammingError:
+        return pd.DataFrame()   # forecasts table not created yet
+
+@st.cache_data(ttl=10)
+def load_top_countries_hll():
+    # unique viewers per country (last 15 min) from merged minute sketches
+    top = distinct_viewers("15 minutes", "country").head(10)
+    return top.rename(columns={"key": "country", "viewers": "active_viewers"})
+
+if load_panel("recent")["any"].iloc[0] != "t":
     st.info("No data yet. Start the Kafka producer & consumer to load events.")
     st.stop()
 
@@ -33,21 +100,17 @@ tab_live, tab_surv, tab_fore = st.tabs(["Live Metrics", "Survival (Python)", "Fo
 
 # LIVE METRICS
 with tab_live:
-    # KPIs
-    last_min = now - pd.Timedelta(seconds=60)
-    active = df[df["ts"] >= last_min]["viewer_id"].nunique()
-
-    last_10s = now - pd.Timedelta(seconds=10)
-    eps = len(df[df["ts"] >= last_10s]) / 10.0
-
-    # dwell (30m window)
-    win = df[df["ts"] >= (now - pd.Timedelta(minutes=30))].sort_values("ts")
-    starts = win[win["event_type"] == "view_start"].groupby("viewer_id")["ts"].min()
-    ends   = win[win["event_type"] == "view_end"].groupby("viewer_id")["ts"].max()
-    aligned = pd.concat([starts.rename("start"), ends.rename("end")], axis=1)
-    aligned["end"] = aligned["end"].fillna(now)
-    aligned["dwell_sec"] = (aligned["end"] - aligned["start"]).dt.total_seconds().clip(lower=0)
-    avg_dwell = aligned["dwell_sec"].mean() if len(aligned) else 0.0
+    # KPIs (incremental state from the consumer when available)
+    snap = fetch_kpis(KPI_STATE_URL)
+    if snap is not None:
+        active = snap["active_viewers"]
+        eps = snap["events_per_sec"]
+        avg_dwell = snap["avg_dwell_min"] * 60
+    else:
+        k = load_panel("kpis").iloc[0]
+        active = int(k["active"])
+        eps = k["last_10s"] / 10.0
+        avg_dwell = 0.0 if pd.isna(k["dwell"]) else k["dwell"]   # 30m window, seconds
 
     c1, c2, c3 = st.columns(3)
     c1.metric("Concurrent (≈60s)", f"{active:,}")
@@ -55,78 +118,104 @@ with tab_live:
     c3.metric("Avg dwell (30m)", f"{avg_dwell/60:.1f} min")
 
     # EPS chart (5 min)
-    five = df[df["ts"] >= (now - pd.Timedelta(minutes=5))].copy()
-    if not five.empty:
-        five["sec"] = five["ts"].dt.floor("s")  # lower-case 's'
-        ts_counts = five.groupby("sec")["id"].count().reset_index(name="events")
+    if ROLLUPS:
+        ts_counts = load_eps_rollup()
+    else:
+        ts_counts = load_panel("eps")
+        ts_counts["sec"] = pd.to_datetime(ts_counts["sec"], unit="s", utc=True)
+    if not ts_counts.empty:
         st.plotly_chart(px.line(ts_counts, x="sec", y="events", title="Events/sec (last 5 min)"),
                         width="stretch")
 
     # Concurrency (15 min)
-    fifteen = df[df["ts"] >= (now - pd.Timedelta(minutes=15))].copy()
+    fifteen = load_panel("concurrency")
     if not fifteen.empty:
-        start = fifteen["ts"].min().floor("s")
-        end   = now.ceil("s")
-        timeline = pd.date_range(start, end, freq="s")  # lower-case 's'
-        conc = pd.DataFrame({"sec": timeline})
-        conc["concurrent"] = [
-            fifteen[fifteen["ts"] >= (t - pd.Timedelta(seconds=60))]["viewer_id"].nunique()
-            for t in timeline
-        ]
+        with metrics.profiled("dashboard_concurrency"):
+            conc = concurrent_viewers(fifteen.assign(ts=ts_datetime(fifteen["ts"])), now)
         st.plotly_chart(px.line(conc, x="sec", y="concurrent", title="Concurrent viewers (rolling 60s)"),
                         width="stretch")
 
     # Top countries
-    if not fifteen.empty:
-        top = (fifteen.groupby("country")["viewer_id"]
-               .nunique().sort_values(ascending=False).head(10)
-               .reset_index(name="active_viewers"))
+    if snap is not None:
+        top = pd.DataFrame(snap["countries"], columns=["country", "active_viewers"])
+    elif ROLLUPS and DISTINCT_MODE == "hll":
+        top = load_top_countries_hll()
     else:
-        top = pd.DataFrame(columns=["country", "active_viewers"])
+        top = load_panel("countries").rename(columns={"viewers": "active_viewers"})
     st.subheader("Top Countries (unique, last 15 min)")
     st.dataframe(top, use_container_width=True)
 
 # SURVIVAL
 with tab_surv:
     st.markdown("**Kaplan–Meier survival** of dwell duration (last 24h).")
-    dwell_df = dwell_label(df[["ts", "viewer_id", "event_type"]].copy(), now=now)
+    with metrics.profiled("dashboard_survival"):
+        event_cache().refresh()   # feeds new session events into the estimator
+        sf, n, churned, censored = survival_km().curve(now.timestamp())
 
-    if dwell_df.empty:
+    if n < 3:
         st.info("Not enough data yet to compute survival.")
     else:
-        km, sf = fit_km(dwell_df)  # returns (None, None) if not enough clean data
-        if km is None or sf is None or sf.empty:
-            st.info("Not enough clean dwell data yet to fit a survival curve.")
-        else:
-            fig = px.line(sf, x="sec", y="survival", title="Survival curve (probability still engaged)")
-            fig.update_layout(yaxis=dict(range=[0, 1]))
-            st.plotly_chart(fig, width="stretch")
-            st.caption(
-                f"N={len(dwell_df)} viewers • "
-                f"churned={int(dwell_df['churned'].sum())} • "
-                f"censored={int((1 - dwell_df['churned']).sum())}"
-            )
+        fig = px.line(sf, x="sec", y="survival", title="Survival curve (probability still engaged)",
+                      line_shape="hv")
+        fig.update_layout(yaxis=dict(range=[0, 1]))
+        st.plotly_chart(fig, width="stretch")
+        st.caption(f"N={n} sessions • churned={churned} • censored={censored}")
 
 # FORECAST
 with tab_fore:
     st.markdown("**Starts per minute** as a CTR-like proxy, with simple forecast.")
-    spm = starts_per_minute(df)
+    if ROLLUPS:
+        spm = load_spm_rollup()
+    else:
+        spm = load_panel("starts_per_minute")
+        spm = pd.DataFrame({"ts": pd.to_datetime(spm["minute"], unit="s"), "starts": spm["starts"]})
     if spm.empty or len(spm) < 10:
         st.info("Not enough starts to build a forecast yet.")
     else:
         fig = go.Figure()
         fig.add_trace(go.Scatter(x=spm["ts"], y=spm["starts"], mode="lines", name="Observed"))
 
-        try:
-            fc = prophet_forecast(spm, periods=60)  # forecast next 60 minutes
-            fig.add_trace(go.Scatter(x=fc["ds"], y=fc["yhat"], mode="lines", name="Forecast"))
+        # fitted in the background; this run only reads the cached frame (next 60 minutes)
+        svc = forecast_service()
+        with metrics.profiled("dashboard_forecast"):
+            svc.update(spm)
+            fc, kind = svc.forecast()
+        if not fc.empty:
+            name = "Forecast" if kind == "prophet" else "Forecast (Holt smoothing)"
+            fig.add_trace(go.Scatter(x=fc["ds"], y=fc["yhat"], mode="lines", name=name))
             fig.add_trace(go.Scatter(
                 x=pd.concat([fc["ds"], fc["ds"][::-1]]),
                 y=pd.concat([fc["yhat_upper"], fc["yhat_lower"][::-1]]),
                 fill="toself", line=dict(width=0), name="Forecast interval", opacity=0.2
             ))
-        except ImportError:
-            st.warning("Prophet not installed; showing observed only. `pip install prophet` to enable forecast.")
+        if svc.error:
+            st.warning("Prophet not installed; showing Holt smoothing. `pip install prophet` to enable it.")
 
         fig.update_layout(title="Starts/min (observed & forecast)", xaxis_title="Time", yaxis_title="Starts")
         st.plotly_chart(fig, width="stretch")
+
+    # per-country / per-video forecasts written by `python -m src.models.batch_forecast`
+    st.subheader("Next hour by country / video")
+    batch = load_batch_forecasts()
+    if batch.empty:
+        st.caption("No batch forecasts yet; run `python -m src.models.batch_forecast`.")
+    else:
+        dim = st.radio("Series", ["country", "video"], horizontal=True)
+        sub = batch[batch["dim"] == dim]
+        with metrics.profiled("dashboard_batch_forecast"):
+            totals = (sub.groupby("key")["yhat"].sum().clip(lower=0).round().astype(int)
+                         .sort_values(ascending=False).reset_index(name="starts_next_hour"))
+        key = st.selectbox(dim, totals["key"])
+        one = sub[sub["key"] == key]
+        fig = go.Figure()
+        fig.add_trace(go.Scatter(x=one["ds"], y=one["yhat"], mode="lines", name="Forecast"))
+        fig.add_trace(go.Scatter(
+            x=pd.concat([one["ds"], one["ds"][::-1]]),
+            y=pd.concat([one["yhat_upper"], one["yhat_lower"][::-1]]),
+            fill="toself", line=dict(width=0), name="Forecast interval", opacity=0.2
+        ))
+        fig.update_layout(title=f"Starts/min forecast: {dim} {key}", xaxis_title="Time", yaxis_title="Starts")
+        st.plotly_chart(fig, width="stretch")
+        st.dataframe(totals, use_container_width=True)
+        st.caption(f"fitted {sub['fitted_at'].max():%H:%M:%S} UTC • {len(totals)} series "
+                   f"• sparse keys pooled into '(other)'")
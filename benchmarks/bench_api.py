@@ -0,0 +1,137 @@
+# benchmarks/bench_api.py
+# API throughput: the async asyncpg endpoints (src/api.py) vs the previous synchronous
+# pandas endpoints (read_sql of SELECT * + DataFrame aggregation, reproduced below).
+# Both apps are served by uvicorn in their own process and hit with --concurrency clients.
+#   python -m benchmarks.bench_api --fill 30 --seconds 10 --concurrency 50      (needs Postgres)
+# --fill simulates N minutes of producer traffic ending now and COPYs it into events.
+import argparse, asyncio, os, random, subprocess, sys, time
+from datetime import datetime, timedelta, timezone
+
+import httpx
+import numpy as np
+
+ENDPOINTS = ("/kpis", "/countries", "/concurrency")
+
+
+def baseline_app():
+    import pandas as pd
+    from fastapi import FastAPI
+    from src.db import ENGINE
+    from src.concurrency import concurrent_viewers
+
+    app = FastAPI()
+
+    @app.get("/kpis")
+    def kpis():
+        df = pd.read_sql("SELECT * FROM events WHERE ts > now() - interval '30 minutes'", ENGINE, parse_dates=["ts"])
+        now = pd.Timestamp.now(tz="UTC")
+        active = df[df["ts"] >= now - pd.Timedelta(seconds=60)]["viewer_id"].nunique()
+        eps = len(df[df["ts"] >= now - pd.Timedelta(seconds=10)]) / 10.0
+        starts = df[df.event_type == "view_start"].groupby("viewer_id")["ts"].min()
+        ends = df[df.event_type == "view_end"].groupby("viewer_id")["ts"].max()
+        aligned = pd.concat([starts.rename("start"), ends.rename("end")], axis=1)
+        aligned["end"] = aligned["end"].fillna(now)
+        dwell = aligned["end"] - aligned["start"]
+        avg_dwell_min = (dwell.dt.total_seconds().clip(lower=0).mean() or 0) / 60
+        return {"active_viewers": int(active), "events_per_sec": round(eps, 2), "avg_dwell_min": round(avg_dwell_min, 2)}
+
+    @app.get("/concurrency")
+    def concurrency():
+        df = pd.read_sql("SELECT * FROM events WHERE ts > now() - interval '15 minutes'", ENGINE, parse_dates=["ts"])
+        if df.empty: return []
+        conc = concurrent_viewers(df, pd.Timestamp.now(tz="UTC"))
+        return [{"sec": t.isoformat(), "concurrent": int(c)} for t, c in zip(conc["sec"], conc["concurrent"])]
+
+    @app.get("/countries")
+    def countries():
+        df = pd.read_sql("SELECT * FROM events WHERE ts > now() - interval '15 minutes'", ENGINE, parse_dates=["ts"])
+        if df.empty: return []
+        top = df.groupby("country")["viewer_id"].nunique().sort_values(ascending=False).head(10)
+        return [{"country": c, "active_viewers": int(v)} for c, v in top.items()]
+
+    return app
+
+
+def fill(minutes: int):
+    """Simulate `minutes` of producer traffic ending now on a virtual clock and COPY it in."""
+    from src import kafka_producer as kp, wire
+    from src.db import ENGINE, EVENTS_TABLE, KEYED, ensure_schema
+    from src.writers import make_writer
+    ensure_schema()
+    random.seed(0)
+    kp.reset()
+    values = []
+    kp.sink, kp.WIRE_FORMAT = values.append, "binary"
+    t = datetime.now(timezone.utc) - timedelta(minutes=minutes)
+    for _ in range(minutes * 60):
+        kp.maybe_start_new_sessions(t)
+        kp.advance_heartbeats_and_ends(t)
+        t += timedelta(seconds=1)
+    cols, _ = wire.decode_batch(values)
+    rows = wire.to_rows(cols)
+    make_writer("copy", ENGINE, table=EVENTS_TABLE, keyed=KEYED).write(rows)
+    print(f"inserted {len(rows):,} events over the last {minutes} min")
+
+
+def start(app_path: str, port: int, factory: bool):
+    # exact COUNT(DISTINCT) countries on both sides so responses are comparable
+    env = {**os.environ, "DISTINCT_MODE": "exact", "KPI_STATE_URL": ""}
+    proc = subprocess.Popen([sys.executable, "-m", "uvicorn", app_path, "--port", str(port), "--log-level", "warning"]
+                            + (["--factory"] if factory else []), env=env)
+    for _ in range(100):
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/docs", timeout=0.2)
+            return proc
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError(f"{app_path} did not start")
+
+
+async def hammer(url: str, concurrency: int, seconds: float):
+    lat, errors = [], 0
+    t0 = time.perf_counter()
+    until = t0 + seconds
+    async with httpx.AsyncClient(timeout=60, limits=httpx.Limits(max_connections=concurrency)) as http:
+        async def one():
+            nonlocal errors
+            while time.perf_counter() < until:
+                t0 = time.perf_counter()
+                try:
+                    (await http.get(url)).raise_for_status()
+                    lat.append(time.perf_counter() - t0)
+                except httpx.HTTPError:
+                    errors += 1
+        await asyncio.gather(*(one() for _ in range(concurrency)))
+    return np.array(lat) * 1e3, errors, time.perf_counter() - t0
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--fill", type=int, default=0, help="minutes of simulated events to insert first")
+    ap.add_argument("--seconds", type=float, default=10)
+    ap.add_argument("--concurrency", type=int, default=50)
+    args = ap.parse_args()
+
+    if args.fill:
+        fill(args.fill)
+    apps = (("sync+pandas", "benchmarks.bench_api:baseline_app", 8781, True), ("async", "src.api:app", 8782, False))
+    procs = [start(path, port, factory) for _, path, port, factory in apps]
+    try:
+        # windows slide with now(), so consecutive responses are close but rarely identical
+        for ep in ENDPOINTS:
+            sizes = [len(httpx.get(f"http://127.0.0.1:{port}{ep}", timeout=60).content) for _, _, port, _ in apps]
+            print(f"{ep}: response bytes " + " / ".join(f"{n}={b}" for (n, *_), b in zip(apps, sizes)))
+        print(f"{'endpoint':>13} {'impl':>12} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+        for ep in ENDPOINTS:
+            for name, _, port, _ in apps:
+                lat, errors, elapsed = asyncio.run(hammer(f"http://127.0.0.1:{port}{ep}", args.concurrency, args.seconds))
+                p50, p99 = np.percentile(lat, [50, 99]) if len(lat) else (float("nan"),) * 2
+                print(f"{ep:>13} {name:>12} {len(lat) / elapsed:>8.1f} {p50:>8.1f} {p99:>8.1f} {errors:>7}")
+    finally:
+        for p in procs:
+            p.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+# benchmarks/bench_batch_forecast.py
+# Batch per-country / per-video forecasts (src/models/batch_forecast.py) on synthetic
+# starts/min shaped like the producer (country weights, uniform videos, diurnal rate):
+# series build time, then fit time sequentially vs in the process pool. No database.
+#   python -m benchmarks.bench_batch_forecast --hours 24 --workers 1 4 --limit 60
+import argparse, time
+
+import numpy as np
+import pandas as pd
+
+from src import kafka_producer as kp
+from src.models.batch_forecast import build_series, forecast_all
+
+
+def synthetic_long(hours: int, seed: int = 0) -> pd.DataFrame:
+    """Long ['ts','dim','key','starts'] as load_series() returns it."""
+    rng = np.random.default_rng(seed)
+    ts = pd.date_range("2026-01-01", periods=hours * 60, freq="min")
+    rate = kp.BASE_ARRIVAL_RATE * 60 * (1 + kp.DIURNAL_AMPLITUDE * np.sin(2 * np.pi * (ts.hour * 60 + ts.minute) / 1440))
+    total = rng.poisson(rate)
+    country = np.stack([rng.multinomial(n, np.array(kp.COUNTRY_P) / sum(kp.COUNTRY_P)) for n in total])
+    video = np.stack([rng.multinomial(n, np.full(len(kp.VIDEOS), 1 / len(kp.VIDEOS))) for n in total])
+    parts = [pd.DataFrame({"ts": ts, "dim": "all", "key": "", "starts": total})]
+    for dim, keys, m in (("country", kp.COUNTRIES, country), ("video", kp.VIDEOS, video)):
+        parts.append(pd.DataFrame({"ts": np.repeat(ts, len(keys)), "dim": dim,
+                                   "key": np.tile(keys, len(ts)), "starts": m.ravel()}))
+    long = pd.concat(parts, ignore_index=True)
+    return long[long["starts"] > 0]     # rollups only hold non-empty minutes
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--hours", type=int, default=24)
+    ap.add_argument("--workers", type=int, nargs="+", default=[1, 4])
+    ap.add_argument("--limit", type=int, default=0, help="fit only the first N series (0 = all)")
+    ap.add_argument("--min-starts", type=int, default=None)
+    args = ap.parse_args()
+
+    long = synthetic_long(args.hours)
+    t0 = time.perf_counter()
+    wide = build_series(long) if args.min_starts is None else build_series(long, args.min_starts)
+    print(f"{long.groupby(['dim', 'key']).ngroups} series, {len(long):,} rows -> {wide.shape[1]} after pooling "
+          f"in {(time.perf_counter() - t0) * 1e3:.0f} ms")
+    if args.limit:
+        wide = wide.iloc[:, :args.limit]
+    for w in args.workers:
+        t0 = time.perf_counter()
+        fc = forecast_all(wide, periods=60, workers=w)
+        dt = time.perf_counter() - t0
+        print(f"workers={w}: {wide.shape[1]} fits in {dt:.1f}s ({dt / wide.shape[1] * 1e3:.0f} ms/series), "
+              f"models {fc.groupby('model')['key'].nunique().to_dict()}")
+
+
+if __name__ == "__main__":
+    main()
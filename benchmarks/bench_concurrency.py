@@ -0,0 +1,77 @@
+# benchmarks/bench_concurrency.py
+# Compares the sweep-line concurrency series against the per-second list comprehension
+# used by the dashboard/API before src/concurrency.py.
+#   python -m benchmarks.bench_concurrency --sizes 10000 100000 1000000
+import argparse, time
+import numpy as np
+import pandas as pd
+
+from src.concurrency import concurrent_viewers
+
+
+def make_events(n: int, now: pd.Timestamp, minutes: int = 15, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    offsets = rng.uniform(0, minutes * 60, size=n)
+    viewers = rng.integers(0, max(n // 20, 1), size=n)
+    return pd.DataFrame({
+        "ts": now - pd.to_timedelta(offsets, unit="s"),
+        "viewer_id": [f"u{v}" for v in viewers],
+    })
+
+
+def naive_list_comprehension(df: pd.DataFrame, now: pd.Timestamp) -> pd.DataFrame:
+    # the original loop (no upper bound on the window)
+    timeline = pd.date_range(df["ts"].min().floor("s"), now.ceil("s"), freq="s")
+    conc = pd.DataFrame({"sec": timeline})
+    conc["concurrent"] = [
+        df[df["ts"] >= (t - pd.Timedelta(seconds=60))]["viewer_id"].nunique()
+        for t in timeline
+    ]
+    return conc
+
+
+def naive_bounded(df: pd.DataFrame, now: pd.Timestamp) -> pd.DataFrame:
+    # reference for the corrected semantics: events in (t - 60s, t]
+    timeline = pd.date_range(df["ts"].min().floor("s"), now.ceil("s"), freq="s")
+    conc = pd.DataFrame({"sec": timeline})
+    conc["concurrent"] = [
+        df[(df["ts"] > (t - pd.Timedelta(seconds=60))) & (df["ts"] <= t)]["viewer_id"].nunique()
+        for t in timeline
+    ]
+    return conc
+
+
+def timed(fn, *args):
+    t0 = time.perf_counter()
+    out = fn(*args)
+    return out, time.perf_counter() - t0
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    ap.add_argument("--skip-naive-above", type=int, default=None,
+                    help="skip the list comprehension for sizes above this (it is O(T*N))")
+    args = ap.parse_args()
+
+    now = pd.Timestamp.now(tz="UTC")
+
+    # correctness against the bounded reference on a small frame
+    small = make_events(5_000, now)
+    ref = naive_bounded(small, now)
+    got = concurrent_viewers(small, now)
+    assert (ref["concurrent"].to_numpy() == got["concurrent"].to_numpy()).all(), "sweep != reference"
+
+    print(f"{'events':>10} {'naive_s':>10} {'sweep_s':>10} {'speedup':>9}")
+    for n in args.sizes:
+        df = make_events(n, now)
+        _, sweep_s = timed(concurrent_viewers, df, now)
+        if args.skip_naive_above is not None and n > args.skip_naive_above:
+            print(f"{n:>10} {'skipped':>10} {sweep_s:>10.4f} {'-':>9}")
+            continue
+        _, naive_s = timed(naive_list_comprehension, df, now)
+        print(f"{n:>10} {naive_s:>10.3f} {sweep_s:>10.4f} {naive_s / sweep_s:>8.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+# benchmarks/bench_corpus.py
+# Offline event corpora (src/corpus.py): generation speed (including the warm-up), size on disk per format, that the
+# same seed reproduces the same file, and the replay path without a broker: read only, read
+# + re-encode to wire records (FileConsumer.consume), and + the consumer's decode_batch().
+#   python -m benchmarks.bench_corpus --events 2000000 --formats parquet arrow
+import argparse, os, tempfile, time
+
+import pyarrow as pa
+
+from src import corpus
+from src.kafka_consumer import decode_batch
+
+
+def read_table(path: str) -> pa.Table:
+    return pa.Table.from_batches(list(corpus.read_batches(path)))
+
+
+def replay(path: str, decode: bool, batch: int = 20000):
+    fc = corpus.FileConsumer(path)
+    t0, n = time.perf_counter(), 0
+    while True:
+        msgs = fc.consume(batch)
+        if not msgs:
+            break
+        if decode:
+            decode_batch(msgs)
+        n += len(msgs)
+    return n / (time.perf_counter() - t0)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--events", type=int, default=2_000_000)
+    ap.add_argument("--eps", type=float, default=50_000)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--formats", nargs="+", default=["parquet", "arrow"])
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="corpus_")
+    print(f"{'format':8} {'events':>10} {'gen ev/s':>10} {'B/event':>8} {'same seed':>9} "
+          f"{'read ev/s':>11} {'+encode':>10} {'+decode':>10}")
+    for fmt in args.formats:
+        a, b = os.path.join(tmp, f"a.{fmt}"), os.path.join(tmp, f"b.{fmt}")
+        t0 = time.perf_counter()
+        n = corpus.generate(a, args.events, eps=args.eps, seed=args.seed)
+        gen = n / (time.perf_counter() - t0)
+        corpus.generate(b, args.events, eps=args.eps, seed=args.seed)
+        same = read_table(a).equals(read_table(b))
+        t0 = time.perf_counter()
+        for _ in corpus.read_batches(a):
+            pass
+        read = n / (time.perf_counter() - t0)
+        print(f"{fmt:8} {n:>10,} {gen:>10,.0f} {os.path.getsize(a) / n:>8.2f} {str(same):>9} "
+              f"{read:>11,.0f} {replay(a, False):>10,.0f} {replay(a, True):>10,.0f}")
+
+
+if __name__ == "__main__":
+    main()
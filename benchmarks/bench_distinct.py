@@ -0,0 +1,84 @@
+# benchmarks/bench_distinct.py
+# Unique viewers per (minute, country) and per country over 15-minute windows:
+# exact pandas nunique over raw events vs HLL sketches (built once per minute, then merged).
+#   python -m benchmarks.bench_distinct --minutes 60 --rate 15
+import argparse, random, time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+
+from src import sketch, wire
+from src import kafka_producer as kp
+
+
+def simulate(minutes: int, rate: float, seed: int = 0) -> pd.DataFrame:
+    """Run the producer's session model on a virtual clock; returns decoded events."""
+    random.seed(seed)
+    kp.BASE_ARRIVAL_RATE = rate
+    kp.WIRE_FORMAT = "binary"
+    kp.reset()
+    values = []
+    kp.sink = values.append
+    t = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    for _ in range(minutes * 60):
+        kp.maybe_start_new_sessions(t)
+        kp.advance_heartbeats_and_ends(t)
+        t += timedelta(seconds=1)
+    cols, bad = wire.decode_batch(values)
+    assert not bad
+    return pd.DataFrame({"minute": cols["ts_us"] // 60_000_000, "country": cols["country"],
+                         "viewer_id": cols["viewer_id"]})
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--minutes", type=int, default=60)
+    ap.add_argument("--rate", type=float, default=15, help="session starts per second (base)")
+    ap.add_argument("--window", type=int, default=15, help="merge window in minutes")
+    args = ap.parse_args()
+
+    df = simulate(args.minutes, args.rate)
+    print(f"{len(df):,} events, {df['viewer_id'].nunique():,} viewers, {args.minutes} min")
+
+    # per (minute, country)
+    t0 = time.perf_counter()
+    exact = df.groupby(["minute", "country"])["viewer_id"].nunique()
+    t_exact = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    codes, keys = pd.MultiIndex.from_frame(df[["minute", "country"]]).factorize()
+    regs = sketch.sketch_by(codes, df["viewer_id"].to_numpy(), len(keys))
+    t_build = time.perf_counter() - t0
+    est = pd.Series(sketch.estimate(regs), index=keys).reindex(exact.index)
+    err = (est - exact).abs() / exact
+
+    # per country over sliding windows: exact re-scans raw rows, HLL merges minute sketches
+    first = df["minute"].min()
+    starts = range(first, df["minute"].max() - args.window + 2)
+    t0 = time.perf_counter()
+    exact_w = [df[(df["minute"] >= s) & (df["minute"] < s + args.window)]
+               .groupby("country")["viewer_id"].nunique() for s in starts]
+    t_exact_w = time.perf_counter() - t0
+    minute = keys.get_level_values(0).to_numpy()
+    country = keys.get_level_values(1).to_numpy()
+    t0 = time.perf_counter()
+    est_w = []
+    for s in starts:
+        sel = (minute >= s) & (minute < s + args.window)
+        c_codes, c_keys = pd.factorize(country[sel])
+        merged = np.zeros((len(c_keys), regs.shape[1]), dtype=np.uint8)
+        np.maximum.at(merged, c_codes, regs[sel])
+        est_w.append(pd.Series(sketch.estimate(merged), index=c_keys))
+    t_merge = time.perf_counter() - t0
+    err_w = pd.concat([(e.reindex(x.index) - x).abs() / x for e, x in zip(est_w, exact_w)])
+
+    size = np.mean([len(sketch.to_bytes(r)) for r in regs])
+    print(f"sketch p={sketch.HLL_P}: {size:.0f} B/sketch compressed")
+    print(f"{'query':>24} {'exact ms':>9} {'hll ms':>9} {'mean err':>9} {'p99 err':>9} {'max err':>9}")
+    for name, te, th, e in ((f"minute x country", t_exact, t_build, err),
+                            (f"{args.window}min x country", t_exact_w, t_merge, err_w)):
+        print(f"{name:>24} {te * 1e3:>9.1f} {th * 1e3:>9.1f} {e.mean():>9.2%} {e.quantile(0.99):>9.2%} {e.max():>9.2%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+# benchmarks/bench_event_cache.py
+# Dashboard refresh on the SQLite store: full reload (SELECT * FROM events, the old app.py)
+# vs EventCache delta refresh, for growing retained history and a fixed number of new rows
+# per tick. The delta cost should stay flat while the full reload grows with history.
+#   python -m benchmarks.bench_event_cache --history 10000 100000 500000 --new 200
+import argparse, os, random, sqlite3, tempfile, time
+
+import pandas as pd
+
+from src import sqlite_store
+from src.event_cache import EventCache, sqlite_source
+
+
+def rows(n: int, start: float, span_sec: float):
+    step = span_sec / max(n, 1)
+    return [(int((start + i * step) * 1_000_000), f"u{random.randint(0, n // 10 + 1)}",
+             f"video_{random.randint(1, 5)}", random.choice(("view_start", "heartbeat", "view_end")),
+             random.choice(("US", "IN", "BR", "DE"))) for i in range(n)]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--history", type=int, nargs="+", default=[10_000, 100_000, 500_000])
+    ap.add_argument("--new", type=int, default=200, help="rows added per tick")
+    ap.add_argument("--ticks", type=int, default=10)
+    args = ap.parse_args()
+
+    print(f"{'history':>9} {'full reload ms':>15} {'delta refresh ms':>17}")
+    for n in args.history:
+        path = os.path.join(tempfile.mkdtemp(), "viewer.db")
+        con = sqlite_store.connect(path)
+        sqlite_store.insert_many(con, rows(n, time.time() - 29 * 60, 29 * 60))
+        cache = EventCache(sqlite_source(path), horizon_sec=30 * 60, min_refresh_sec=0)
+        cache.refresh()
+
+        full = delta = 0.0
+        for _ in range(args.ticks):
+            sqlite_store.insert_many(con, rows(args.new, time.time(), 1))
+            t0 = time.perf_counter()
+            rcon = sqlite3.connect(path)
+            df = pd.read_sql_query("SELECT * FROM events", rcon)
+            rcon.close()
+            df["ts"] = pd.to_datetime(df["ts"], unit="us", utc=True)
+            full += time.perf_counter() - t0
+
+            t0 = time.perf_counter()
+            cache.refresh()
+            delta += time.perf_counter() - t0
+        con.close()
+        print(f"{n:>9,} {full / args.ticks * 1e3:>15.1f} {delta / args.ticks * 1e3:>17.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+# benchmarks/bench_forecast.py
+# Forecast tab cost: the old inline prophet_forecast() per refresh vs ForecastService
+# (update + cached read on the request path, Prophet refits in the background), plus cold vs
+# warm-started refits after new minutes arrive, and the Holt fallback. Synthetic diurnal series.
+#   python -m benchmarks.bench_forecast --hours 24 --refits 3
+import argparse, time
+
+import numpy as np
+import pandas as pd
+
+from src.models.forecast_service import ForecastService
+from src.models.timeseries import holt_forecast, prophet_fit, prophet_forecast, stan_init
+
+
+def series(minutes: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    ts = pd.date_range("2026-01-01", periods=minutes, freq="min")
+    rate = 900 * (1 + 0.6 * np.sin(2 * np.pi * (ts.hour * 60 + ts.minute) / 1440))
+    return pd.DataFrame({"ts": ts, "starts": rng.poisson(rate)})
+
+
+def timed(fn, *a, **kw):
+    t0 = time.perf_counter()
+    out = fn(*a, **kw)
+    return out, time.perf_counter() - t0
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--hours", type=int, default=24)
+    ap.add_argument("--refits", type=int, default=3, help="refits, each after 1 more minute of data")
+    args = ap.parse_args()
+
+    full = series(args.hours * 60 + args.refits)
+    spm = full.iloc[:args.hours * 60]
+
+    _, t_inline = timed(prophet_forecast, spm, 60)
+    _, t_holt = timed(holt_forecast, spm, 60)
+    print(f"inline prophet_forecast per refresh: {t_inline * 1e3:.0f} ms; holt fallback: {t_holt * 1e3:.1f} ms")
+
+    m = prophet_fit(spm)
+    for i in range(1, args.refits + 1):
+        grown = full.iloc[:args.hours * 60 + i]
+        _, cold = timed(prophet_fit, grown)
+        warm_m, warm = timed(prophet_fit, grown, init=stan_init(m))
+        m = warm_m
+        print(f"refit +{i} min: cold {cold * 1e3:.0f} ms, warm {warm * 1e3:.0f} ms")
+
+    svc = ForecastService(refit_sec=0)
+    lat = []
+    t_end = time.monotonic() + 30
+    kinds = set()
+    while time.monotonic() < t_end:
+        t0 = time.perf_counter()
+        svc.update(spm)
+        fc, kind = svc.forecast()
+        lat.append(time.perf_counter() - t0)
+        kinds.add(kind)
+        if kind == "prophet":
+            break
+        time.sleep(0.05)
+    lat = np.array(lat) * 1e3
+    print(f"service request path: {len(lat)} refreshes, p50 {np.median(lat):.2f} ms, max {lat.max():.1f} ms "
+          f"(kinds served: {sorted(k for k in kinds if k)})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+# benchmarks/bench_ingest.py
+# Rows/sec for each ingest writer against the Postgres configured in .env / POSTGRES_*.
+# Writes into an UNLOGGED scratch table shaped like `events`, dropped afterwards.
+#   docker compose -f infra/docker-compose.yml up -d postgres
+#   python -m benchmarks.bench_ingest --rows 200000 --batch 100 1000 10000
+import argparse, random, time
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import text
+
+from src.db import ENGINE
+from src.writers import WRITERS, make_writer
+
+TABLE = "events_ingest_bench"
+
+
+def make_rows(n: int, seed: int = 0):
+    rng = random.Random(seed)
+    t0 = datetime.now(timezone.utc)
+    kinds = ["view_start", "heartbeat", "heartbeat", "heartbeat", "view_end"]
+    return [
+        ((t0 + timedelta(milliseconds=i)).isoformat(), f"u{rng.randint(100000, 999999)}",
+         f"v{rng.randint(1, 200):03d}", rng.choice(kinds), rng.choice(["US", "IN", "BR", "DE"]))
+        for i in range(n)
+    ]
+
+
+def reset_table():
+    with ENGINE.begin() as conn:
+        conn.execute(text(f"DROP TABLE IF EXISTS {TABLE}"))
+        conn.execute(text(f"CREATE UNLOGGED TABLE {TABLE} "
+                          f"(LIKE events INCLUDING DEFAULTS INCLUDING INDEXES)"))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=200_000)
+    ap.add_argument("--batch", type=int, nargs="+", default=[100, 1000, 10000])
+    ap.add_argument("--writers", nargs="+", default=list(WRITERS))
+    args = ap.parse_args()
+
+    rows = make_rows(args.rows)
+    print(f"{'writer':>12} {'batch':>7} {'rows/sec':>12}")
+    try:
+        for name in args.writers:
+            for size in args.batch:
+                reset_table()
+                w = make_writer(name, ENGINE, table=TABLE)
+                t0 = time.perf_counter()
+                for i in range(0, len(rows), size):
+                    w.write(rows[i:i + size])
+                dt = time.perf_counter() - t0
+                print(f"{name:>12} {size:>7} {len(rows) / dt:>12,.0f}")
+    finally:
+        with ENGINE.begin() as conn:
+            conn.execute(text(f"DROP TABLE IF EXISTS {TABLE}"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+# benchmarks/bench_keyed.py
+# Text vs keyed events layout (EVENTS_LAYOUT, src/db.py + src/dims.py) on the same seeded
+# corpus: ingest rate through the consumer's writer, bytes on disk per million events (heap,
+# indexes and dimension tables) and the latency of the API queries and dashboard panels.
+# Each layout runs in a child process (the layout is read at import) against a scratch
+# schema that is dropped afterwards.
+#   python -m benchmarks.bench_keyed --events 1000000 --repeat 5
+import argparse, asyncio, json, os, statistics, subprocess, sys, time
+
+SIZE_SQL = """
+SELECT coalesce(sum(pg_relation_size(c.oid)), 0)::bigint, coalesce(sum(pg_indexes_size(c.oid)), 0)::bigint
+FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace
+WHERE n.nspname = current_schema() AND c.relkind = 'r' AND c.relname = ANY(:tables)
+"""
+
+
+def median_ms(fn, repeat: int) -> float:
+    fn()
+    secs = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        secs.append(time.perf_counter() - t0)
+    return statistics.median(secs) * 1e3
+
+
+def child(args):
+    import sqlalchemy as sa
+    from sqlalchemy import text
+    from src import async_db, panels
+    from src.db import ENGINE, EVENTS_LAYOUT, EVENTS_TABLE, KEYED
+    from src.kafka_consumer import BATCH_MAX, INGEST_WRITER
+    from src.writers import make_writer
+    from src.wire import to_rows
+    from benchmarks.suite import create_events, load_corpus
+
+    schema = f"bench_{EVENTS_LAYOUT}"
+    _, cols = load_corpus(args.events, args.seed, args.span_min, args.corpus_dir)
+    rows = to_rows(cols)
+    engine = sa.create_engine(ENGINE.url, connect_args={"options": f"-csearch_path={schema}"})
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP SCHEMA IF EXISTS {schema} CASCADE"))
+        conn.execute(text(f"CREATE SCHEMA {schema}"))
+        create_events(conn)
+    out = {"layout": EVENTS_LAYOUT, "events": len(rows)}
+    try:
+        writer = make_writer(INGEST_WRITER, engine, table=EVENTS_TABLE, keyed=KEYED)
+        t0 = time.perf_counter()
+        for i in range(0, len(rows), BATCH_MAX):
+            writer.write(rows[i:i + BATCH_MAX])
+        out["write ev/s"] = len(rows) / (time.perf_counter() - t0)
+        tables = [EVENTS_TABLE] + (["dim_viewer", "dim_video", "dim_country"] if KEYED else [])
+        with engine.begin() as conn:
+            for t in tables:
+                conn.execute(text(f"ANALYZE {t}"))
+            heap, idx = conn.execute(text(SIZE_SQL), {"tables": [EVENTS_TABLE]}).one()
+            all_heap, all_idx = conn.execute(text(SIZE_SQL), {"tables": tables}).one()
+        per_m = 1e6 / len(rows) / 2**20
+        out["heap MB/M"], out["index MB/M"] = heap * per_m, idx * per_m
+        out["dims MB/M"] = (all_heap + all_idx - heap - idx) * per_m
+        out["total MB/M"] = (all_heap + all_idx) * per_m
+
+        async def api():
+            await async_db.open_pool(server_settings={"search_path": schema})
+            try:
+                for name, fn in (("kpis", async_db.kpis), ("countries", async_db.countries),
+                                 ("concurrency", async_db.concurrency)):
+                    await fn()
+                    secs = []
+                    for _ in range(args.repeat):
+                        t0 = time.perf_counter()
+                        await fn()
+                        secs.append(time.perf_counter() - t0)
+                    out[f"api.{name} ms"] = statistics.median(secs) * 1e3
+            finally:
+                await async_db.close_pool()
+        asyncio.run(api())
+        for name in ("concurrency", "session_events", "countries", "eps"):
+            out[f"panel.{name} ms"] = median_ms(lambda: panels.load(name, engine=engine), args.repeat)
+        # full decode: every dimension joined back to its name
+        out["decode 5m ms"] = median_ms(lambda: panels.copy_frame(
+            "SELECT ts, viewer_id, video_id, event_type, country FROM events "
+            "WHERE ts > now() - interval '5 minutes'", {}, {"viewer_id": "str"}, engine=engine), args.repeat)
+    finally:
+        with engine.begin() as conn:
+            conn.execute(text(f"DROP SCHEMA {schema} CASCADE"))
+        engine.dispose()
+    print(json.dumps(out))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--events", type=int, default=1_000_000)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--span-min", type=float, default=30)
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--corpus-dir", default="data/bench")
+    ap.add_argument("--layouts", nargs="+", default=["text", "keyed"])
+    ap.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.child:
+        return child(args)
+
+    results = []
+    for layout in args.layouts:
+        cmd = [sys.executable, "-m", "benchmarks.bench_keyed", "--child", "--events", str(args.events),
+               "--seed", str(args.seed), "--span-min", str(args.span_min), "--repeat", str(args.repeat),
+               "--corpus-dir", args.corpus_dir]
+        proc = subprocess.run(cmd, env={**os.environ, "EVENTS_LAYOUT": layout, "EVENTS_PARTITION": "none"},
+                              capture_output=True, text=True)
+        if proc.returncode != 0:
+            sys.exit(f"[bench_keyed] {layout} failed:\n{proc.stderr}")
+        results.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+
+    print(f"{'':24}" + "".join(f"{r['layout']:>12}" for r in results))
+    for key in results[0]:
+        if key == "layout":
+            continue
+        print(f"{key:24}" + "".join(f"{r[key]:>12,.1f}" if isinstance(r[key], float) else f"{r[key]:>12,}"
+                                   for r in results))
+
+
+if __name__ == "__main__":
+    main()
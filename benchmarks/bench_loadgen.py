@@ -0,0 +1,58 @@
+# benchmarks/bench_loadgen.py
+# Event generation throughput: the per-session Python producer loop (src/kafka_producer.py,
+# binary values into a list) vs the vectorized load generator (src/loadgen.py), on a virtual
+# clock with no Kafka. Also checks the --eps calibration against the events actually emitted.
+#   python -m benchmarks.bench_loadgen --seconds 300 --eps 20000 200000
+import argparse, random, time
+from datetime import datetime, timedelta, timezone
+
+from src import kafka_producer as kp, loadgen
+
+
+def producer_loop(seconds: int, warmup: int):
+    random.seed(0)
+    kp.reset()
+    values = []
+    kp.sink, kp.WIRE_FORMAT = values.append, "binary"
+    t = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    for i in range(warmup + seconds):
+        if i == warmup:
+            values.clear()
+            t0 = time.perf_counter()
+        kp.maybe_start_new_sessions(t)
+        kp.advance_heartbeats_and_ends(t)
+        t += timedelta(seconds=1)
+    return len(values), time.perf_counter() - t0
+
+
+def vector_loop(seconds: int, warmup: int, eps: float = 0):
+    n = 0
+    def produce(v):
+        nonlocal n
+        n += 1
+    t0 = time.perf_counter()
+    loadgen.run(produce, lambda timeout=0: 0, eps=eps, speed=float("inf"),
+                start=datetime(2026, 1, 1, tzinfo=timezone.utc), seconds=seconds, warmup=warmup,
+                seed=0, report_sec=float("inf"))
+    return n, time.perf_counter() - t0
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--seconds", type=int, default=300, help="simulated seconds measured")
+    ap.add_argument("--warmup", type=int, default=kp.MAX_DWELL_SEC)
+    ap.add_argument("--eps", type=float, nargs="*", default=[20_000, 200_000])
+    args = ap.parse_args()
+
+    n, dt = producer_loop(args.seconds, args.warmup)
+    print(f"{'producer loop':>22}: {n / args.seconds:>9,.0f} events/sim-s, generated at {n / dt:>11,.0f} events/s")
+    n, dt = vector_loop(args.seconds, args.warmup)
+    print(f"{'loadgen (default)':>22}: {n / args.seconds:>9,.0f} events/sim-s, generated at {n / dt:>11,.0f} events/s")
+    for eps in args.eps:
+        n, dt = vector_loop(args.seconds, args.warmup, eps)
+        print(f"{f'loadgen --eps {eps:,.0f}':>22}: {n / args.seconds:>9,.0f} events/sim-s, "
+              f"generated at {n / dt:>11,.0f} events/s")
+
+
+if __name__ == "__main__":
+    main()
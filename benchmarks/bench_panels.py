@@ -0,0 +1,80 @@
+# benchmarks/bench_panels.py
+# One dashboard refresh (live + survival + forecast tabs, SQL fallbacks i.e. no rollups or
+# KPI state): the previous SELECT * of 24h into one DataFrame filtered in memory, vs the
+# per-panel planner in src/panels.py. Reports wall time and peak Python/NumPy memory.
+# The survival tab is incremental now (survival.IncrementalKM, see check_km.py) and
+# costs ~nothing per refresh, so the panel path leaves it out.
+#   python -m benchmarks.bench_panels --repeat 3                          (needs Postgres)
+# Fill events first with e.g. `python -m benchmarks.bench_api --fill 60 --seconds 0`.
+import argparse, time, tracemalloc
+
+import pandas as pd
+from sqlalchemy import text
+
+from src.db import ENGINE
+from src.concurrency import concurrent_viewers
+from src.models.survival import dwell_label
+from src.models.timeseries import session_starts_per_minute
+from src.sessions import sessionize
+from src import panels
+
+
+def refresh_select_all():
+    df = pd.read_sql("SELECT * FROM events WHERE ts > now() - interval '24 hours'", ENGINE, parse_dates=["ts"])
+    now = pd.Timestamp.now(tz="UTC")
+    df[df["ts"] >= now - pd.Timedelta(seconds=60)]["viewer_id"].nunique()
+    len(df[df["ts"] >= now - pd.Timedelta(seconds=10)])
+    win = df[df["ts"] >= now - pd.Timedelta(minutes=30)].sort_values("ts")
+    win[win["event_type"] == "view_start"].groupby("viewer_id")["ts"].min()
+    win[win["event_type"] == "view_end"].groupby("viewer_id")["ts"].max()
+    five = df[df["ts"] >= now - pd.Timedelta(minutes=5)].copy()
+    five["sec"] = five["ts"].dt.floor("s")
+    five.groupby("sec")["id"].count()
+    fifteen = df[df["ts"] >= now - pd.Timedelta(minutes=15)].copy()
+    if not fifteen.empty:
+        concurrent_viewers(fifteen, now)
+        fifteen.groupby("country")["viewer_id"].nunique().sort_values(ascending=False).head(10)
+    sessions = sessionize(df, now)
+    dwell_label(None, now, sessions=sessions)
+    session_starts_per_minute(sessions)
+    return df.memory_usage(deep=True).sum()
+
+
+def refresh_panels():
+    now = pd.Timestamp.now(tz="UTC")
+    frames = {name: panels.load(name) for name in
+              ("recent", "kpis", "eps", "concurrency", "countries", "starts_per_minute")}
+    conc = frames["concurrency"]
+    if not conc.empty:
+        concurrent_viewers(conc.assign(ts=panels.ts_datetime(conc["ts"])), now)
+    return sum(f.memory_usage(deep=True).sum() for f in frames.values())
+
+
+def measure(fn, repeat: int):
+    times, peaks = [], []
+    for _ in range(repeat):
+        tracemalloc.start()
+        t0 = time.perf_counter()
+        held = fn()
+        times.append(time.perf_counter() - t0)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return min(times), max(peaks), held
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    with ENGINE.connect() as conn:
+        n = conn.execute(text("SELECT count(*) FROM events WHERE ts > now() - interval '24 hours'")).scalar()
+    print(f"{n:,} events in the last 24h")
+    print(f"{'path':>12} {'refresh s':>10} {'peak MB':>9} {'frames MB':>10}")
+    for name, fn in (("select *", refresh_select_all), ("panels", refresh_panels)):
+        t, peak, held = measure(fn, args.repeat)
+        print(f"{name:>12} {t:>10.2f} {peak / 2**20:>9.1f} {held / 2**20:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+# benchmarks/bench_sqlite.py
+# The SQLite demo mode after hours of accumulated events (--hours of history at --eps):
+#   old  rollback journal, ISO-8601 TEXT ts without an index, one commit per INSERT
+#        (event_sim.py before), dashboard refresh = SELECT * of the whole table + ts parse
+#   new  src/sqlite_store.py: WAL + synchronous=NORMAL, epoch-µs ts with an index,
+#        executemany per tick; the dashboard's EventCache does one windowed first load
+#        and then delta refreshes of the rows above its watermark (app.py)
+# Writes report sustained events/sec for --write-sec of back-to-back ticks of --tick rows;
+# reads report the dashboard refresh after a tick has landed.
+#   python -m benchmarks.bench_sqlite --hours 1 4 --eps 50
+import argparse, os, random, sqlite3, tempfile, time
+
+import numpy as np
+import pandas as pd
+
+from src import sqlite_store
+from src.event_cache import EventCache, sqlite_source
+
+OLD_SCHEMA = """CREATE TABLE events(id INTEGER PRIMARY KEY AUTOINCREMENT, ts TEXT NOT NULL, viewer_id TEXT NOT NULL,
+  video_id TEXT NOT NULL, event_type TEXT NOT NULL, country TEXT NOT NULL)"""
+HORIZON_SEC = 30 * 60          # app.py's largest window
+
+
+def history(n: int, end: float, span_sec: float):
+    """n rows (ts_us, viewer, video, event_type, country) spread evenly over span_sec up to end."""
+    ts = (end - span_sec + np.arange(n) * (span_sec / max(n, 1))) * 1_000_000
+    viewers = np.random.randint(0, max(n // 20, 1), n)
+    return [(int(t), f"u{v}", f"video_{random.randint(1, 5)}", random.choice(("view_start", "heartbeat", "view_end")),
+             random.choice(("US", "IN", "BR", "DE"))) for t, v in zip(ts.tolist(), viewers.tolist())]
+
+
+def iso(rows):
+    """The same rows with ISO-8601 ts, as the old store kept them."""
+    ts = np.datetime_as_string(np.array([r[0] for r in rows], dtype="datetime64[us]"), unit="us", timezone="UTC")
+    return [(t,) + r[1:] for t, r in zip(ts.tolist(), rows)]
+
+
+def sustained(write, tick: int, seconds: float) -> float:
+    n, t0 = 0, time.perf_counter()
+    while time.perf_counter() - t0 < seconds:
+        write(history(tick, time.time(), 1))
+        n += tick
+    return n / (time.perf_counter() - t0)
+
+
+def run_old(path: str, rows, args) -> dict:
+    con = sqlite3.connect(path)
+    con.execute(OLD_SCHEMA)
+    con.executemany("INSERT INTO events(ts, viewer_id, video_id, event_type, country) VALUES(?,?,?,?,?)", iso(rows))
+    con.commit()
+
+    def write(batch):
+        for r in iso(batch):
+            con.execute("INSERT INTO events(ts, viewer_id, video_id, event_type, country) VALUES(?,?,?,?,?)", r)
+            con.commit()
+
+    def refresh():
+        rcon = sqlite3.connect(path)
+        df = pd.read_sql_query("SELECT * FROM events", rcon)
+        rcon.close()
+        df["ts"] = pd.to_datetime(df["ts"], utc=True, format="ISO8601")
+        return df
+    out = {"write ev/s": sustained(write, args.tick, args.write_sec)}
+    t0 = time.perf_counter()
+    refresh()
+    out["first load ms"] = out["refresh ms"] = (time.perf_counter() - t0) * 1e3
+    con.close()
+    return out
+
+
+def run_new(path: str, rows, args) -> dict:
+    con = sqlite_store.connect(path)
+    sqlite_store.insert_many(con, rows)
+    out = {"write ev/s": sustained(lambda b: sqlite_store.insert_many(con, b), args.tick, args.write_sec)}
+    cache = EventCache(sqlite_source(path), horizon_sec=HORIZON_SEC, min_refresh_sec=0)
+    t0 = time.perf_counter()
+    cache.refresh()
+    cache.frame(HORIZON_SEC)
+    out["first load ms"] = (time.perf_counter() - t0) * 1e3
+    secs = []
+    for _ in range(args.refreshes):
+        sqlite_store.insert_many(con, history(args.tick, time.time(), 1))
+        t0 = time.perf_counter()
+        cache.refresh()
+        cache.frame(HORIZON_SEC)
+        secs.append(time.perf_counter() - t0)
+    out["refresh ms"] = float(np.median(secs)) * 1e3
+    con.close()
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--hours", type=float, nargs="+", default=[1, 4])
+    ap.add_argument("--eps", type=float, default=50, help="rate the history accumulated at")
+    ap.add_argument("--tick", type=int, default=200, help="rows per write batch (one simulator tick)")
+    ap.add_argument("--write-sec", type=float, default=5)
+    ap.add_argument("--refreshes", type=int, default=10)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    print(f"{'hours':>6} {'rows':>10} {'store':>6} {'write ev/s':>11} {'first load ms':>14} {'refresh ms':>11} {'MB':>7}")
+    for hours in args.hours:
+        random.seed(args.seed)
+        np.random.seed(args.seed)
+        rows = history(int(hours * 3600 * args.eps), time.time(), hours * 3600)
+        for name, run in (("old", run_old), ("new", run_new)):
+            path = os.path.join(tempfile.mkdtemp(prefix="bench_sqlite_"), "viewer.db")
+            r = run(path, rows, args)
+            size = sum(os.path.getsize(p) for p in (path, path + "-wal") if os.path.exists(p)) / 2**20
+            print(f"{hours:>6g} {len(rows):>10,} {name:>6} {r['write ev/s']:>11,.0f} {r['first load ms']:>14.1f} "
+                  f"{r['refresh ms']:>11.2f} {size:>7.1f}")
+            for p in (path, path + "-wal", path + "-shm"):
+                if os.path.exists(p):
+                    os.remove(p)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+# benchmarks/bench_wire.py
+# Producer encode / consumer decode throughput and bytes per event, JSON vs binary.
+#   python -m benchmarks.bench_wire --events 200000 --batch 1000
+import argparse, random, time
+
+from src import wire
+from src.kafka_producer import COUNTRIES, COUNTRY_P, VIDEOS
+
+
+def make_events(n: int, seed: int = 0):
+    rng = random.Random(seed)
+    kinds = ["view_start"] + ["heartbeat"] * 8 + ["view_end"]
+    countries = rng.choices(COUNTRIES, COUNTRY_P, k=n)
+    return [{"event_type": rng.choice(kinds), "viewer_id": f"u{rng.randint(100000, 999999)}",
+             "video_id": rng.choice(VIDEOS), "country": countries[i]} for i in range(n)]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--events", type=int, default=200_000)
+    ap.add_argument("--batch", type=int, default=1000, help="consumer decode batch size")
+    args = ap.parse_args()
+
+    events = make_events(args.events)
+    ts0 = time.time_ns() // 1000
+    print(f"{'format':>7} {'bytes/ev':>9} {'encode ev/s':>13} {'decode ev/s':>13}")
+    for fmt in ("json", "binary"):
+        t0 = time.perf_counter()
+        values = [wire.encode(e, ts0 + i, fmt) for i, e in enumerate(events)]
+        enc = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        for i in range(0, len(values), args.batch):
+            cols, bad = wire.decode_batch(values[i:i + args.batch])
+            wire.to_rows(cols)
+        dec = time.perf_counter() - t0
+        assert not bad
+
+        size = sum(map(len, values)) / len(values)
+        print(f"{fmt:>7} {size:>9.1f} {len(values) / enc:>13,.0f} {len(values) / dec:>13,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+# benchmarks/check_plans.py
+# EXPLAIN ANALYZE check of the hot read queries against the managed events indexes
+# (EVENTS_INDEXES, src/db.py). For every scan of the events table or one of its partitions:
+#   - queries expecting "index-only" must use Index Only Scans, "index" ones any index or
+#     bitmap scan; a Seq Scan or a bitmap scan (e.g. over the BRIN) passes as a pruned scan
+#     when at least half of the rows it reads are inside the window
+#   - partitions that end before the query's window must have been pruned
+# Scans that return nothing (empty partitions) are skipped.
+# Heap fetches of index-only scans are reported (pages not yet all-visible). By default the
+# check fills a partitioned scratch schema from a seeded corpus (benchmarks/suite.py) and
+# VACUUM ANALYZEs it; --live checks the current schema as it is. Statements run in one
+# transaction that is rolled back. Exits 1 when a query misses.
+#   python -m benchmarks.check_plans --events 200000
+#   python -m benchmarks.check_plans --live
+import argparse, json, re, sys, time
+from datetime import datetime, timedelta, timezone
+
+import sqlalchemy as sa
+from sqlalchemy import text
+
+from src import db, panels, rollups
+from src.async_db import KPIS_SQL, COUNTRIES_SQL, CONCURRENCY_SQL
+from src.concurrency import WINDOW_SEC
+from src.db import ENGINE, EVENTS_TABLE, KEYED
+from src.event_cache import CODED
+from src.models.batch_forecast import _FROM_EVENTS
+
+SCHEMA = "check_plans"
+LEVEL = {"Seq Scan": 0, "Bitmap Heap Scan": 1, "Index Scan": 1, "Index Only Scan": 2}
+EXPECT = {"index": 1, "index-only": 2}
+
+
+def hot_queries():
+    """(name, sql in psycopg2 paramstyle, params, window seconds, expected scan)."""
+    out = [("api.kpis", KPIS_SQL, {}, 1800, "index-only"),
+           ("api.countries", COUNTRIES_SQL, {}, 900, "index-only"),
+           ("api.concurrency", CONCURRENCY_SQL.replace("$1", str(int(WINDOW_SEC))), {}, 900, "index-only")]
+    for name, panel in panels.PANELS.items():
+        sql, params, _ = panels.plan(panel)
+        out.append((f"panel.{name}", sql, params, panels.window_sec(panel), "index-only"))
+    exprs = ", ".join(["id"] + [panels.PROJECTION[c][0] for c in ("ts", "viewer_id") + CODED])
+    out.append(("cache.fetch", f"SELECT {exprs} FROM events WHERE id > 0 AND ts > now() - interval '1 hour' "
+                               f"ORDER BY id", {}, 3600, "index"))
+    out.append(("forecast.events", _FROM_EVENTS.replace(":window", "%(window)s"), {"window": "24 hours"},
+                86400, "index-only"))
+    hour = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+    out.append(("rollups.rebuild", rollups.REBUILD_SQL.format(dst="rollup_minute", viewers="0")
+                .replace(":grain", "%(grain)s").replace(":lo", "%(lo)s").replace(":hi", "%(hi)s"),
+                {"grain": "minute", "lo": hour, "hi": hour + timedelta(hours=1)}, None, "index"))
+    return out
+
+
+def scans(node):
+    """Every plan node that reads a relation (Bitmap Index Scans are part of their heap scan)."""
+    if "Relation Name" in node:
+        yield node
+    for child in node.get("Plans", ()):
+        yield from scans(child)
+
+
+def partition_bounds(cur) -> dict:
+    cur.execute("SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) FROM pg_inherits i "
+                "JOIN pg_class c ON c.oid = i.inhrelid WHERE i.inhparent = %s::regclass", (EVENTS_TABLE,))
+    out = {}
+    for name, bound in cur.fetchall():
+        m = re.search(r"TO \('([^']+)'\)", bound or "")
+        if m:
+            out[name] = datetime.fromisoformat(m.group(1))
+    return out
+
+
+def check(cur, name, sql, params, window_sec, expect, bounds):
+    cur.execute("EXPLAIN (ANALYZE, FORMAT JSON) " + sql, params or None)
+    plan = cur.fetchone()[0]
+    plan = (json.loads(plan) if isinstance(plan, str) else plan)[0]
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=window_sec) if window_sec else None
+    problems, kinds, parts, heap = [], set(), 0, 0
+    for node in scans(plan["Plan"]):
+        rel = node["Relation Name"]
+        if rel != EVENTS_TABLE and not rel.startswith(EVENTS_TABLE + "_"):
+            continue                    # dimension tables, rollups
+        kind = node["Node Type"]
+        parts += 1
+        heap += node.get("Heap Fetches", 0)
+        kept = node.get("Actual Rows", 0)
+        removed = node.get("Rows Removed by Filter", 0) + node.get("Rows Removed by Index Recheck", 0)
+        if kept == 0 and not removed:
+            continue
+        kinds.add(kind)
+        pruned = kind in ("Seq Scan", "Bitmap Heap Scan") and removed <= kept
+        if LEVEL.get(kind, 0) < EXPECT[expect] and not pruned:
+            problems.append(f"{kind} on {rel}")
+        if cutoff is not None and rel in bounds and bounds[rel] <= cutoff:
+            problems.append(f"{rel} not pruned")
+    scan = ", ".join(sorted(kinds)) or "-"
+    print(f"{name:24} {expect:11} {scan:34} {parts:>5} {heap:>8,} {plan['Execution Time']:>10.1f}  "
+          f"{'; '.join(problems) if problems else 'ok'}")
+    return not problems
+
+
+def fill(engine, args):
+    from benchmarks.suite import load_corpus
+    from src.kafka_consumer import BATCH_MAX, INGEST_WRITER
+    from src.wire import to_rows
+    from src.writers import make_writer
+
+    _, cols = load_corpus(args.events, args.seed, args.span_min, args.corpus_dir)
+    rows = to_rows(cols)
+    now = datetime.now(timezone.utc)
+    unit = db.EVENTS_PARTITION if db.EVENTS_PARTITION in db.PARTITION_STEP else "day"
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        conn.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+        if KEYED:
+            conn.execute(text(db.CREATE_DIMS_SQL))
+            conn.execute(text(db.CREATE_FACTS_PARTITIONED_SQL))
+            conn.execute(text(db.CREATE_EVENTS_VIEW_SQL))
+        else:
+            conn.execute(text(db.CREATE_EVENTS_PARTITIONED_SQL))
+        conn.execute(text(db.CREATE_ROLLUPS_SQL))
+        # two partitions behind now so the windowed queries have something to prune
+        db.ensure_partitions(conn, unit, now=now - 2 * db.PARTITION_STEP[unit],
+                             ahead=db.PARTITION_PREMAKE + 2, table=EVENTS_TABLE)
+        db.ensure_indexes(conn, EVENTS_TABLE)
+    writer = make_writer(INGEST_WRITER, engine, table=EVENTS_TABLE, keyed=KEYED)
+    for i in range(0, len(rows), BATCH_MAX):
+        writer.write(rows[i:i + BATCH_MAX])
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("VACUUM ANALYZE"))
+    return len(rows)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--events", type=int, default=200_000)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--span-min", type=float, default=120, help="corpus span; longer than the 30m windows")
+    ap.add_argument("--corpus-dir", default="data/bench")
+    ap.add_argument("--live", action="store_true", help="check the current schema instead of a scratch copy")
+    args = ap.parse_args()
+
+    engine = ENGINE if args.live else sa.create_engine(
+        ENGINE.url, connect_args={"options": f"-csearch_path={SCHEMA}"})
+    try:
+        if not args.live:
+            t0 = time.perf_counter()
+            n = fill(engine, args)
+            print(f"[check_plans] {n:,} events into {SCHEMA} ({db.EVENTS_LAYOUT} layout, indexes "
+                  f"{','.join(db.EVENTS_INDEXES)}) in {time.perf_counter() - t0:.1f}s")
+        conn = engine.raw_connection()
+        try:
+            with conn.cursor() as cur:
+                bounds = partition_bounds(cur)
+                print(f"{'query':24} {'expect':11} {'scans':34} {'rels':>5} {'heap':>8} {'ms':>10}")
+                ok = [check(cur, *q, bounds) for q in hot_queries()]
+            conn.rollback()
+        finally:
+            conn.close()
+    finally:
+        if not args.live:
+            with engine.begin() as c:
+                c.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+            engine.dispose()
+    print(f"[check_plans] {sum(ok)}/{len(ok)} queries on the expected scans")
+    sys.exit(0 if all(ok) else 1)
+
+
+if __name__ == "__main__":
+    main()
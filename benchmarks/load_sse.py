@@ -0,0 +1,124 @@
+# benchmarks/load_sse.py
+# Fan-out latency of the /stream SSE endpoint with hundreds of clients: time from the
+# server publishing a tick (the message's ts) to each client receiving it, p50/p99.
+#   python -m benchmarks.load_sse --clients 500 --seconds 20 --tick 0.5
+#   python -m benchmarks.load_sse --url http://localhost:8000/stream --clients 200   # a running API
+# Without --url a local server process is started whose ticker publishes synthetic snapshots
+# shaped like the API's (no Postgres needed). --slow clients read with a delay to show that
+# coalescing keeps them from holding back the rest. The full snapshot sent on connect is
+# not counted: it is as old as the last tick by design.
+import argparse, asyncio, json, random, subprocess, sys, time
+
+import httpx
+import numpy as np
+
+
+def synthetic_app(tick: float):
+    from contextlib import asynccontextmanager
+    from fastapi import FastAPI
+    from fastapi.responses import StreamingResponse
+    from src.live import Hub, run_ticker
+
+    hub = Hub()
+    start = int(time.time())
+
+    def compute():
+        now = int(time.time())
+        conc = [{"sec": s, "concurrent": 500 + (s * 7919) % 97} for s in range(max(start, now - 900), now)]
+        return {"kpis": {"active_viewers": random.randint(900, 1100), "events_per_sec": 150.0, "avg_dwell_min": 3.1},
+                "concurrency": conc,
+                "countries": [{"country": c, "active_viewers": random.randint(50, 60)} for c in ("US", "IN", "BR")]}
+
+    @asynccontextmanager
+    async def lifespan(app):
+        task = asyncio.create_task(run_ticker(hub, compute, tick))
+        yield
+        task.cancel()
+
+    app = FastAPI(lifespan=lifespan)
+
+    @app.get("/stream")
+    async def stream():
+        return StreamingResponse(hub.stream(), media_type="text/event-stream")
+
+    return app
+
+
+def start_server(tick: float, port: int):
+    proc = subprocess.Popen([sys.executable, "-m", "benchmarks.load_sse", "--serve",
+                             "--tick", str(tick), "--port", str(port)])
+    for _ in range(100):
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/docs", timeout=0.2)
+            return proc
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("local SSE server did not start")
+
+
+async def client(http, url: str, lat: list, kinds: dict, slow: float):
+    async with http.stream("GET", url) as r:
+        kind, first = None, True
+        async for line in r.aiter_lines():
+            if line.startswith("event: "):
+                kind = line[7:]
+            elif line.startswith("data: "):
+                if not first:
+                    lat.append(time.time() - json.loads(line[6:])["ts"])
+                first = False
+                kinds[kind] = kinds.get(kind, 0) + 1
+                if slow:
+                    await asyncio.sleep(slow)
+
+
+async def run(url: str, n: int, n_slow: int, slow: float, seconds: float):
+    fast_lat, slow_lat, kinds = [], [], {}
+    limits = httpx.Limits(max_connections=n, max_keepalive_connections=0)
+    async with httpx.AsyncClient(timeout=None, limits=limits) as http:
+        tasks = [asyncio.create_task(client(http, url, fast_lat, kinds, 0)) for _ in range(n - n_slow)]
+        tasks += [asyncio.create_task(client(http, url, slow_lat, kinds, slow)) for _ in range(n_slow)]
+        done, _ = await asyncio.wait(tasks, timeout=seconds)
+        for t in tasks:
+            t.cancel()
+        errors = [t.exception() for t in done if t.exception() is not None]
+        await asyncio.gather(*tasks, return_exceptions=True)
+    if errors:
+        print(f"{len(errors)} clients failed, e.g. {errors[0]!r}")
+    return np.array(fast_lat) * 1e3, np.array(slow_lat) * 1e3, kinds
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--url", default="")
+    ap.add_argument("--clients", type=int, default=300)
+    ap.add_argument("--slow", type=int, default=10, help="clients that take --slow-delay per message")
+    ap.add_argument("--slow-delay", type=float, default=3.0)
+    ap.add_argument("--seconds", type=float, default=15)
+    ap.add_argument("--tick", type=float, default=0.5, help="ticker interval of the local server")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.serve:
+        import uvicorn
+        uvicorn.run(synthetic_app(args.tick), host="127.0.0.1", port=args.port, log_level="warning")
+        return
+    url, server = args.url, None
+    if not url:
+        server = start_server(args.tick, args.port)
+        url = f"http://127.0.0.1:{args.port}/stream"
+    try:
+        fast, slow, kinds = asyncio.run(run(url, args.clients, args.slow, args.slow_delay, args.seconds))
+    finally:
+        if server is not None:
+            server.terminate()
+    print(f"{args.clients} clients ({args.slow} slow) for {args.seconds:.0f}s; frames: {kinds}")
+    for name, lat in (("fast", fast), ("slow", slow)):
+        if len(lat):
+            print(f"{name:>5}: {len(lat):>7,} msgs  p50 {np.percentile(lat, 50):7.1f} ms  "
+                  f"p99 {np.percentile(lat, 99):7.1f} ms  max {lat.max():7.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+# benchmarks/suite.py
+# Stage-level latency/throughput of the whole pipeline at several data sizes, as JSON Lines
+# (one record per stage x size) so runs on different commits can be diffed:
+#   encode.*   producer encodes: per-event JSON / binary (src/wire.py), vectorized (src/loadgen.py)
+#   decode.*   consumer decode_batch() of the same values
+#   db.write   the consumer's writer (INGEST_WRITER, batches of BATCH_MAX) into a scratch table
+#   api.*      the src/async_db.py queries behind /kpis, /countries, /concurrency (Postgres)
+#   panel.*    app_pg.py panel queries (src/panels.py); db.read for the SQLite stand-in
+#   dash.*     dashboard computations: concurrent_viewers, sessionize + avg dwell, starts/min
+#   model.*    dwell_label, fit_km, prophet_forecast
+# Input is a seeded corpus (src/corpus.py, cached under --corpus-dir) spanning --span-min
+# minutes whose newest event is shifted to now, so every windowed query sees all of it.
+# Postgres tables go to a `bench` schema (search_path), never the live `events`; --db sqlite
+# runs the event_sim.py store instead, where the api/panel stages do not exist. Postgres
+# tables follow EVENTS_LAYOUT (text | keyed, see src/db.py).
+#   python -m benchmarks.suite --sizes 100000 1000000 --out bench.jsonl
+#   python -m benchmarks.suite --sizes 100000 --db sqlite --stages encode decode db dash
+#   python -m benchmarks.suite --compare old.jsonl new.jsonl --threshold 1.2
+import argparse, asyncio, json, os, platform, sqlite3, statistics, subprocess, tempfile, time
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import sqlalchemy as sa
+from sqlalchemy import text
+
+from src import async_db, corpus, panels, sqlite_store, wire
+from src.concurrency import concurrent_viewers
+from src import db
+from src.db import ENGINE, EVENTS_TABLE, KEYED
+from src.event_cache import sqlite_source
+from src.kafka_consumer import BATCH_MAX, INGEST_WRITER
+from src.models.survival import dwell_label, fit_km
+from src.models.timeseries import prophet_forecast, session_starts_per_minute
+from src.sessions import sessionize, avg_dwell_sec
+from src.writers import make_writer
+
+SCHEMA = "bench"
+
+
+def create_events(conn):
+    """Unpartitioned events in the current search_path, in the EVENTS_LAYOUT layout with EVENTS_INDEXES."""
+    if KEYED:
+        for sql in (db.CREATE_DIMS_SQL, db.CREATE_FACTS_SQL, db.CREATE_EVENTS_VIEW_SQL):
+            conn.execute(text(sql))
+    else:
+        conn.execute(text(db.CREATE_EVENTS_SQL))
+    db.ensure_indexes(conn, EVENTS_TABLE)
+
+
+def git_rev() -> dict:
+    try:
+        rev = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"],
+                                    capture_output=True, text=True).stdout.strip())
+        return {"commit": rev or None, "dirty": dirty}
+    except OSError:
+        return {"commit": None, "dirty": None}
+
+
+def load_corpus(size: int, seed: int, span_min: float, directory: str):
+    """(records, cols) of a corpus of ~size events whose newest event is now."""
+    path = os.path.join(directory, f"corpus_{size}_{seed}_{span_min:g}m.parquet")
+    if not os.path.exists(path):
+        corpus.generate(path, size, eps=size / (span_min * 60), seed=seed, warmup=600)
+    table = pa.Table.from_batches(list(corpus.read_batches(path)))
+    ts = table.column("ts_us").to_numpy()
+    rec = corpus.to_records(table, int(time.time() * 1_000_000) - int(ts.max()))
+    cols, _ = wire.decode_batch(np.frombuffer(rec.tobytes(), dtype=f"V{wire.RECORD.itemsize}").tolist())
+    return rec, cols
+
+
+class Suite:
+    def __init__(self, db: str, repeat: int, stages):
+        self.db, self.repeat, self.stages = db, repeat, stages
+        self.results = []
+        self.n = 0                      # events in the current corpus (sizes are approximate)
+        self.meta = {**git_rev(), "host": platform.node(), "python": platform.python_version(),
+                     "cpus": os.cpu_count(), "db": db, "run_at": datetime.now(timezone.utc).isoformat()}
+
+    def time(self, stage: str, size: int, fn, rows: int = None, repeat: int = None, setup=None):
+        """
+        Run fn() `repeat` times (setup() untimed before each) and record it; returns fn()'s
+        result. A stage that was not selected runs once untimed, for the stages that need it.
+        """
+        if stage.split(".")[0] not in self.stages:
+            return fn()
+        secs, out = [], None
+        for _ in range(repeat or self.repeat):
+            if setup is not None:
+                setup()
+            t0 = time.perf_counter()
+            out = fn()
+            secs.append(time.perf_counter() - t0)
+        self.record(stage, size, self.n if rows is None else rows, secs)
+        return out
+
+    def record(self, stage: str, size: int, rows: int, secs: list):
+        med = statistics.median(secs)
+        rec = {**self.meta, "stage": stage, "size": size, "rows": rows, "repeat": len(secs),
+               "best_s": round(min(secs), 6), "median_s": round(med, 6),
+               "rows_per_s": round(rows / med, 1) if med > 0 else None}
+        self.results.append(rec)
+        print(f"{stage:24} {size:>10,} {rows:>10,} {min(secs) * 1e3:>11.2f} {med * 1e3:>11.2f} "
+              f"{rec['rows_per_s'] or 0:>13,.0f}")
+
+    # --- stages ---------------------------------------------------------------
+    def run_size(self, size: int, rec: np.ndarray, cols: dict):
+        self.n = len(rec)
+        events = [{"event_type": e, "viewer_id": v, "video_id": vi, "country": c}
+                  for e, v, vi, c in zip(cols["event_type"], cols["viewer_id"], cols["video_id"], cols["country"])]
+        ts_us = cols["ts_us"].tolist()
+        json_values = self.time("encode.json", size, lambda: [wire.encode_json(e, t) for e, t in zip(events, ts_us)])
+        self.time("encode.binary", size, lambda: [wire.encode_binary(e, t) for e, t in zip(events, ts_us)])
+        binary = self.time("encode.vector", size,
+                           lambda: np.frombuffer(rec.tobytes(), dtype=f"V{wire.RECORD.itemsize}").tolist())
+        self.time("decode.json", size, lambda: wire.decode_batch(json_values))
+        self.time("decode.binary", size, lambda: wire.decode_batch(binary))
+        rows = wire.to_rows(cols)
+
+        if self.stages & {"db", "api", "panel"}:
+            self.postgres_stages(size, rows) if self.db == "postgres" else self.sqlite_stages(size, cols)
+
+        now = pd.Timestamp.now(tz="UTC")
+        df = pd.DataFrame({"ts": pd.to_datetime(cols["ts_us"], unit="us", utc=True), "viewer_id": cols["viewer_id"],
+                           "event_type": cols["event_type"], "country": cols["country"], "video_id": cols["video_id"]})
+        fifteen = df[df["ts"] >= now - pd.Timedelta(minutes=15)]
+        self.time("dash.concurrency", size, lambda: concurrent_viewers(fifteen, now), rows=len(fifteen))
+        sessions = self.time("dash.sessionize", size, lambda: sessionize(df, now))
+        self.time("dash.avg_dwell", size, lambda: avg_dwell_sec(sessions), rows=len(sessions))
+        spm = self.time("dash.starts_per_minute", size, lambda: session_starts_per_minute(sessions), rows=len(sessions))
+        dwell = self.time("model.dwell_label", size, lambda: dwell_label(df, now, sessions=sessions), rows=len(sessions))
+        self.time("model.fit_km", size, lambda: fit_km(dwell), rows=len(dwell))
+        if "model" in self.stages:
+            self.time("model.prophet_forecast", size, lambda: prophet_forecast(spm), rows=len(spm), repeat=1)
+
+    def postgres_stages(self, size: int, rows: list):
+        engine = sa.create_engine(ENGINE.url, connect_args={"options": f"-csearch_path={SCHEMA}"})
+        with engine.begin() as conn:
+            conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+            conn.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+            create_events(conn)
+        writer = None
+
+        def truncate():
+            nonlocal writer
+            with engine.begin() as conn:
+                conn.execute(text(f"TRUNCATE {EVENTS_TABLE}{', dim_viewer, dim_video, dim_country' if KEYED else ''} "
+                                  f"RESTART IDENTITY"))
+            writer = make_writer(INGEST_WRITER, engine, table=EVENTS_TABLE, keyed=KEYED)   # cold key cache
+
+        def write():
+            for i in range(0, len(rows), BATCH_MAX):
+                writer.write(rows[i:i + BATCH_MAX])
+        truncate()
+        self.time(f"db.write.{INGEST_WRITER}", size, write, setup=truncate)
+        with engine.begin() as conn:
+            conn.execute(text(f"ANALYZE {EVENTS_TABLE}"))
+
+        async def api():
+            await async_db.open_pool(server_settings={"search_path": SCHEMA})
+            try:
+                for name, fn in (("kpis", async_db.kpis), ("countries", async_db.countries),
+                                 ("concurrency", async_db.concurrency)):
+                    await fn()          # the first call prepares the statement on its connection
+                    secs = []
+                    for _ in range(self.repeat):
+                        t0 = time.perf_counter()
+                        await fn()
+                        secs.append(time.perf_counter() - t0)
+                    self.record(f"api.{name}", size, self.n, secs)
+            finally:
+                await async_db.close_pool()
+
+        if "api" in self.stages:
+            asyncio.run(api())
+        for name in panels.PANELS if "panel" in self.stages else ():
+            self.time(f"panel.{name}", size, lambda: panels.load(name, engine=engine))
+        with engine.begin() as conn:
+            conn.execute(text(f"DROP SCHEMA {SCHEMA} CASCADE"))
+        engine.dispose()
+
+    def sqlite_stages(self, size: int, cols: dict):
+        path = os.path.join(tempfile.mkdtemp(prefix="bench_sqlite_"), "viewer.db")
+        rows = sqlite_store.rows_from_cols(cols)
+
+        def reset():
+            con = sqlite3.connect(path)
+            con.execute("DROP TABLE IF EXISTS events")
+            con.close()
+            sqlite_store.connect(path).close()
+
+        def write():
+            con = sqlite_store.connect(path)
+            for i in range(0, len(rows), BATCH_MAX):
+                sqlite_store.insert_many(con, rows[i:i + BATCH_MAX])
+            con.close()
+        if "db" not in self.stages:
+            reset()
+        self.time("db.write.sqlite", size, write, setup=reset)
+        fetch = sqlite_source(path)
+        self.time("db.read", size, lambda: fetch(0, 24 * 3600))
+        os.remove(path)
+
+
+def compare(old_path: str, new_path: str, threshold: float):
+    """Median-time ratio new/old per (stage, size); flags slowdowns above threshold."""
+    def load(p):
+        with open(p) as f:
+            return {(r["stage"], r["size"]): r for r in (json.loads(line) for line in f if line.strip())}
+    old, new = load(old_path), load(new_path)
+    worse = 0
+    print(f"{'stage':24} {'size':>10} {'old ms':>10} {'new ms':>10} {'ratio':>7}")
+    for key in sorted(old.keys() & new.keys()):
+        o, n = old[key]["median_s"], new[key]["median_s"]
+        ratio = n / o if o else float("inf")
+        flag = " <-- slower" if ratio > threshold else ""
+        worse += bool(flag)
+        print(f"{key[0]:24} {key[1]:>10,} {o * 1e3:>10.2f} {n * 1e3:>10.2f} {ratio:>7.2f}{flag}")
+    print(f"{worse} of {len(old.keys() & new.keys())} stage/size pairs slower than x{threshold}")
+    return worse
+
+
+def main():
+    ap = argparse.ArgumentParser(description="stage-level pipeline benchmarks (JSON Lines)")
+    ap.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    ap.add_argument("--db", choices=["postgres", "sqlite"], default="postgres")
+    ap.add_argument("--stages", nargs="+", default=["encode", "decode", "db", "api", "panel", "dash", "model"])
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--span-min", type=float, default=30, help="minutes of traffic each corpus covers")
+    ap.add_argument("--corpus-dir", default="data/bench")
+    ap.add_argument("--out", default=None, help="append JSON Lines here (default: bench_<commit>.jsonl)")
+    ap.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="diff two result files and exit")
+    ap.add_argument("--threshold", type=float, default=1.2)
+    args = ap.parse_args()
+
+    if args.compare:
+        raise SystemExit(1 if compare(*args.compare, args.threshold) else 0)
+
+    suite = Suite(args.db, args.repeat, set(args.stages))
+    out = args.out or f"bench_{suite.meta['commit'] or 'local'}.jsonl"
+    print(f"{'stage':24} {'size':>10} {'rows':>10} {'best ms':>11} {'median ms':>11} {'rows/s':>13}")
+    for size in args.sizes:
+        rec, cols = load_corpus(size, args.seed, args.span_min, args.corpus_dir)
+        suite.run_size(size, rec, cols)
+    with open(out, "a") as f:
+        for r in suite.results:
+            f.write(json.dumps(r) + "\n")
+    print(f"[bench] {len(suite.results)} results appended to {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,67 +1,51 @@
 # Simulates viewer events and writes to SQLite
-import random, time, uuid, sqlite3, os
-from datetime import datetime, timezone
+import random, time, uuid, os
 
-DB_PATH = os.environ.get("VIEWER_DB", "data/viewer.db")
-os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
+from src import sqlite_store
 
-con = sqlite3.connect(DB_PATH, check_same_thread=False)
-cur = con.cursor()
-cur.execute("""
-CREATE TABLE IF NOT EXISTS events(
-  id INTEGER PRIMARY KEY AUTOINCREMENT,
-  ts TEXT NOT NULL,
-  viewer_id TEXT NOT NULL,
-  video_id TEXT NOT NULL,
-  event_type TEXT NOT NULL,   -- view_start | heartbeat | view_end
-  country TEXT NOT NULL
-)
-""")
-con.commit()
+DB_PATH = os.environ.get("VIEWER_DB", "data/viewer.db")
 
 COUNTRIES = ["US","IN","BR","DE","GB","CA","AU","JP","MX","ZA","FR","IT","ES","AE","SG"]
 VIDEO_IDS = [f"video_{i}" for i in range(1,6)]
 ACTIVE = {}
 
-def now_iso():
-    return datetime.now(timezone.utc).isoformat()
+def now_us():
+    return int(time.time() * 1_000_000)
 
 def new_viewer():
     v = str(uuid.uuid4())
     ACTIVE[v] = {"video_id": random.choice(VIDEO_IDS), "country": random.choice(COUNTRIES)}
     return v
 
-def insert(event):
-    cur.execute(
-        "INSERT INTO events(ts, viewer_id, video_id, event_type, country) VALUES(?,?,?,?,?)",
-        (event["ts"], event["viewer_id"], event["video_id"], event["event_type"], event["country"])
-    )
-    con.commit()
-
-print(f"Simulating events -> {DB_PATH}")
-try:
-    while True:
-        # randomly start new viewers
-        if random.random() < 0.35 or not ACTIVE:
-            v = new_viewer()
-            m = ACTIVE[v]
-            insert({"ts": now_iso(), "viewer_id": v, "video_id": m["video_id"], "event_type": "view_start", "country": m["country"]})
-
-        # heartbeats for some active viewers
-        for v in list(ACTIVE.keys()):
-            if random.random() < 0.65:
-                m = ACTIVE[v]
-                insert({"ts": now_iso(), "viewer_id": v, "video_id": m["video_id"], "event_type": "heartbeat", "country": m["country"]})
-
-        # randomly end sessions
-        for v in list(ACTIVE.keys()):
-            if random.random() < 0.12:
-                m = ACTIVE[v]
-                insert({"ts": now_iso(), "viewer_id": v, "video_id": m["video_id"], "event_type": "view_end", "country": m["country"]})
-                ACTIVE.pop(v, None)
-
-        time.sleep(1)  # 1-second tick
-except KeyboardInterrupt:
-    pass
-finally:
-    con.close()
+def tick() -> list:
+    """One second of events as (ts_us, viewer_id, video_id, event_type, country) rows."""
+    rows = []
+    # randomly start new viewers
+    if random.random() < 0.35 or not ACTIVE:
+        v = new_viewer()
+        m = ACTIVE[v]
+        rows.append((now_us(), v, m["video_id"], "view_start", m["country"]))
+
+    # heartbeats for some active viewers
+    for v, m in ACTIVE.items():
+        if random.random() < 0.65:
+            rows.append((now_us(), v, m["video_id"], "heartbeat", m["country"]))
+
+    # randomly end sessions
+    for v in list(ACTIVE.keys()):
+        if random.random() < 0.12:
+            m = ACTIVE.pop(v)
+            rows.append((now_us(), v, m["video_id"], "view_end", m["country"]))
+    return rows
+
+if __name__ == "__main__":
+    con = sqlite_store.connect(DB_PATH)   # WAL, epoch-µs ts + index (src/sqlite_store.py)
+    print(f"Simulating events -> {DB_PATH}")
+    try:
+        while True:
+            sqlite_store.insert_many(con, tick())   # one transaction per tick
+            time.sleep(1)  # 1-second tick
+    except KeyboardInterrupt:
+        pass
+    finally:
+        con.close()
@@ -1,8 +1,16 @@
 from datetime import datetime, timedelta
 from airflow import DAG
-from airflow.providers.postgres.operators.postgres import PostgresOperator
+from airflow.operators.python import PythonOperator
 
 default_args = {"owner":"airflow","retries":1,"retry_delay": timedelta(minutes=2)}
+
+
+def compact_hour(data_interval_start, data_interval_end, **_):
+    # imported per run: src.db connects at import time (POSTGRES_* from the container env)
+    from src import rollups
+    rollups.compact("hour", data_interval_start, data_interval_end)
+
+
 with DAG(
     dag_id="viewer_hourly_rollup",
     start_date=datetime(2024,1,1),
@@ -11,16 +19,10 @@ with DAG(
     default_args=default_args,
 ) as dag:
 
-    # simple hourly rollup: events + unique viewers last hour
-    rollup = PostgresOperator(
+    # hourly compaction: rollup_minute → rollup_hour for this run's data interval, through
+    # src/rollups.py (same SQL, DISTINCT_MODE and events layout as the consumer's job).
+    # Rows are replaced, so retries and manual re-runs of an interval are idempotent.
+    rollup = PythonOperator(
         task_id="rollup_hour",
-        postgres_conn_id="postgres_default",
-        sql="""
-        INSERT INTO rollup_hourly(ts, events, active_viewers)
-        SELECT date_trunc('hour', now()) as ts,
-               COUNT(*) as events,
-               COUNT(DISTINCT viewer_id) FILTER (WHERE ts > now() - interval '60 minutes') as active_viewers
-        FROM events
-        WHERE ts > now() - interval '60 minutes';
-        """,
+        python_callable=compact_hour,
     )
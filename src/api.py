@@ -1,43 +1,75 @@
-import os, pandas as pd
-from fastapi import FastAPI
-from db import ENGINE
+import os, asyncio, time
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from dotenv import load_dotenv
+from src import async_db, metrics
+from src.kpi_state import fetch_kpis
+from src.rollups import ROLLUPS, DISTINCT_MODE
+from src.live import Hub, run_ticker, LIVE_TICK_SEC
 load_dotenv()
 
-app = FastAPI(title="Viewer KPIs API")
+# Run from the repo root: uvicorn src.api:app
+# consumer's incremental KPI endpoint (KPI_STATE_PORT); falls back to SQL when unreachable
+KPI_STATE_URL = os.getenv("KPI_STATE_URL", "")
+
+hub = Hub()
+
+@asynccontextmanager
+async def lifespan(app):
+    await async_db.open_pool()
+    ticker = asyncio.create_task(run_ticker(hub, live_snapshot, LIVE_TICK_SEC))
+    yield
+    ticker.cancel()
+    await async_db.close_pool()
+
+app = FastAPI(title="Viewer KPIs API", lifespan=lifespan)
+
+REQUEST_SECONDS = metrics.histogram("api_request_seconds", "Handler time until the response starts",
+                                    ("route", "status"))
+
+@app.middleware("http")
+async def time_requests(request: Request, call_next):
+    t0 = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    REQUEST_SECONDS.labels(route.path if route else "unmatched", response.status_code).observe(time.perf_counter() - t0)
+    return response
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+async def kpi_snapshot():
+    return await asyncio.to_thread(fetch_kpis, KPI_STATE_URL) if KPI_STATE_URL else None
 
 @app.get("/kpis")
-def kpis():
-    df = pd.read_sql("SELECT * FROM events WHERE ts > now() - interval '30 minutes'", ENGINE, parse_dates=["ts"])
-    now = pd.Timestamp.now(tz="UTC")
-    last_min = now - pd.Timedelta(seconds=60)
-    active = df[df["ts"] >= last_min]["viewer_id"].nunique()
-    last_10s = now - pd.Timedelta(seconds=10)
-    eps = len(df[df["ts"] >= last_10s]) / 10.0
-
-    starts = df[df.event_type=="view_start"].groupby("viewer_id")["ts"].min()
-    ends = df[df.event_type=="view_end"].groupby("viewer_id")["ts"].max()
-    aligned = pd.concat([starts.rename("start"), ends.rename("end")], axis=1)
-    aligned["end"] = aligned["end"].fillna(now)
-    dwell = aligned["end"] - aligned["start"]
-    avg_dwell_min = (dwell.dt.total_seconds().clip(lower=0).mean() or 0)/60
-    return {"active_viewers": int(active), "events_per_sec": round(eps,2), "avg_dwell_min": round(avg_dwell_min,2)}
+async def kpis():
+    snap = await kpi_snapshot()
+    if snap is not None:
+        return {k: snap[k] for k in ("active_viewers", "events_per_sec", "avg_dwell_min")}
+    return await async_db.kpis()
 
 @app.get("/concurrency")
-def concurrency():
-    df = pd.read_sql("SELECT * FROM events WHERE ts > now() - interval '15 minutes'", ENGINE, parse_dates=["ts"])
-    if df.empty: return []
-    now = pd.Timestamp.now(tz="UTC")
-    timeline = pd.date_range(df["ts"].min().floor("s"), now.ceil("s"), freq="S")
-    vals = []
-    for t in timeline:
-        count = df[df["ts"] >= (t - pd.Timedelta(seconds=60))]["viewer_id"].nunique()
-        vals.append({"sec": t.isoformat(), "concurrent": int(count)})
-    return vals
+async def concurrency():
+    return await async_db.concurrency()
 
 @app.get("/countries")
-def countries():
-    df = pd.read_sql("SELECT * FROM events WHERE ts > now() - interval '15 minutes'", ENGINE, parse_dates=["ts"])
-    if df.empty: return []
-    top = df.groupby("country")["viewer_id"].nunique().sort_values(ascending=False).head(10)
-    return [{"country": c, "active_viewers": int(v)} for c, v in top.items()]
+async def countries():
+    snap = await kpi_snapshot()
+    if snap is not None:
+        return snap["countries"]
+    if ROLLUPS and DISTINCT_MODE == "hll":
+        return await async_db.countries_hll()
+    return await async_db.countries()
+
+async def live_snapshot():
+    """Everything /stream pushes, computed once per tick for all subscribers."""
+    k, conc, top = await asyncio.gather(kpis(), concurrency(), countries())
+    return {"kpis": k, "concurrency": conc, "countries": top}
+
+@app.get("/stream")
+async def stream(request: Request):
+    """Server-Sent Events: a full snapshot on connect, then per-tick deltas (see src/live.py)."""
+    return StreamingResponse(hub.stream(request.is_disconnected), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
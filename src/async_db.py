@@ -0,0 +1,138 @@
+# src/async_db.py
+import os
+from datetime import datetime, timezone
+import numpy as np
+from src.db import PG_USER, PG_PW, PG_DB, PG_HOST, PG_PORT, VIEWER_KEY
+from src.concurrency import WINDOW_SEC
+from src.sessions import SESSION_TIMEOUT_SEC
+from src import metrics, sketch
+
+# asyncpg pool for the API. Each pooled connection keeps a statement cache, so the queries
+# below are parsed and planned once per connection and then run as prepared statements.
+# Everything is aggregated in SQL; handlers only turn records into JSON-ready dicts.
+# Viewers are counted and partitioned by VIEWER_KEY (integer keys in the keyed layout).
+PG_ASYNC_POOL_MIN = int(os.getenv("PG_ASYNC_POOL_MIN", "2"))
+PG_ASYNC_POOL_MAX = int(os.getenv("PG_ASYNC_POOL_MAX", "10"))
+
+pool = None
+QUERY_SECONDS = metrics.histogram("api_query_seconds", "Postgres round trip per API query", ("query",))
+
+# Avg dwell sessionizes the 30m window by the src/sessions.py rules: a session breaks at a
+# view_start, after a view_end or after a SESSION_TIMEOUT_SEC gap; replayed rows count once.
+KPIS_SQL = f"""
+WITH w AS (
+  SELECT ts, {VIEWER_KEY}, event_type FROM events WHERE ts > now() - interval '30 minutes'
+), e AS (
+  SELECT DISTINCT {VIEWER_KEY}, ts,
+         CASE event_type WHEN 'view_start' THEN 0 WHEN 'view_end' THEN 2 ELSE 1 END AS r
+  FROM w
+), b AS (
+  SELECT {VIEWER_KEY}, ts, r,
+         CASE WHEN r = 0 OR lag(r) OVER v IS NULL OR lag(r) OVER v = 2
+                   OR ts - lag(ts) OVER v > interval '{SESSION_TIMEOUT_SEC} seconds' THEN 1 ELSE 0 END AS brk
+  FROM e WINDOW v AS (PARTITION BY {VIEWER_KEY} ORDER BY ts, r)
+), g AS (
+  SELECT {VIEWER_KEY}, ts, r, sum(brk) OVER (PARTITION BY {VIEWER_KEY} ORDER BY ts, r ROWS UNBOUNDED PRECEDING) AS sid
+  FROM b
+), s AS (
+  SELECT min(ts) AS st, max(ts) AS seen, bool_or(r = 0) AS opened, bool_or(r = 2) AS ended,
+         lead(sid) OVER (PARTITION BY {VIEWER_KEY} ORDER BY sid) IS NOT NULL AS followed
+  FROM g GROUP BY {VIEWER_KEY}, sid
+)
+SELECT (SELECT count(DISTINCT {VIEWER_KEY}) FROM w WHERE ts >= now() - interval '60 seconds') AS active,
+       (SELECT count(*) FROM w WHERE ts >= now() - interval '10 seconds') AS last_10s,
+       (SELECT avg(greatest(extract(epoch FROM
+                 CASE WHEN ended OR followed OR now() - seen > interval '{SESSION_TIMEOUT_SEC} seconds'
+                      THEN seen ELSE now() END - st), 0))
+        FROM s WHERE opened) AS dwell
+"""
+
+COUNTRIES_SQL = f"""
+SELECT country, count(DISTINCT {VIEWER_KEY}) AS viewers
+FROM events WHERE ts > now() - interval '15 minutes'
+GROUP BY country ORDER BY viewers DESC LIMIT 10
+"""
+
+COUNTRIES_HLL_SQL = """
+SELECT key, viewers_hll FROM rollup_minute
+WHERE dim = 'country' AND bucket > now() - interval '15 minutes' AND viewers_hll IS NOT NULL
+"""
+
+# Same sweep as src/concurrency.py, in SQL: each event covers grid seconds
+# [ceil(ts), ceil(ts) + $1); a viewer's touching coverages are merged (gaps and islands),
+# every island adds +1/-1 and a running sum over the timeline gives the series.
+CONCURRENCY_SQL = f"""
+WITH e AS (
+  SELECT {VIEWER_KEY}, ceil(extract(epoch FROM ts))::bigint AS s
+  FROM events WHERE ts > now() - interval '15 minutes'
+), g AS (
+  SELECT {VIEWER_KEY}, s,
+         CASE WHEN s - lag(s) OVER (PARTITION BY {VIEWER_KEY} ORDER BY s) <= $1 THEN 0 ELSE 1 END AS brk
+  FROM e
+), i AS (
+  SELECT {VIEWER_KEY}, s, sum(brk) OVER (PARTITION BY {VIEWER_KEY} ORDER BY s ROWS UNBOUNDED PRECEDING) AS island
+  FROM g
+), iv AS (
+  SELECT min(s) AS lo, max(s) + $1 AS hi FROM i GROUP BY {VIEWER_KEY}, island
+), d AS (
+  SELECT s, sum(d) AS d FROM (SELECT lo AS s, 1 AS d FROM iv UNION ALL SELECT hi, -1 FROM iv) x GROUP BY s
+), b AS (
+  SELECT floor(extract(epoch FROM min(ts)))::bigint AS lo, ceil(extract(epoch FROM now()))::bigint AS hi
+  FROM events WHERE ts > now() - interval '15 minutes'
+)
+SELECT t AS sec, sum(coalesce(d.d, 0)) OVER (ORDER BY t)::bigint AS concurrent
+FROM b, generate_series(b.lo, b.hi) AS t LEFT JOIN d ON d.s = t
+ORDER BY t
+"""
+
+
+async def open_pool(server_settings: dict = None):
+    global pool
+    import asyncpg
+    pool = await asyncpg.create_pool(user=PG_USER, password=PG_PW, database=PG_DB, host=PG_HOST,
+                                     port=int(PG_PORT), min_size=PG_ASYNC_POOL_MIN, max_size=PG_ASYNC_POOL_MAX,
+                                     server_settings=server_settings)
+    return pool
+
+
+async def close_pool():
+    global pool
+    if pool is not None:
+        await pool.close()
+        pool = None
+
+
+async def kpis() -> dict:
+    with QUERY_SECONDS.labels("kpis").time():
+        r = await pool.fetchrow(KPIS_SQL)
+    return {"active_viewers": int(r["active"]), "events_per_sec": round(r["last_10s"] / 10.0, 2),
+            "avg_dwell_min": round(float(r["dwell"] or 0) / 60, 2)}
+
+
+async def countries() -> list:
+    with QUERY_SECONDS.labels("countries").time():
+        rows = await pool.fetch(COUNTRIES_SQL)
+    return [{"country": r["country"], "active_viewers": int(r["viewers"])} for r in rows]
+
+
+async def countries_hll() -> list:
+    """Top countries from merged minute sketches (src/rollups.py, DISTINCT_MODE=hll)."""
+    with QUERY_SECONDS.labels("countries_hll").time():
+        rows = await pool.fetch(COUNTRIES_HLL_SQL)
+    merged = {}
+    for r in rows:
+        regs = sketch.from_bytes(r["viewers_hll"])
+        prev = merged.get(r["key"])
+        merged[r["key"]] = regs if prev is None else np.maximum(prev, regs)
+    if not merged:
+        return []
+    est = sketch.estimate(np.stack(list(merged.values())))
+    top = sorted(zip(merged, np.rint(est).astype(int).tolist()), key=lambda kv: -kv[1])[:10]
+    return [{"country": c, "active_viewers": v} for c, v in top]
+
+
+async def concurrency(window_sec: int = WINDOW_SEC) -> list:
+    with QUERY_SECONDS.labels("concurrency").time():
+        rows = await pool.fetch(CONCURRENCY_SQL, window_sec)
+    return [{"sec": datetime.fromtimestamp(r["sec"], timezone.utc).isoformat(), "concurrent": r["concurrent"]}
+            for r in rows]
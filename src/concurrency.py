@@ -0,0 +1,49 @@
+# src/concurrency.py
+import numpy as np
+import pandas as pd
+
+WINDOW_SEC = 60
+
+
+def concurrent_viewers(events: pd.DataFrame, now: pd.Timestamp,
+                       window_sec: int = WINDOW_SEC, start: pd.Timestamp = None) -> pd.DataFrame:
+    """
+    Per-second "concurrent viewers" series: for each second t on the timeline,
+    the number of distinct viewers with at least one event in (t - window, t].
+    Expects columns: ['ts','viewer_id'].
+    Returns columns: ['sec','concurrent'] with one row per second from
+    floor(start or min ts) to ceil(now).
+    Notes:
+      - Each event covers the grid seconds [ceil(ts), ceil(ts) + window). Events of the
+        same viewer whose coverage touches are merged into one interval, so every
+        viewer/interval adds +1/-1 once and a cumulative sum gives the series.
+      - Cost is one sort over the events, independent of the timeline length.
+    """
+    if events is None or events.empty:
+        return pd.DataFrame({"sec": pd.DatetimeIndex([], tz="UTC"), "concurrent": np.array([], dtype="int64")})
+
+    ts = pd.to_datetime(events["ts"], utc=True)
+    if start is None:
+        start = ts.min()
+    start = start.floor("s")
+    timeline = pd.date_range(start, now.ceil("s"), freq="s")
+    n_sec = len(timeline)
+
+    # first grid second (relative to start) whose window contains the event
+    sec = ((ts.dt.ceil("s") - start) // pd.Timedelta(seconds=1)).to_numpy(dtype="int64")
+    viewer, _ = pd.factorize(events["viewer_id"])
+
+    order = np.lexsort((sec, viewer))
+    sec, viewer = sec[order], viewer[order]
+
+    # a new interval starts at each viewer change or when the gap exceeds the window
+    brk = np.ones(len(sec), dtype=bool)
+    brk[1:] = (viewer[1:] != viewer[:-1]) | (sec[1:] - sec[:-1] > window_sec)
+    first = np.flatnonzero(brk)
+    last = np.r_[first[1:] - 1, len(sec) - 1]
+
+    lo = np.clip(sec[first], 0, n_sec)
+    hi = np.clip(sec[last] + window_sec, 0, n_sec)
+    delta = np.bincount(lo, minlength=n_sec + 1) - np.bincount(hi, minlength=n_sec + 1)
+
+    return pd.DataFrame({"sec": timeline, "concurrent": np.cumsum(delta[:n_sec])})
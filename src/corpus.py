@@ -0,0 +1,236 @@
+# src/corpus.py
+import os, argparse, time
+from collections import namedtuple
+from datetime import datetime, timezone
+import numpy as np
+import pyarrow as pa
+from src import loadgen, wire
+
+# Event corpora on disk for offline, reproducible runs of the pipeline without Kafka.
+# generate() runs the load generator's session model (src/loadgen.py) on a virtual clock from
+# a seed and writes the fields of wire.RECORD as columns, zstd-compressed:
+#   ts_us int64 | event_type uint8 (wire code) | country fixed 2 B | viewer_id fixed 12 B | video_id fixed 8 B
+# to Parquet (.parquet) or Arrow IPC (.arrow). Same seed, start and rate -> same file.
+# FileConsumer replays a corpus as Kafka-shaped messages holding binary wire records, so
+# `python -m src.kafka_consumer --source FILE` exercises the real decode, KPI and write path.
+#   python -m src.corpus generate data/corpus_10m.parquet --events 10000000 --eps 50000 --seed 1
+CORPUS_ROW_GROUP = int(os.getenv("CORPUS_ROW_GROUP", "1000000"))
+DEFAULT_START = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+SCHEMA = pa.schema([("ts_us", pa.int64()), ("event_type", pa.uint8()), ("country", pa.binary(2)),
+                    ("viewer_id", pa.binary(12)), ("video_id", pa.binary(8))])
+
+# Stand-ins for the confluent_kafka types the consumer uses, for runs without the client.
+TopicPartition = namedtuple("TopicPartition", "topic partition offset", defaults=(-1,))
+
+
+class KafkaException(Exception):
+    pass
+
+
+def _fixed(values: np.ndarray, width: int) -> pa.Array:
+    return pa.FixedSizeBinaryArray.from_buffers(pa.binary(width), len(values), [None, pa.py_buffer(values.tobytes())])
+
+
+def _table(ticks) -> pa.Table:
+    """Concatenated (ts_us, loadgen tick columns) into a table in SCHEMA."""
+    ts = np.concatenate([np.full(len(ev["event"]), t, np.int64) for t, ev in ticks])
+    ev = {k: np.concatenate([e[k] for _, e in ticks]) for k in ("event", "viewer", "video", "country")}
+    return pa.table([pa.array(ts), pa.array(ev["event"]), _fixed(loadgen.COUNTRY_BYTES[ev["country"]], 2),
+                     _fixed(ev["viewer"], 12), _fixed(loadgen.VIDEO_BYTES[ev["video"]], 8)], schema=SCHEMA)
+
+
+def _open_writer(path: str):
+    if path.endswith(".arrow"):
+        sink = pa.OSFile(path, "wb")
+        w = pa.ipc.new_file(sink, SCHEMA, options=pa.ipc.IpcWriteOptions(compression="zstd"))
+        return w, sink
+    import pyarrow.parquet as pq
+    return pq.ParquetWriter(path, SCHEMA, compression="zstd"), None
+
+
+def generate(path: str, events: int, eps: float = 0, seed: int = 0, start: datetime = None,
+             warmup: float = None, row_group: int = CORPUS_ROW_GROUP) -> int:
+    """Write about `events` events (whole ticks) to path; returns the number written."""
+    scale = eps / (loadgen.kp.BASE_ARRIVAL_RATE * loadgen.events_per_session()) if eps else 1.0
+    sim = loadgen.VectorSim(rate_scale=scale, seed=seed)
+    t = (start or DEFAULT_START).timestamp()
+    warmup = loadgen.kp.MAX_DWELL_SEC if warmup is None else warmup
+    for w in range(int(warmup)):
+        sim.tick(t - warmup + w)
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    writer, sink = _open_writer(path)
+    written, pending, n_pending = 0, [], 0
+    try:
+        while written + n_pending < events:
+            ev = sim.tick(t)
+            pending.append((int(t * 1_000_000), ev))
+            n_pending += len(ev["event"])
+            t += 1.0
+            if n_pending >= row_group:
+                writer.write_table(_table(pending))
+                written, pending, n_pending = written + n_pending, [], 0
+        if pending:
+            writer.write_table(_table(pending))
+            written += n_pending
+    finally:
+        writer.close()
+        if sink is not None:
+            sink.close()
+    return written
+
+
+def read_batches(path: str, batch_rows: int = 65536):
+    """Record batches of a corpus in file order."""
+    if path.endswith(".arrow"):
+        with pa.memory_map(path) as src:
+            reader = pa.ipc.open_file(src)
+            for i in range(reader.num_record_batches):
+                b = reader.get_batch(i)
+                for off in range(0, b.num_rows, batch_rows):
+                    yield b.slice(off, batch_rows)
+        return
+    import pyarrow.parquet as pq
+    yield from pq.ParquetFile(path).iter_batches(batch_size=batch_rows)
+
+
+def count(path: str) -> int:
+    if path.endswith(".arrow"):
+        with pa.memory_map(path) as src:
+            return pa.ipc.open_file(src).read_all().num_rows
+    import pyarrow.parquet as pq
+    return pq.ParquetFile(path).metadata.num_rows
+
+
+def _column(batch: pa.RecordBatch, name: str, dtype) -> np.ndarray:
+    col = batch.column(name)
+    if isinstance(col, pa.ChunkedArray):
+        col = col.combine_chunks()
+    if pa.types.is_fixed_size_binary(col.type):
+        w = col.type.byte_width
+        return np.frombuffer(col.buffers()[1], dtype=f"S{w}", count=len(col), offset=col.offset * w)
+    return col.to_numpy(zero_copy_only=False).astype(dtype, copy=False)
+
+
+def to_records(batch: pa.RecordBatch, ts_shift_us: int = 0) -> np.ndarray:
+    """A corpus batch as wire.RECORD structs (what the producer would have sent)."""
+    rec = np.empty(batch.num_rows, dtype=wire.RECORD)
+    rec["magic"] = wire.BINARY_MAGIC
+    rec["event"] = _column(batch, "event_type", np.uint8)
+    rec["country"] = _column(batch, "country", "S2")
+    rec["ts_us"] = _column(batch, "ts_us", np.int64) + ts_shift_us
+    rec["viewer_id"] = _column(batch, "viewer_id", "S12")
+    rec["video_id"] = _column(batch, "video_id", "S8")
+    return rec
+
+
+def to_cols(batch: pa.RecordBatch, ts_shift_us: int = 0) -> dict:
+    """A corpus batch in wire.decode_batch() column form, for stage benchmarks that skip parsing."""
+    rec = to_records(batch, ts_shift_us)
+    cols, _ = wire.decode_batch(np.frombuffer(rec.tobytes(), dtype=f"V{wire.RECORD.itemsize}").tolist())
+    return cols
+
+
+class FileMessage:
+    """The slice of confluent_kafka.Message the consumer uses."""
+    __slots__ = ("_value", "_topic", "_offset")
+
+    def __init__(self, value: bytes, topic: str, offset: int):
+        self._value, self._topic, self._offset = value, topic, offset
+
+    def value(self):
+        return self._value
+
+    def topic(self):
+        return self._topic
+
+    def partition(self):
+        return 0
+
+    def offset(self):
+        return self._offset
+
+    def error(self):
+        return None
+
+
+class FileConsumer:
+    """
+    Kafka-consumer-shaped reader over a corpus (one partition, offsets = row numbers).
+    consume() returns [] once the file is drained and sets `eof`; commit() records the
+    committed offset. rebase=True shifts timestamps so the first event is at start time.
+    """
+
+    def __init__(self, path: str, topic: str = "corpus", rebase: bool = False, batch_rows: int = 65536):
+        self.path, self.topic = path, topic
+        self.total = count(path)
+        self.batches = read_batches(path, batch_rows)
+        self.buf, self.pos, self.offset = [], 0, 0
+        self.committed = 0
+        self.eof = False
+        self.shift = None if rebase else 0
+        self.started = time.time()
+
+    def subscribe(self, topics, on_assign=None, on_revoke=None):
+        if on_assign is not None:
+            on_assign(self, [TopicPartition(self.topic, 0)])
+
+    def consume(self, num_messages: int = 1, timeout: float = None):
+        out = []
+        while len(out) < num_messages:
+            if self.pos >= len(self.buf):
+                batch = next(self.batches, None)
+                if batch is None:
+                    self.eof = True
+                    break
+                if self.shift is None:
+                    self.shift = int(self.started * 1_000_000) - int(_column(batch, "ts_us", np.int64)[0])
+                self.buf = np.frombuffer(to_records(batch, self.shift).tobytes(), dtype=f"V{wire.RECORD.itemsize}").tolist()
+                self.pos = 0
+            take = self.buf[self.pos:self.pos + num_messages - len(out)]
+            out.extend(FileMessage(v, self.topic, self.offset + i) for i, v in enumerate(take))
+            self.pos += len(take)
+            self.offset += len(take)
+        return out
+
+    def commit(self, offsets=None, asynchronous=True):
+        for tp in offsets or []:
+            self.committed = max(self.committed, tp.offset)
+
+    def assignment(self):
+        return [TopicPartition(self.topic, 0)]
+
+    def pause(self, partitions):
+        pass
+
+    def resume(self, partitions):
+        pass
+
+    def get_watermark_offsets(self, tp, cached=False):
+        return 0, self.total
+
+    def close(self):
+        self.batches.close()
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="event corpora for offline runs")
+    ap.add_argument("command", choices=["generate", "info"])
+    ap.add_argument("path", help=".parquet or .arrow")
+    ap.add_argument("--events", type=int, default=1_000_000)
+    ap.add_argument("--eps", type=float, default=50_000, help="simulated events/sec (sets sessions per tick)")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--start", type=str, default=None, help="ISO-8601 virtual clock start")
+    args = ap.parse_args()
+    if args.command == "generate":
+        start = datetime.fromisoformat(args.start) if args.start else None
+        if start is not None and start.tzinfo is None:
+            start = start.replace(tzinfo=timezone.utc)
+        t0 = time.perf_counter()
+        n = generate(args.path, args.events, eps=args.eps, seed=args.seed, start=start)
+        dt = time.perf_counter() - t0
+        print(f"[corpus] {n:,} events -> {args.path} ({os.path.getsize(args.path) / n:.1f} B/event) "
+              f"in {dt:.1f}s ({n / dt:,.0f} events/s)")
+    else:
+        print(f"[corpus] {args.path}: {count(args.path):,} events, {os.path.getsize(args.path) / 2**20:.1f} MB")
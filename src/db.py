@@ -1,4 +1,5 @@
-import os
+import os, re, argparse
+from datetime import datetime, timedelta, timezone
 import sqlalchemy as sa
 from sqlalchemy import text
 from dotenv import load_dotenv
@@ -11,7 +12,57 @@ PG_DB   = os.getenv("POSTGRES_DB","viewerdb")
 PG_HOST = os.getenv("POSTGRES_HOST","localhost")
 PG_PORT = os.getenv("POSTGRES_PORT","5432")
 
-ENGINE = sa.create_engine(f"postgresql+psycopg2://{PG_USER}:{PG_PW}@{PG_HOST}:{PG_PORT}/{PG_DB}", pool_pre_ping=True)
+PG_POOL_SIZE = int(os.getenv("PG_POOL_SIZE", "5"))
+
+# events partitioning: none | hour | day. Partitions are created PARTITION_PREMAKE ahead;
+# with EVENTS_RETENTION_HOURS > 0, partitions entirely older than that are dropped
+# (or only detached with RETENTION_ACTION=detach).
+EVENTS_PARTITION = os.getenv("EVENTS_PARTITION", "day")
+PARTITION_PREMAKE = int(os.getenv("PARTITION_PREMAKE", "3"))
+EVENTS_RETENTION_HOURS = int(os.getenv("EVENTS_RETENTION_HOURS", "0"))   # 0 = keep everything
+RETENTION_ACTION = os.getenv("RETENTION_ACTION", "drop")
+
+# events layout: text (one table, dimensions stored as TEXT) | keyed (facts with integer
+# surrogate keys into dim_* tables and an enum event_type; `events` becomes a view that
+# joins the names back, see src/dims.py). Readers that only count or group viewers use
+# VIEWER_KEY so the keyed view never has to touch dim_viewer.
+EVENTS_LAYOUT = os.getenv("EVENTS_LAYOUT", "text")
+KEYED = EVENTS_LAYOUT == "keyed"
+EVENTS_TABLE = "event_facts" if KEYED else "events"     # the physical (partitioned) table
+VIEWER_KEY = "viewer_key" if KEYED else "viewer_id"
+
+# Secondary indexes on the ts window, managed by ensure_indexes() (EVENTS_INDEXES picks the
+# set; managed indexes left out are dropped). Every read path filters a recent ts range:
+#   ts_cover  btree on ts carrying the columns the window queries group by, so KPIs,
+#             countries, concurrency and the raw panels run as index-only scans
+#   ts_brin   BRIN on ts for long range scans over history (backfills, batch forecasts);
+#             a few pages per GB since ids and ts grow together
+#   starts    partial btree over view_start rows (starts per minute, per-series forecasts)
+#   ts        plain btree on ts (the original index; superseded by ts_cover)
+# Index-only scans skip the heap only for all-visible pages, so partitions are vacuumed
+# after every EVENTS_VACUUM_INSERT_ROWS inserts instead of after 20% growth.
+# ensure_schema() builds missing indexes online (CREATE INDEX CONCURRENTLY per leaf table,
+# then attached to an ON ONLY parent index), so a first deploy over a large table does not
+# block ingest while they build; superseded ones are dropped only after that.
+EVENTS_INDEXES = [n for n in os.getenv("EVENTS_INDEXES", "ts_cover,ts_brin,starts").split(",") if n]
+EVENTS_VACUUM_INSERT_ROWS = int(os.getenv("EVENTS_VACUUM_INSERT_ROWS", "100000"))   # 0 = server default
+
+INDEXES = {
+    "ts": "(ts)",
+    "ts_cover": "(ts) INCLUDE ({cover})",
+    "ts_brin": "USING brin (ts) WITH (pages_per_range = 32)",
+    "starts": "(ts) INCLUDE ({starts}) WHERE event_type = 'view_start'",
+}
+# Columns carried per layout. Through the keyed view a removed dimension join still counts
+# its key column as needed, so index-only scans there need every key in the index.
+INDEX_COLUMNS = {
+    "events": {"cover": "viewer_id, event_type, country", "starts": "country, video_id"},
+    "event_facts": {"cover": "viewer_key, event_type, country_key, video_key",
+                    "starts": "viewer_key, country_key, video_key"},
+}
+
+ENGINE = sa.create_engine(f"postgresql+psycopg2://{PG_USER}:{PG_PW}@{PG_HOST}:{PG_PORT}/{PG_DB}",
+                          pool_pre_ping=True, pool_size=PG_POOL_SIZE)
 
 CREATE_EVENTS_SQL = """
 CREATE TABLE IF NOT EXISTS events (
@@ -22,17 +73,452 @@ CREATE TABLE IF NOT EXISTS events (
   event_type TEXT NOT NULL,  -- view_start | heartbeat | view_end
   country TEXT NOT NULL
 );
-CREATE INDEX IF NOT EXISTS idx_events_ts ON events(ts);
 CREATE INDEX IF NOT EXISTS idx_events_viewer ON events(viewer_id);
 """
 
-CREATE_ROLLUPS_SQL = """
-CREATE TABLE IF NOT EXISTS rollup_hourly AS
-SELECT now()::timestamptz AS ts, 0::int AS events, 0::int AS active_viewers
-WHERE FALSE;
+# Range-partitioned on ts. The primary key must include the partition key; ids still come
+# from one sequence so they stay globally increasing. events_default catches rows outside
+# every pre-created range (late replays, clock skew).
+CREATE_EVENTS_PARTITIONED_SQL = """
+CREATE SEQUENCE IF NOT EXISTS events_id_seq;
+CREATE TABLE IF NOT EXISTS events (
+  id BIGINT NOT NULL DEFAULT nextval('events_id_seq'),
+  ts TIMESTAMPTZ NOT NULL,
+  viewer_id TEXT NOT NULL,
+  video_id TEXT NOT NULL,
+  event_type TEXT NOT NULL,  -- view_start | heartbeat | view_end
+  country TEXT NOT NULL,
+  PRIMARY KEY (id, ts)
+) PARTITION BY RANGE (ts);
+ALTER SEQUENCE events_id_seq OWNED BY events.id;
+CREATE INDEX IF NOT EXISTS idx_events_viewer ON events(viewer_id);
+CREATE TABLE IF NOT EXISTS events_default PARTITION OF events DEFAULT;
+"""
+
+# Keyed layout. Fact rows are fixed width (32 B of data vs ~50 B with TEXT dimensions);
+# columns are ordered widest first so there is no alignment padding. Keys are identity
+# columns handed out by src/dims.py get-or-create; viewer keys are BIGINT because every
+# session gets a fresh viewer id, and retention prunes the ones no fact uses (prune_dims).
+CREATE_DIMS_SQL = """
+DO $$ BEGIN
+  CREATE TYPE event_kind AS ENUM ('view_start', 'heartbeat', 'view_end');
+EXCEPTION WHEN duplicate_object THEN NULL;
+END $$;
+CREATE TABLE IF NOT EXISTS dim_viewer (
+  key BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+  viewer_id TEXT NOT NULL UNIQUE,
+  last_seen TIMESTAMPTZ NOT NULL DEFAULT now()   -- last get-or-create, see prune_dims()
+);
+ALTER TABLE dim_viewer ADD COLUMN IF NOT EXISTS last_seen TIMESTAMPTZ NOT NULL DEFAULT now();
+CREATE TABLE IF NOT EXISTS dim_video (
+  key SMALLINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+  video_id TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS dim_country (
+  key SMALLINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+  country TEXT NOT NULL UNIQUE
+);
+"""
+
+CREATE_FACTS_SQL = """
+CREATE TABLE IF NOT EXISTS event_facts (
+  id BIGSERIAL PRIMARY KEY,
+  ts TIMESTAMPTZ NOT NULL,
+  viewer_key BIGINT NOT NULL,
+  event_type event_kind NOT NULL,
+  video_key SMALLINT NOT NULL,
+  country_key SMALLINT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_event_facts_viewer ON event_facts(viewer_key);
+"""
+
+CREATE_FACTS_PARTITIONED_SQL = """
+CREATE SEQUENCE IF NOT EXISTS event_facts_id_seq;
+CREATE TABLE IF NOT EXISTS event_facts (
+  id BIGINT NOT NULL DEFAULT nextval('event_facts_id_seq'),
+  ts TIMESTAMPTZ NOT NULL,
+  viewer_key BIGINT NOT NULL,
+  event_type event_kind NOT NULL,
+  video_key SMALLINT NOT NULL,
+  country_key SMALLINT NOT NULL,
+  PRIMARY KEY (id, ts)
+) PARTITION BY RANGE (ts);
+ALTER SEQUENCE event_facts_id_seq OWNED BY event_facts.id;
+CREATE INDEX IF NOT EXISTS idx_event_facts_viewer ON event_facts(viewer_key);
+CREATE TABLE IF NOT EXISTS event_facts_default PARTITION OF event_facts DEFAULT;
+"""
+
+# The dimension joins are LEFT JOINs on unique keys, so the planner removes every join
+# whose columns a query does not use: SELECT ts, viewer_key ... reads event_facts alone.
+CREATE_EVENTS_VIEW_SQL = """
+CREATE OR REPLACE VIEW events AS
+SELECT f.id, f.ts, v.viewer_id, d.video_id, f.event_type, c.country,
+       f.viewer_key, f.video_key, f.country_key
+FROM event_facts f
+LEFT JOIN dim_viewer v ON v.key = f.viewer_key
+LEFT JOIN dim_video d ON d.key = f.video_key
+LEFT JOIN dim_country c ON c.key = f.country_key;
+"""
+
+# Pre-aggregated event counts per (bucket, dim, key) at three grains; dim is
+# 'all' (key ''), 'country' or 'video'. See src/rollups.py for how they are filled.
+ROLLUP_TABLES = {"second": "rollup_second", "minute": "rollup_minute", "hour": "rollup_hour"}
+
+CREATE_ROLLUP_SQL = """
+CREATE TABLE IF NOT EXISTS {table} (
+  bucket TIMESTAMPTZ NOT NULL,
+  dim TEXT NOT NULL,         -- all | country | video
+  key TEXT NOT NULL,
+  events BIGINT NOT NULL,
+  starts BIGINT NOT NULL,
+  ends BIGINT NOT NULL,
+  heartbeats BIGINT NOT NULL,
+  viewers BIGINT NOT NULL,   -- unique viewers in the bucket (HLL estimate in hll mode)
+  viewers_hll BYTEA,         -- zlib'd HyperLogLog registers (src/sketch.py), minute/hour only
+  PRIMARY KEY (bucket, dim, key)
+);
+ALTER TABLE {table} ADD COLUMN IF NOT EXISTS viewers_hll BYTEA;
 """
+CREATE_ROLLUPS_SQL = "".join(CREATE_ROLLUP_SQL.format(table=t) for t in ROLLUP_TABLES.values())
+
+# Batch per-series forecasts (src/models/batch_forecast.py): future minutes only, replaced
+# per dim on every run. dim/key as in the rollups; sparse keys are pooled into '(other)'.
+CREATE_FORECASTS_SQL = """
+CREATE TABLE IF NOT EXISTS forecasts (
+  dim TEXT NOT NULL,         -- all | country | video
+  key TEXT NOT NULL,
+  ds TIMESTAMPTZ NOT NULL,
+  yhat DOUBLE PRECISION NOT NULL,
+  yhat_lower DOUBLE PRECISION NOT NULL,
+  yhat_upper DOUBLE PRECISION NOT NULL,
+  model TEXT NOT NULL,       -- prophet | holt
+  fitted_at TIMESTAMPTZ NOT NULL,
+  PRIMARY KEY (dim, key, ds)
+);
+"""
+
+PARTITION_STEP = {"hour": timedelta(hours=1), "day": timedelta(days=1)}
+
+
+def _events_kind(conn, table: str = "events"):
+    """'r' (plain table), 'p' (partitioned), 'v' (keyed view) or None (missing)."""
+    return conn.execute(text(
+        "SELECT c.relkind FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace "
+        "WHERE c.relname = :name AND n.nspname = current_schema()"
+    ), {"name": table}).scalar()
+
+
+def _floor(t: datetime, unit: str) -> datetime:
+    t = t.astimezone(timezone.utc).replace(minute=0, second=0, microsecond=0)
+    return t.replace(hour=0) if unit == "day" else t
+
+
+def _partition_name(start: datetime, unit: str, table: str = "events") -> str:
+    return f"{table}_p" + start.strftime("%Y%m%d" if unit == "day" else "%Y%m%d%H")
+
+
+def ensure_partitions(conn, unit: str = None, now: datetime = None, ahead: int = None, table: str = None):
+    """
+    Create the partition holding now plus `ahead` upcoming ones (idempotent). Rows that
+    already landed in the DEFAULT partition for a new range (future-dated events, or
+    maintenance down for longer than PARTITION_PREMAKE steps) are moved into it: the
+    partition is built standalone, filled from DEFAULT, then attached.
+    """
+    unit = unit or EVENTS_PARTITION
+    table = table or EVENTS_TABLE
+    ahead = PARTITION_PREMAKE if ahead is None else ahead
+    step = PARTITION_STEP[unit]
+    start = _floor(now or datetime.now(timezone.utc), unit)
+    default = f"{table}_default" if _events_kind(conn, f"{table}_default") else None
+    for i in range(ahead + 1):
+        lo, hi = start + i * step, start + (i + 1) * step
+        name = _partition_name(lo, unit, table)
+        bounds = f"FOR VALUES FROM ('{lo.isoformat()}') TO ('{hi.isoformat()}')"
+        if _events_kind(conn, name) is not None:
+            continue
+        stray = default and conn.execute(text(
+            f"SELECT EXISTS (SELECT 1 FROM {default} WHERE ts >= :lo AND ts < :hi)"), {"lo": lo, "hi": hi}).scalar()
+        if not stray:
+            conn.execute(text(f"CREATE TABLE {name} PARTITION OF {table} {bounds}{_vacuum_options()}"))
+            continue
+        conn.execute(text(f"CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS){_vacuum_options()}"))
+        n = conn.execute(text(
+            f"WITH moved AS (DELETE FROM {default} WHERE ts >= :lo AND ts < :hi RETURNING *) "
+            f"INSERT INTO {name} SELECT * FROM moved"), {"lo": lo, "hi": hi}).rowcount
+        conn.execute(text(f"ALTER TABLE {table} ATTACH PARTITION {name} {bounds}"))
+        print(f"[db] moved {n:,} rows from {default} into new partition {name}")
+
+
+def _vacuum_options(prefix: str = " WITH ") -> str:
+    if EVENTS_VACUUM_INSERT_ROWS <= 0:
+        return ""
+    return (f"{prefix}(autovacuum_vacuum_insert_threshold = {EVENTS_VACUUM_INSERT_ROWS}, "
+            f"autovacuum_vacuum_insert_scale_factor = 0)")
+
+
+def _index_valid(conn, name: str):
+    """True / False (e.g. a failed concurrent build) for an existing index, None if missing."""
+    return conn.execute(text(
+        "SELECT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+        "JOIN pg_namespace n ON n.oid = c.relnamespace WHERE c.relname = :name AND n.nspname = current_schema()"
+    ), {"name": name}).scalar()
+
+
+def _create_index_online(conn, table: str, idx: str, spec: str, partitioned: bool, leaves):
+    """CREATE INDEX CONCURRENTLY on table, or on each leaf attached to an ON ONLY parent index."""
+    if not partitioned:
+        if _index_valid(conn, idx) is False:
+            conn.execute(text(f"DROP INDEX CONCURRENTLY {idx}"))
+        conn.execute(text(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {idx} ON {table} {spec}"))
+        return
+    conn.execute(text(f"CREATE INDEX IF NOT EXISTS {idx} ON ONLY {table} {spec}"))
+    if _index_valid(conn, idx):
+        return
+    attached = set(conn.execute(text(
+        "SELECT i.indrelid FROM pg_inherits h JOIN pg_index i ON i.indexrelid = h.inhrelid "
+        "WHERE h.inhparent = CAST(:idx AS regclass)"), {"idx": idx}).scalars())
+    for oid, leaf in leaves:
+        if oid in attached:
+            continue
+        leaf_idx = f"{idx}_{leaf.rsplit('_', 1)[-1]}"
+        if _index_valid(conn, leaf_idx) is False:
+            conn.execute(text(f"DROP INDEX CONCURRENTLY {leaf_idx}"))
+        print(f"[db] building {leaf_idx} on {leaf} concurrently")
+        conn.execute(text(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {leaf_idx} ON {leaf} {spec}"))
+        conn.execute(text(f"ALTER INDEX {idx} ATTACH PARTITION {leaf_idx}"))
+
+
+def ensure_indexes(conn, table: str = None, names=None, concurrently: bool = False):
+    """
+    Create the `names` (default EVENTS_INDEXES) indexes on table, then drop the other managed
+    ones. concurrently=True builds without blocking writes and needs an autocommit connection
+    (see build_indexes()).
+    """
+    table = table or EVENTS_TABLE
+    names = EVENTS_INDEXES if names is None else names
+    unknown = set(names) - set(INDEXES)
+    if unknown:
+        raise ValueError(f"unknown EVENTS_INDEXES {sorted(unknown)}; expected some of {sorted(INDEXES)}")
+    cols = INDEX_COLUMNS["event_facts" if table == "event_facts" else "events"]
+    partitioned = _events_kind(conn, table) == "p"
+    # leaf tables: where concurrent builds run; partitioned parents take no storage parameters
+    leaves = conn.execute(text(
+        "SELECT c.oid, c.relname FROM pg_class c WHERE c.relkind = 'r' AND (c.oid = CAST(:t AS regclass) "
+        "OR c.oid IN (SELECT inhrelid FROM pg_inherits WHERE inhparent = CAST(:t AS regclass)))"
+    ), {"t": table}).fetchall()
+    for name in names:
+        idx, spec = f"idx_{table}_{name}", INDEXES[name].format(**cols)
+        if concurrently:
+            _create_index_online(conn, table, idx, spec, partitioned, leaves)
+        else:
+            conn.execute(text(f"CREATE INDEX IF NOT EXISTS {idx} ON {table} {spec}"))
+    for name in INDEXES:
+        if name not in names:
+            online = " CONCURRENTLY" if concurrently and not partitioned else ""
+            conn.execute(text(f"DROP INDEX{online} IF EXISTS idx_{table}_{name}"))
+    for _, leaf in leaves if EVENTS_VACUUM_INSERT_ROWS > 0 else ():
+        conn.execute(text(f"ALTER TABLE {leaf} SET {_vacuum_options('')}"))
+
+
+def build_indexes(table: str = None, names=None):
+    """ensure_indexes() online, on its own autocommit connection."""
+    with ENGINE.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        ensure_indexes(conn, table, names, concurrently=True)
+
+
+def expire_partitions(conn, retention_hours: int = None, action: str = None, now: datetime = None,
+                      table: str = None):
+    """Drop (or detach) partitions whose upper bound is older than the retention window."""
+    retention_hours = EVENTS_RETENTION_HOURS if retention_hours is None else retention_hours
+    action = action or RETENTION_ACTION
+    table = table or EVENTS_TABLE
+    if retention_hours <= 0:
+        return []
+    cutoff = (now or datetime.now(timezone.utc)) - timedelta(hours=retention_hours)
+    parts = conn.execute(text(
+        "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid WHERE i.inhparent = CAST(:table AS regclass)"
+    ), {"table": table}).fetchall()
+    expired = []
+    for name, bound in parts:
+        m = re.search(r"TO \('([^']+)'\)", bound or "")
+        if not m or datetime.fromisoformat(m.group(1)) > cutoff:
+            continue   # DEFAULT / MAXVALUE partitions or still inside retention
+        if action == "detach":
+            conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+        else:
+            conn.execute(text(f"DROP TABLE {name}"))
+        expired.append(name)
+    if expired:
+        print(f"[db] {action} expired partitions: {', '.join(expired)}")
+    return expired
+
+
+def prune_dims(retention_hours: int = None, action: str = None, now: datetime = None, batch: int = 10_000):
+    """
+    Delete dim_viewer rows no event_facts row refers to and no consumer fetched within the
+    retention window plus DIM_CACHE_TTL_SEC (so no KeyCache still holds them), in batches of
+    one transaction each. Skipped with RETENTION_ACTION=detach: detached partitions keep
+    their keys. Videos and countries are few and are never pruned.
+    """
+    from src.dims import DIM_CACHE_TTL_SEC
+    retention_hours = EVENTS_RETENTION_HOURS if retention_hours is None else retention_hours
+    action = action or RETENTION_ACTION
+    if not KEYED or retention_hours <= 0 or action == "detach":
+        return 0
+    cutoff = ((now or datetime.now(timezone.utc)) - timedelta(hours=retention_hours)
+              - timedelta(seconds=DIM_CACHE_TTL_SEC))
+    total = 0
+    while True:
+        # last_seen is checked on the target row too, so a concurrent fetch wins the race
+        with ENGINE.begin() as conn:
+            n = conn.execute(text(
+                "DELETE FROM dim_viewer v USING ("
+                "  SELECT d.key FROM dim_viewer d WHERE d.last_seen < :cutoff"
+                "  AND NOT EXISTS (SELECT 1 FROM event_facts f WHERE f.viewer_key = d.key) LIMIT :batch"
+                ") s WHERE v.key = s.key AND v.last_seen < :cutoff"
+            ), {"cutoff": cutoff, "batch": batch}).rowcount
+        total += n
+        if n < batch:
+            break
+    if total:
+        print(f"[db] pruned {total:,} unreferenced dim_viewer rows")
+    return total
+
+
+def maintain_partitions():
+    """Pre-create upcoming partitions and apply retention; no-op for an unpartitioned table."""
+    with ENGINE.begin() as conn:
+        if _events_kind(conn, EVENTS_TABLE) != "p":
+            return
+        ensure_partitions(conn)
+        expired = expire_partitions(conn)
+    if expired:
+        prune_dims()
+
+
+def migrate_to_partitioned(unit: str = None):
+    """
+    Convert an existing plain `events` table in place (one transaction):
+    rename it to events_legacy, create the partitioned table on the same id sequence, and
+    attach events_legacy as the partition for everything before the next boundary after
+    its newest row. Old rows are not copied; the legacy partition leaves with retention
+    like any other. ATTACH validates the range with a single scan of the old table.
+    """
+    unit = unit or (EVENTS_PARTITION if EVENTS_PARTITION != "none" else "day")
+    with ENGINE.begin() as conn:
+        kind = _events_kind(conn)
+        if kind == "p":
+            print("[db] events is already partitioned")
+            return
+        if kind == "v":
+            print("[db] events is the keyed view; event_facts is partitioned when created")
+            return
+        if kind is None:
+            conn.execute(text(CREATE_EVENTS_PARTITIONED_SQL))
+            ensure_partitions(conn, unit, table="events")
+            ensure_indexes(conn, "events")
+            return
+
+        newest = conn.execute(text("SELECT max(ts) FROM events")).scalar() or datetime.now(timezone.utc)
+        boundary = _floor(max(newest, datetime.now(timezone.utc)), unit) + PARTITION_STEP[unit]
+        conn.execute(text("ALTER TABLE events RENAME TO events_legacy"))
+        # the partitioned PK is (id, ts); ATTACH builds the matching index on the old table
+        conn.execute(text("ALTER TABLE events_legacy DROP CONSTRAINT events_pkey"))
+        for name in ["viewer", *INDEXES]:
+            conn.execute(text(f"ALTER INDEX IF EXISTS idx_events_{name} RENAME TO idx_events_legacy_{name}"))
+        conn.execute(text("ALTER TABLE events_legacy ALTER COLUMN id DROP DEFAULT"))
+        conn.execute(text(CREATE_EVENTS_PARTITIONED_SQL))
+        ensure_indexes(conn, "events")
+        # matching indexes of the legacy table become its partition indexes; the rest go
+        conn.execute(text(
+            f"ALTER TABLE events ATTACH PARTITION events_legacy "
+            f"FOR VALUES FROM (MINVALUE) TO ('{boundary.isoformat()}')"
+        ))
+        for name in INDEXES:
+            if name not in EVENTS_INDEXES:
+                conn.execute(text(f"DROP INDEX IF EXISTS idx_events_legacy_{name}"))
+        ensure_partitions(conn, unit, now=boundary, table="events")
+    print(f"[db] events migrated to {unit} partitions (legacy rows before {boundary.isoformat()})")
+
+
+def _ensure_keyed(conn):
+    """Dimension tables, event_facts (partitioned per EVENTS_PARTITION) and the events view."""
+    kind = _events_kind(conn)
+    if kind in ("r", "p"):
+        raise RuntimeError("EVENTS_LAYOUT=keyed but events is a table; "
+                           "run `python -m src.db keyed` to convert it")
+    conn.execute(text(CREATE_DIMS_SQL))
+    if _events_kind(conn, "event_facts") is None and EVENTS_PARTITION in PARTITION_STEP:
+        conn.execute(text(CREATE_FACTS_PARTITIONED_SQL))
+    else:
+        conn.execute(text(CREATE_FACTS_SQL))
+    if kind is None:
+        conn.execute(text(CREATE_EVENTS_VIEW_SQL))
+
+
+def migrate_to_keyed():
+    """
+    Convert a text-layout `events` table to the keyed layout in one transaction: fill the
+    dimension tables from its distinct values, copy the rows into event_facts with their
+    keys (ids kept, the sequence continues after them), drop the table and create the view.
+    Rows are rewritten, so expect roughly one scan plus one insert of the whole table.
+    """
+    with ENGINE.begin() as conn:
+        kind = _events_kind(conn)
+        if kind == "v":
+            print("[db] events is already keyed")
+            return
+        conn.execute(text(CREATE_DIMS_SQL))
+        if EVENTS_PARTITION in PARTITION_STEP:
+            conn.execute(text(CREATE_FACTS_PARTITIONED_SQL))
+            ensure_partitions(conn, EVENTS_PARTITION, table="event_facts")
+        else:
+            conn.execute(text(CREATE_FACTS_SQL))
+        ensure_indexes(conn, "event_facts")
+        n = 0
+        if kind is not None:
+            for dim, col in (("dim_viewer", "viewer_id"), ("dim_video", "video_id"), ("dim_country", "country")):
+                conn.execute(text(f"INSERT INTO {dim} ({col}) SELECT DISTINCT {col} FROM events ORDER BY 1 "
+                                  f"ON CONFLICT ({col}) DO NOTHING"))
+            n = conn.execute(text(
+                "INSERT INTO event_facts (id, ts, viewer_key, event_type, video_key, country_key) "
+                "SELECT e.id, e.ts, v.key, e.event_type::event_kind, d.key, c.key FROM events e "
+                "JOIN dim_viewer v USING (viewer_id) JOIN dim_video d USING (video_id) "
+                "JOIN dim_country c USING (country)"
+            )).rowcount
+            conn.execute(text("SELECT setval('event_facts_id_seq', greatest((SELECT max(id) FROM event_facts), 1))"))
+            conn.execute(text("DROP TABLE events"))
+        conn.execute(text(CREATE_EVENTS_VIEW_SQL))
+    print(f"[db] events converted to the keyed layout ({n:,} rows); set EVENTS_LAYOUT=keyed")
+
 
 def ensure_schema():
     with ENGINE.begin() as conn:
-        conn.execute(text(CREATE_EVENTS_SQL))
+        kind = _events_kind(conn)
+        if KEYED:
+            _ensure_keyed(conn)
+        elif kind == "v":
+            raise RuntimeError("events is the keyed view; set EVENTS_LAYOUT=keyed")
+        elif kind is None and EVENTS_PARTITION in PARTITION_STEP:
+            conn.execute(text(CREATE_EVENTS_PARTITIONED_SQL))
+        elif kind is None or kind == "r":
+            conn.execute(text(CREATE_EVENTS_SQL))
+            if EVENTS_PARTITION in PARTITION_STEP:
+                print("[db] events is not partitioned; run `python -m src.db migrate` to convert it")
         conn.execute(text(CREATE_ROLLUPS_SQL))
+        conn.execute(text(CREATE_FORECASTS_SQL))
+    maintain_partitions()
+    build_indexes()
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="events schema management")
+    ap.add_argument("command", choices=["ensure", "migrate", "keyed", "maintain", "indexes"])
+    args = ap.parse_args()
+    if args.command == "indexes":
+        build_indexes()
+        print(f"[db] {EVENTS_TABLE} indexes: {', '.join(EVENTS_INDEXES) or '(none)'}")
+    else:
+        {"ensure": ensure_schema, "migrate": migrate_to_partitioned, "keyed": migrate_to_keyed,
+         "maintain": maintain_partitions}[args.command]()
@@ -0,0 +1,108 @@
+# src/dims.py
+import os, time
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+
+# Dimension keys for the keyed events layout (EVENTS_LAYOUT=keyed, see src/db.py).
+# KeyCache maps viewer / video / country names to the surrogate keys of dim_viewer,
+# dim_video and dim_country. A batch is factorized once, so each distinct name is looked up
+# once; names the cache has not seen are resolved in one round trip per dimension
+# (insert the missing ones, then select all of them) committed in their own transaction,
+# so a key is never handed out for a row whose dimension insert could still roll back.
+# Concurrent workers racing on the same new name both end up with the winner's key.
+# Each cache is an LRU of at most DIM_CACHE_MAX names; an entry older than DIM_CACHE_TTL_SEC
+# is fetched again, which also refreshes dim_viewer.last_seen. Retention (db.prune_dims) only
+# deletes viewers unseen for longer than that, so a cached key never outlives its row.
+DIM_CACHE_MAX = int(os.getenv("DIM_CACHE_MAX", "500000"))   # names kept per dimension
+DIM_CACHE_TTL_SEC = float(os.getenv("DIM_CACHE_TTL_SEC", "3600"))
+
+DIMS = {"viewer": ("dim_viewer", "viewer_id"), "video": ("dim_video", "video_id"),
+        "country": ("dim_country", "country")}
+
+FACT_COLUMNS = ("ts", "viewer_key", "event_type", "video_key", "country_key")
+
+# Only names that are really missing are inserted: ON CONFLICT still burns an identity
+# value, and video / country keys are SMALLINT. Sorted so concurrent inserts lock in order.
+GET_OR_CREATE_SQL = """
+INSERT INTO {table} ({col})
+SELECT v FROM unnest(%(names)s::text[]) AS v
+WHERE NOT EXISTS (SELECT 1 FROM {table} t WHERE t.{col} = v)
+ORDER BY v
+ON CONFLICT ({col}) DO NOTHING;
+SELECT {col}, key FROM {table} WHERE {col} = ANY(%(names)s::text[]);
+"""
+
+# dim_viewer rows also record when a cache last handed out their key (locked in key order).
+TOUCH_SQL = """
+UPDATE dim_viewer t SET last_seen = now()
+FROM (SELECT key FROM dim_viewer WHERE viewer_id = ANY(%(names)s::text[]) ORDER BY key FOR UPDATE) s
+WHERE t.key = s.key;
+"""
+
+
+class KeyCache:
+    """name -> key per dimension; keys(dim, values) returns an int64 array aligned with values."""
+
+    def __init__(self, engine, max_size: int = DIM_CACHE_MAX, ttl: float = DIM_CACHE_TTL_SEC):
+        self.engine = engine
+        self.max_size, self.ttl = max_size, ttl
+        self.maps = {dim: OrderedDict() for dim in DIMS}   # name -> (key, fetched at), LRU order
+        self.misses = 0                      # names fetched from Postgres
+
+    def keys(self, dim: str, values) -> np.ndarray:
+        codes, uniques = pd.factorize(np.asarray(values, dtype=object))
+        names = uniques.tolist()
+        m = self.maps[dim]
+        now = time.monotonic()
+        fresh = now - self.ttl
+        missing = []
+        for n in names:
+            hit = m.get(n)
+            if hit is None or hit[1] < fresh:
+                missing.append(n)
+            else:
+                m.move_to_end(n)
+        if missing:
+            for n, key in self.fetch(dim, missing).items():
+                m[n] = (key, now)
+                m.move_to_end(n)
+            while len(m) > max(self.max_size, len(names)):
+                m.popitem(last=False)        # least recently used; the batch itself always fits
+        lut = np.fromiter((m[n][0] for n in names), dtype=np.int64, count=len(names))
+        return lut[codes]
+
+    def fetch(self, dim: str, names) -> dict:
+        """Get-or-create keys for names (committed before returning)."""
+        table, col = DIMS[dim]
+        conn = self.engine.raw_connection()
+        try:
+            with conn.cursor() as cur:
+                if dim == "viewer":
+                    cur.execute(TOUCH_SQL, {"names": list(names)})
+                cur.execute(GET_OR_CREATE_SQL.format(table=table, col=col), {"names": list(names)})
+                found = dict(cur.fetchall())
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        self.misses += len(names)
+        return found
+
+
+class KeyedWriter:
+    """Wraps a writer built over event_facts/FACT_COLUMNS; takes rows in writers.COLUMNS order."""
+
+    def __init__(self, inner, cache: KeyCache):
+        self.inner, self.cache = inner, cache
+        self.name = inner.name
+
+    def write(self, rows, hooks=()):
+        if not rows:
+            return self.inner.write(rows, hooks)
+        ts, viewer, video, etype, country = zip(*rows)
+        keyed = zip(ts, self.cache.keys("viewer", viewer).tolist(), etype,
+                    self.cache.keys("video", video).tolist(), self.cache.keys("country", country).tolist())
+        self.inner.write(list(keyed), hooks)
@@ -0,0 +1,169 @@
+# src/event_cache.py
+import os, sqlite3, threading, time
+import numpy as np
+import pandas as pd
+
+# Process-wide cache of recent raw events for the dashboards (one instance per process via
+# st.cache_resource, shared by every session). Each refresh fetches only rows whose id is
+# above the watermark and appends them as one chunk of columns:
+#   id, ts (int64 epoch µs), viewer_id (str objects),
+#   event_type / country / video_id as int16 codes into grow-only dictionaries.
+# Chunks whose newest event is older than the horizon (the largest window any panel reads)
+# are dropped whole. The newest chunk is merged into the one before it while it is at least
+# as large (like a binary counter), dropping expired rows on the way, so there are O(log n)
+# chunks and a refresh costs amortized O(new rows) regardless of retained history.
+#
+# Postgres ids come from a sequence but commit in any order across consumer workers, so a
+# lower id can become visible after a higher one was read. Sources re-read `overlap` ids
+# below the watermark and rows already cached are skipped.
+
+CACHE_MIN_REFRESH_SEC = float(os.getenv("CACHE_MIN_REFRESH_SEC", "1.0"))
+CACHE_ID_OVERLAP = int(os.getenv("CACHE_ID_OVERLAP", "5000"))
+
+CODED = ("event_type", "country", "video_id")
+
+
+class EventCache:
+    def __init__(self, fetch, horizon_sec: float, overlap: int = 0, min_refresh_sec: float = CACHE_MIN_REFRESH_SEC):
+        """fetch(after_id, horizon_sec) -> dict of columns (id, ts, viewer_id, *CODED) in id order."""
+        self.fetch = fetch
+        self.horizon_sec = horizon_sec
+        self.overlap = overlap
+        self.min_refresh_sec = min_refresh_sec
+        self.lock = threading.Lock()
+        self.chunks = []                                # dicts of equal-length arrays
+        self.dicts = {c: {} for c in CODED}             # value -> code
+        self.values = {c: [] for c in CODED}            # code -> value
+        self.watermark = 0
+        self.tail_ids = np.empty(0, dtype=np.int64)    # cached ids within `overlap` of the watermark
+        self.refreshed = 0.0
+        self.listeners = []
+
+    def _encode(self, col: str, values) -> np.ndarray:
+        codes, uniq = pd.factorize(np.asarray(values, dtype=object))
+        d, vals = self.dicts[col], self.values[col]
+        for u in uniq:
+            if u not in d:
+                d[u] = len(vals)
+                vals.append(u)
+        remap = np.fromiter((d[u] for u in uniq), dtype=np.int16, count=len(uniq))
+        return remap[codes]
+
+    def refresh(self, now: float = None) -> int:
+        """Pull rows above the watermark and evict expired chunks; returns rows added."""
+        with self.lock:
+            if time.monotonic() - self.refreshed < self.min_refresh_sec:
+                return 0
+            self.refreshed = time.monotonic()
+            cols = self.fetch(max(0, self.watermark - self.overlap) if self.chunks else 0, self.horizon_sec)
+            ids = np.asarray(cols["id"], dtype=np.int64)
+            if self.overlap and self.chunks:
+                keep = ~np.isin(ids, self.tail_ids)
+                cols = {k: np.asarray(v)[keep] for k, v in cols.items()}
+                ids = ids[keep]
+            if len(ids):
+                chunk = {"id": ids, "ts": np.asarray(cols["ts"], dtype=np.int64),
+                         "viewer_id": np.asarray(cols["viewer_id"], dtype=object)}
+                chunk.update({c: self._encode(c, cols[c]) for c in CODED})
+                chunk["max_ts"] = int(chunk["ts"].max())
+                self.chunks.append(chunk)
+                for fn in self.listeners:
+                    fn(cols)
+                self.watermark = max(self.watermark, int(ids.max()))
+                if self.overlap:
+                    tail = np.concatenate([self.tail_ids, ids])
+                    self.tail_ids = tail[tail > self.watermark - self.overlap]
+            self._evict(now if now is not None else time.time())
+            return len(ids)
+
+    def subscribe(self, fn):
+        """Call fn(cols) with every batch of new rows from now on (raw columns, as fetched)."""
+        with self.lock:
+            self.listeners.append(fn)
+            return self.watermark
+
+    def _evict(self, now: float):
+        cutoff = int((now - self.horizon_sec) * 1_000_000)
+        self.chunks = [c for c in self.chunks if c["max_ts"] >= cutoff]
+        while len(self.chunks) >= 2 and len(self.chunks[-1]["id"]) >= len(self.chunks[-2]["id"]):
+            merged = self._concat(self.chunks[-2:])
+            keep = merged["ts"] >= cutoff
+            merged = {k: v[keep] for k, v in merged.items()}
+            del self.chunks[-2:]
+            if len(merged["id"]):
+                merged["max_ts"] = int(merged["ts"].max())
+                self.chunks.append(merged)
+
+    @staticmethod
+    def _concat(chunks) -> dict:
+        names = ("id", "ts", "viewer_id") + CODED
+        return {k: np.concatenate([c[k] for c in chunks]) for k in names}
+
+    def frame(self, window_sec: float, columns=("ts", "viewer_id", "event_type", "country", "video_id"),
+              now: float = None) -> pd.DataFrame:
+        """
+        Cached rows with ts in the last `window_sec`: ts as int64 epoch µs (see
+        panels.ts_datetime), coded columns as categoricals, viewer_id as str.
+        """
+        cutoff = int(((now if now is not None else time.time()) - window_sec) * 1_000_000)
+        with self.lock:
+            chunks = [c for c in self.chunks if c["max_ts"] >= cutoff]
+            values = {c: list(self.values[c]) for c in CODED}
+        cols = self._concat(chunks) if chunks else {
+            "id": np.empty(0, np.int64), "ts": np.empty(0, np.int64), "viewer_id": np.empty(0, object),
+            **{c: np.empty(0, np.int16) for c in CODED}}
+        keep = cols["ts"] > cutoff
+        out = {}
+        for c in columns:
+            v = cols[c][keep]
+            out[c] = pd.Categorical.from_codes(v, values[c]) if c in CODED else v
+        return pd.DataFrame(out)
+
+    def __len__(self):
+        return sum(len(c["id"]) for c in self.chunks)
+
+
+def sqlite_source(path: str):
+    """fetch() for the SQLite demo store (src/sqlite_store.py): ts is epoch µs."""
+    def fetch(after_id: int, horizon_sec: float):
+        empty = {"id": [], "ts": [], "viewer_id": [], "event_type": [], "country": [], "video_id": []}
+        if not os.path.exists(path):
+            return empty
+        since = int((time.time() - horizon_sec) * 1_000_000)
+        con = sqlite3.connect(path)
+        try:
+            # the first load is a range scan of idx_events_ts (the planner would rather scan the
+            # table in id order); later ones a rowid range above the watermark, with the ts index
+            # kept out of it (+ts) so a refresh never re-reads the window
+            if after_id:
+                rows = con.execute("SELECT id, ts, viewer_id, event_type, country, video_id FROM events "
+                                   "WHERE id > ? AND +ts >= ? ORDER BY id", (after_id, since)).fetchall()
+            else:
+                rows = con.execute("SELECT id, ts, viewer_id, event_type, country, video_id FROM events "
+                                   "INDEXED BY idx_events_ts WHERE ts >= ? ORDER BY id", (since,)).fetchall()
+        except sqlite3.OperationalError:
+            return empty                                # not created (or not converted) by event_sim.py yet
+        finally:
+            con.close()
+        if not rows:
+            return empty
+        ids, ts, viewer, etype, country, video = zip(*rows)
+        return {"id": ids, "ts": np.asarray(ts, dtype=np.int64), "viewer_id": viewer, "event_type": etype,
+                "country": country, "video_id": video}
+    return fetch
+
+
+def postgres_source(engine=None):
+    """fetch() for the events table, projected and typed through src/panels.py."""
+    from src import panels
+    from src.db import ENGINE
+    engine = engine or ENGINE
+    exprs = ", ".join(["id"] + [panels.PROJECTION[c][0] for c in ("ts", "viewer_id") + CODED])
+    dtypes = {"id": "int64", "ts": "int64", "viewer_id": panels.PROJECTION["viewer_id"][1]}
+
+    def fetch(after_id: int, horizon_sec: float):
+        sql = (f"SELECT {exprs} FROM events WHERE id > %(after)s "
+               f"AND ts > now() - make_interval(secs => %(horizon)s) ORDER BY id")
+        df = panels.copy_frame(sql, {"after": after_id, "horizon": horizon_sec}, dtypes, engine=engine)
+        return {c: df[c].to_numpy() for c in df.columns}
+    return fetch
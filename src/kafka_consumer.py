@@ -1,82 +1,451 @@
 # src/kafka_consumer.py
-import os, json, time
-from confluent_kafka import Consumer
-from sqlalchemy import text
+import os, json, time, argparse, queue, threading, multiprocessing
+import numpy as np
+import psycopg2
 from dotenv import load_dotenv
-from src.db import ENGINE, ensure_schema
+from sqlalchemy import exc as sa_exc
+try:
+    from confluent_kafka import Consumer, KafkaException, TopicPartition
+except ImportError:   # --source FILE runs (src/corpus.py) need no Kafka client
+    Consumer = None
+    from src.corpus import KafkaException, TopicPartition
+from src.db import ENGINE, EVENTS_TABLE, KEYED, ensure_schema, maintain_partitions
+from src.kpi_state import KpiState, serve
+from src.writers import make_writer
+from src import metrics, rollups, wire
 
 load_dotenv()
-ensure_schema()
 
 BOOTSTRAP = os.getenv("KAFKA_BOOTSTRAP", "localhost:9092")
 TOPIC = os.getenv("KAFKA_TOPIC", "viewer.events")
-BATCH_SIZE = int(os.getenv("BATCH_SIZE", "100"))
+GROUP_ID = os.getenv("KAFKA_GROUP", "viewer-consumer")
+BATCH_SIZE = int(os.getenv("BATCH_SIZE", "100"))      # minimum batch
+BATCH_MAX = int(os.getenv("BATCH_MAX", "20000"))      # batch ceiling when lagging
+INGEST_WRITER = os.getenv("INGEST_WRITER", "copy")    # copy | values | executemany
 FLUSH_SEC = float(os.getenv("FLUSH_SEC", "2.0"))
+KPI_STATE_PORT = int(os.getenv("KPI_STATE_PORT", "0"))  # 0 = disabled
+FLUSH_RETRIES = int(os.getenv("FLUSH_RETRIES", "5"))
+RETRY_BACKOFF_SEC = float(os.getenv("RETRY_BACKOFF_SEC", "0.5"))   # doubles per attempt
+RETRY_BACKOFF_MAX = float(os.getenv("RETRY_BACKOFF_MAX", "30"))
+MAX_BUFFER_ROWS = int(os.getenv("MAX_BUFFER_ROWS", "100000"))
+MAX_BUFFER_BYTES = int(os.getenv("MAX_BUFFER_BYTES", str(64 * 1024 * 1024)))
+PIPELINE_DEPTH = int(os.getenv("PIPELINE_DEPTH", "2"))   # decoded batches queued for the writer
+REVOKE_WAIT_SEC = float(os.getenv("REVOKE_WAIT_SEC", "30"))   # < max.poll.interval.ms (300s)
+DLQ_PATH = os.getenv("DLQ_PATH", "data/dead_letter.jsonl")
+PARTITION_MAINT_SEC = float(os.getenv("PARTITION_MAINT_SEC", "600"))   # create ahead / expire old partitions
+ROLLUP_COMPACT_SEC = float(os.getenv("ROLLUP_COMPACT_SEC", "60"))       # seconds → minutes → hours
 
-print(f"[debug] KAFKA_BOOTSTRAP = {BOOTSTRAP}")
+# /metrics (src/metrics.py), one child per worker
+MESSAGES = metrics.counter("consumer_messages_total", "Messages consumed", ("worker",))
+KAFKA_ERRORS = metrics.counter("consumer_kafka_errors_total", "Error events returned by consume()", ("worker",))
+PARSE_FAILURES = metrics.counter("consumer_parse_failures_total", "Unparseable messages sent to the DLQ", ("worker",))
+DECODE_SECONDS = metrics.histogram("consumer_decode_seconds", "decode_batch() time per consume() batch", ("worker",))
+LAG = metrics.gauge("consumer_lag", "Messages behind the high watermark at the last consumed offset", ("worker",))
+BATCH = metrics.gauge("consumer_batch_size", "Adaptive flush size in rows", ("worker",))
+BUFFERED = metrics.gauge("consumer_buffered_rows", "Decoded rows not yet handed to the writer", ("worker",))
+PAUSED = metrics.gauge("consumer_paused", "1 while fetching is paused for backpressure", ("worker",))
+FLUSH_SECONDS = metrics.histogram("consumer_flush_seconds", "Write transaction time per flush, retries included",
+                                  ("worker", "writer"))
+FLUSH_ROWS = metrics.histogram("consumer_flush_rows", "Rows per flush", ("worker",), buckets=metrics.SIZE_BUCKETS)
+FLUSH_FAILURES = metrics.counter("consumer_flush_failures_total", "Failed write attempts", ("worker",))
+ROWS_WRITTEN = metrics.counter("consumer_rows_written_total", "Rows committed to Postgres", ("worker",))
+ROWS_REJECTED = metrics.counter("consumer_rows_rejected_total", "Rows Postgres rejected, sent to the DLQ", ("worker",))
+COMMIT_FAILURES = metrics.counter("consumer_commit_failures_total", "Offset commits that failed", ("worker",))
 
-c = Consumer({
-    "bootstrap.servers": BOOTSTRAP,
-    "group.id": "viewer-consumer",
-    "auto.offset.reset": "earliest",
-})
 
-c.subscribe([TOPIC])
+class AdaptiveBatch:
+    """Flush threshold that doubles while the consumer lags and halves once caught up."""
 
-INSERT_SQL = text("""
-INSERT INTO events (ts, viewer_id, video_id, event_type, country)
-VALUES (:ts, :viewer_id, :video_id, :event_type, :country)
-""")
+    def __init__(self, lo: int, hi: int):
+        self.lo, self.hi = lo, max(lo, hi)
+        self.size = lo
 
-print(f"Consuming from {BOOTSTRAP} topic={TOPIC} → Postgres (Ctrl+C to stop)")
+    def update(self, lag: int):
+        if lag > 4 * self.size:
+            self.size = min(self.hi, self.size * 2)
+        elif lag < self.size // 2:
+            self.size = max(self.lo, self.size // 2)
 
-rows = []
-last_flush = time.time()
-inserted = 0
 
-def flush_rows():
-    """Insert buffered rows and commit the transaction."""
-    global rows, inserted, last_flush
-    if not rows:
-        return
-    try:
-        with ENGINE.begin() as conn:      
-            conn.execute(INSERT_SQL, rows)  
-        inserted += len(rows)
-        print(f"[ingest] inserted {len(rows)} (total={inserted})")
-        rows = []
-        last_flush = time.time()
-    except Exception as ex:
-        print("[ingest] batch insert error:", ex)
+def decode_batch(msgs):
+    """
+    Decode a consume() batch (JSON and/or binary values, see src/wire.py) in one pass.
+    Returns (cols, rows, nbytes, offsets, bad): columnar arrays, row tuples in
+    writers.COLUMNS order, payload bytes, the highest offset per (topic, partition),
+    and (msg, exception) pairs for unparseable payloads.
+    """
+    values = [m.value() for m in msgs]
+    offsets = {}
+    for m in msgs:
+        offsets[(m.topic(), m.partition())] = m.offset()
+    cols, bad = wire.decode_batch(values)
+    return cols, wire.to_rows(cols), sum(len(v or b"") for v in values), offsets, [(msgs[i], ex) for i, ex in bad]
 
-try:
+
+def _append_dlq(entry: dict):
+    os.makedirs(os.path.dirname(DLQ_PATH) or ".", exist_ok=True)
+    with open(DLQ_PATH, "a", encoding="utf-8") as f:
+        f.write(json.dumps(entry) + "\n")
+
+
+def dead_letter(msg, ex: Exception):
+    """Append an unparseable message to DLQ_PATH; its offset still counts as handled."""
+    _append_dlq({
+        "topic": msg.topic(), "partition": msg.partition(), "offset": msg.offset(),
+        "error": repr(ex), "payload": (msg.value() or b"").decode("utf-8", "replace"),
+    })
+    print("[parse] bad message → dead letter:", ex)
+
+
+def dead_letter_row(row, ex: Exception):
+    """Append a decoded row Postgres rejected to DLQ_PATH; its offset still counts as handled."""
+    _append_dlq({"error": repr(ex), "row": list(row)})
+    print("[ingest] rejected row → dead letter:", ex)
+
+
+def permanent(ex: Exception) -> bool:
+    """True for errors a retry cannot fix: Postgres rejected a value in the batch."""
+    return isinstance(ex, (psycopg2.DataError, psycopg2.IntegrityError, sa_exc.DataError, sa_exc.IntegrityError))
+
+
+class Worker:
+    """
+    One member of the consumer group. The calling thread consumes and decodes batches;
+    a writer thread takes decoded batches off a bounded queue, writes them through its
+    own pooled connection and commits their offsets only after the transaction commits
+    (at-least-once). Consumption is paused while the queue/buffer is full or the
+    writer has failed FLUSH_RETRIES times in a row. Batches Postgres rejects outright
+    (bad values, constraint violations) are bisected and the rejected rows go to the DLQ.
+    """
+
+    def __init__(self, idx: int = 0, state: KpiState = None, source: str = None, rebase: bool = False):
+        self.tag = f"[w{idx}]"
+        self.state = state
+        self.source = source
+        if source:
+            from src.corpus import FileConsumer
+            self.c = FileConsumer(source, TOPIC, rebase=rebase)
+        else:
+            self.c = Consumer({
+                "bootstrap.servers": BOOTSTRAP,
+                "group.id": GROUP_ID,
+                "auto.offset.reset": "earliest",
+                "enable.auto.commit": False,
+            })
+        self.writer = make_writer(INGEST_WRITER, ENGINE, table=EVENTS_TABLE, keyed=KEYED)
+        self.batch = AdaptiveBatch(BATCH_SIZE, BATCH_MAX)
+        self.queue = queue.Queue(maxsize=max(PIPELINE_DEPTH, 1))
+        self.rows, self.cols, self.offsets, self.nbytes = [], [], {}, 0
+        self.paused = False
+        self.stalled = threading.Event()     # writer exhausted its retries
+        self.stopping = False
+        self.abandoned = False               # a batch was dropped at shutdown: never commit past it
+        self.generation = 0                  # bumped when a revoke drops queued batches
+        self.last_flush = time.time()
+        self.inserted = 0
+        w = str(idx)
+        self.m_messages, self.m_kafka_errors, self.m_parse = MESSAGES.labels(w), KAFKA_ERRORS.labels(w), PARSE_FAILURES.labels(w)
+        self.m_decode, self.m_lag, self.m_batch = DECODE_SECONDS.labels(w), LAG.labels(w), BATCH.labels(w)
+        self.m_buffered, self.m_paused = BUFFERED.labels(w), PAUSED.labels(w)
+        self.m_flush, self.m_flush_rows = FLUSH_SECONDS.labels(w, self.writer.name), FLUSH_ROWS.labels(w)
+        self.m_flush_failures, self.m_rows = FLUSH_FAILURES.labels(w), ROWS_WRITTEN.labels(w)
+        self.m_rejected = ROWS_REJECTED.labels(w)
+        self.m_commit_failures = COMMIT_FAILURES.labels(w)
+
+    # --- writer thread ---------------------------------------------------------
+    def _write_loop(self):
+        while True:
+            item = self.queue.get()
+            try:
+                if item is None:
+                    return
+                self._write(*item)
+            finally:
+                self.queue.task_done()
+
+    def _write(self, rows, offsets, cols, agg, gen):
+        t0 = time.perf_counter()
+        written = self._flush(rows, cols, agg, gen) if rows else 0
+        if written is None or gen != self.generation:
+            return                      # dropped: offsets stay uncommitted, rows are redelivered
+        if rows:
+            self.m_flush.observe(time.perf_counter() - t0)
+            self.m_flush_rows.observe(len(rows))
+            self.m_rows.inc(written)
+        try:
+            if offsets and not self.abandoned:
+                self.c.commit(offsets=[TopicPartition(t, p, o + 1) for (t, p), o in offsets.items()],
+                              asynchronous=False)
+        except KafkaException as ex:
+            self.m_commit_failures.inc()
+            print(f"{self.tag} [ingest] offset commit failed (rows will be redelivered):", ex)
+        self.inserted += written
+        if rows:
+            print(f"{self.tag} [ingest] inserted {written} (total={self.inserted}, batch={self.batch.size})")
+
+    def _flush(self, rows, cols, agg=None, gen=0):
+        """
+        Write rows (and their per-second rollups) in one transaction, retrying transient
+        errors with backoff. A batch Postgres rejects is written in halves down to the single
+        rows that are rejected, which go to the DLQ. Returns the rows written, or None when
+        the batch was abandoned at shutdown or dropped by a revoke.
+        """
+        if agg is None and cols is not None:
+            agg = rollups.second_rows(cols)
+        hooks = [lambda cur: rollups.upsert_seconds(cur, agg)] if agg else []
+        attempt = 0
+        while True:
+            try:
+                self.writer.write(rows, hooks=hooks)
+                break
+            except Exception as ex:
+                self.m_flush_failures.inc()
+                if permanent(ex):
+                    return self._split(rows, cols, ex, gen)
+                attempt += 1
+                print(f"{self.tag} [ingest] batch insert error (attempt {attempt}):", ex)
+                if attempt >= FLUSH_RETRIES:
+                    self.stalled.set()
+                    if self.stopping:
+                        self.abandoned = True   # leave offsets uncommitted; rows are redelivered
+                        return None
+                time.sleep(min(RETRY_BACKOFF_SEC * 2 ** (attempt - 1), RETRY_BACKOFF_MAX))
+                if gen != self.generation:
+                    self.stalled.clear()        # nothing left to retry; the next batch stalls anew
+                    return None
+        self.stalled.clear()
+        return len(rows)
+
+    def _split(self, rows, cols, ex, gen):
+        if len(rows) == 1:
+            dead_letter_row(rows[0], ex)
+            self.m_rejected.inc()
+            return 0
+        print(f"{self.tag} [ingest] {len(rows)} rows rejected, bisecting:", ex)
+        mid, written = len(rows) // 2, 0
+        for lo, hi in ((0, mid), (mid, len(rows))):
+            part = None if cols is None else {k: v[lo:hi] for k, v in cols.items()}
+            n = self._flush(rows[lo:hi], part, gen=gen)
+            if n is None:
+                return None
+            written += n
+        return written
+
+    # --- consume thread --------------------------------------------------------
+    def _handoff(self, block: bool = False, timeout: float = None) -> bool:
+        """Move the current buffer to the writer queue; False if the queue is full (after timeout)."""
+        if not self.rows and not self.offsets:
+            self.last_flush = time.time()
+            return True
+        if not block and self.queue.full():
+            return False
+        cols = agg = None
+        if rollups.ROLLUPS and self.rows:
+            cols = {k: np.concatenate([c[k] for c in self.cols]) for k in self.cols[0]}
+            agg = rollups.second_rows(cols)
+        try:
+            self.queue.put((self.rows, self.offsets, cols, agg, self.generation), timeout=timeout)
+        except queue.Full:
+            return False
+        self.rows, self.cols, self.offsets, self.nbytes = [], [], {}, 0
+        self.last_flush = time.time()
+        return True
+
+    def _set_paused(self, on: bool):
+        if on == self.paused:
+            return
+        parts = self.c.assignment()
+        if parts:
+            (self.c.pause if on else self.c.resume)(parts)
+        self.paused = on
+        self.m_paused.set(int(on))
+        print(f"{self.tag} [ingest] {'paused' if on else 'resumed'} consumption (buffer={len(self.rows)} rows)")
+
+    def _on_assign(self, consumer, partitions):
+        self.paused = False   # a fresh assignment starts unpaused
+
+    def _on_revoke(self, consumer, partitions):
+        # write + commit what we hold before another member takes these partitions over, for
+        # at most REVOKE_WAIT_SEC: a writer retrying through a DB outage would otherwise hold
+        # the rebalance past max.poll.interval.ms and get this member evicted
+        deadline = time.time() + REVOKE_WAIT_SEC
+        if self._handoff(block=True, timeout=REVOKE_WAIT_SEC) and self._join(deadline):
+            return
+        self.generation += 1
+        self.rows, self.cols, self.offsets, self.nbytes = [], [], {}, 0
+        dropped = 0
+        while True:
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                break
+            self.queue.task_done()
+            dropped += 1
+        print(f"{self.tag} [ingest] writer busy after {REVOKE_WAIT_SEC:g}s; dropped {dropped} queued batch(es) "
+              f"and the one in flight uncommitted (rows will be redelivered)")
+
+    def _join(self, deadline: float) -> bool:
+        """queue.join() until deadline; False if batches are still pending."""
+        with self.queue.all_tasks_done:
+            while self.queue.unfinished_tasks:
+                left = deadline - time.time()
+                if left <= 0:
+                    return False
+                self.queue.all_tasks_done.wait(left)
+        return True
+
+    def _lag(self, msg) -> int:
+        _, hi = self.c.get_watermark_offsets(TopicPartition(msg.topic(), msg.partition()), cached=True)
+        return max(hi - msg.offset() - 1, 0) if hi >= 0 else 0
+
+    def run(self, stop: threading.Event):
+        self.c.subscribe([TOPIC], on_assign=self._on_assign, on_revoke=self._on_revoke)
+        writer_thread = threading.Thread(target=self._write_loop, name=f"writer{self.tag}", daemon=True)
+        writer_thread.start()
+        print(f"{self.tag} Consuming from {self.source or BOOTSTRAP} topic={TOPIC} → Postgres via {self.writer.name}")
+        t0 = time.time()
+        try:
+            while not stop.is_set():
+                msgs = self.c.consume(num_messages=self.batch.size, timeout=1.0)
+                if not msgs and self.source and self.c.eof:
+                    break
+                good = []
+                for m in msgs:
+                    if m.error():
+                        self.m_kafka_errors.inc()
+                        print(f"{self.tag} Kafka error:", m.error())
+                    else:
+                        good.append(m)
+                if good:
+                    self.m_messages.inc(len(good))
+                    with self.m_decode.time():
+                        cols, rows, nbytes, offsets, bad = decode_batch(good)
+                    if bad:
+                        self.m_parse.inc(len(bad))
+                    for m, ex in bad:
+                        dead_letter(m, ex)
+                    if self.state is not None:
+                        for ts, v, et, ctry in zip((cols["ts_us"] / 1e6).tolist(), cols["viewer_id"],
+                                                   cols["event_type"], cols["country"]):
+                            self.state.observe(ts, v, et, ctry)
+                    self.rows.extend(rows)
+                    self.cols.append(cols)
+                    self.offsets.update(offsets)
+                    self.nbytes += nbytes
+                    lag = self._lag(good[-1])
+                    self.batch.update(lag)
+                    self.m_lag.set(lag)
+                    self.m_batch.set(self.batch.size)
+
+                if len(self.rows) >= self.batch.size or time.time() - self.last_flush >= FLUSH_SEC:
+                    self._handoff()
+                self.m_buffered.set(len(self.rows))
+                # backpressure: stop fetching until the writer catches up
+                self._set_paused(self.stalled.is_set() or self.queue.full()
+                                 or len(self.rows) >= MAX_BUFFER_ROWS or self.nbytes >= MAX_BUFFER_BYTES)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stopping = True
+            self._handoff(block=True)
+            self.queue.put(None)
+            writer_thread.join()
+            self.c.close()
+            if self.source:
+                dt = time.time() - t0
+                print(f"{self.tag} replayed {self.c.offset:,} events ({self.c.committed:,} committed) "
+                      f"in {dt:.1f}s: {self.c.offset / dt:,.0f} events/s")
+
+
+def make_state():
+    """KpiState served on KPI_STATE_PORT, or None when disabled."""
+    if not KPI_STATE_PORT:
+        return None
+    state = KpiState()
+    serve(state, KPI_STATE_PORT)
+    print(f"[kpi] serving incremental KPIs on http://127.0.0.1:{KPI_STATE_PORT}/kpis")
+    return state
+
+
+def maintenance_loop():
+    """Daemon thread: partition upkeep every PARTITION_MAINT_SEC, rollup compaction every ROLLUP_COMPACT_SEC."""
+    jobs = [[maintain_partitions, PARTITION_MAINT_SEC, time.time() + PARTITION_MAINT_SEC]]
+    if rollups.ROLLUPS:
+        jobs.append([rollups.compact_recent, ROLLUP_COMPACT_SEC, time.time() + ROLLUP_COMPACT_SEC])
     while True:
-        msg = c.poll(1.0)  
-        if msg is None:
-            if time.time() - last_flush >= FLUSH_SEC:
-                flush_rows()
-            continue
-        if msg.error():
-            print("Kafka error:", msg.error())
-            continue
+        time.sleep(max(min(job[2] for job in jobs) - time.time(), 0))
+        for job in jobs:
+            fn, every, due = job
+            if time.time() < due:
+                continue
+            try:
+                fn()
+            except Exception as ex:
+                print(f"[db] {fn.__name__} failed:", ex)
+            job[2] = time.time() + every
+
+
+def run_worker(idx: int, state: KpiState = None, serve_metrics: bool = False):
+    """Process entry point: one Worker until Ctrl+C."""
+    if serve_metrics:
+        metrics.start("consumer", offset=idx)      # each worker process on the consumer port + idx
+    Worker(idx, state).run(threading.Event())
 
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Kafka → Postgres ingest")
+    ap.add_argument("--workers", type=int, default=int(os.getenv("CONSUMER_WORKERS", "1")),
+                    help="consumer-group members on this box (useful up to the partition count)")
+    ap.add_argument("--mode", choices=["process", "thread"], default=os.getenv("CONSUMER_MODE", "process"),
+                    help="run workers as processes (one core each) or threads (shared KPI state)")
+    ap.add_argument("--source", default=None,
+                    help="replay a corpus file (src/corpus.py) instead of Kafka, then exit")
+    ap.add_argument("--rebase", action="store_true", help="with --source: shift timestamps to start now")
+    args = ap.parse_args(argv)
+
+    print(f"[debug] KAFKA_BOOTSTRAP = {BOOTSTRAP}")
+    ensure_schema()
+    threading.Thread(target=maintenance_loop, name="partition-maint", daemon=True).start()
+
+    if args.source or args.workers <= 1 or args.mode == "thread":
+        metrics.start("consumer")
+    if args.source:
+        Worker(0, make_state(), source=args.source, rebase=args.rebase).run(threading.Event())
+        return
+
+    if args.workers <= 1:
+        run_worker(0, make_state())
+        return
+
+    print(f"Starting {args.workers} {args.mode} workers in group {GROUP_ID} (Ctrl+C to stop)")
+    if args.mode == "thread":
+        state, stop = make_state(), threading.Event()
+        threads = [threading.Thread(target=Worker(i, state).run, args=(stop,)) for i in range(args.workers)]
+        for t in threads:
+            t.start()
         try:
-            e = json.loads(msg.value().decode("utf-8"))
-            rows.append({
-                "ts": e["ts"],                    
-                "viewer_id": e["viewer_id"],
-                "video_id": e["video_id"],
-                "event_type": e["event_type"],
-                "country": e.get("country", "US"), 
-            })
-        except Exception as ex:
-            print("[parse] bad message:", ex, "payload=", msg.value())
+            while any(t.is_alive() for t in threads):
+                for t in threads:
+                    t.join(0.5)
+        except KeyboardInterrupt:
+            stop.set()
+            for t in threads:
+                t.join()
+        return
+
+    if KPI_STATE_PORT:
+        print("[kpi] KPI_STATE_PORT needs a single process (or --mode thread); disabled for process workers")
+    ctx = multiprocessing.get_context("spawn")
+    procs = [ctx.Process(target=run_worker, args=(i, None, True), name=f"consumer-{i}") for i in range(args.workers)]
+    for p in procs:
+        p.start()
+    try:
+        for p in procs:
+            p.join()
+    except KeyboardInterrupt:
+        for p in procs:
+            p.join()
 
-        if len(rows) >= BATCH_SIZE or (time.time() - last_flush) >= FLUSH_SEC:
-            flush_rows()
 
-except KeyboardInterrupt:
-    pass
-finally:
-    flush_rows()
-    c.close()
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,15 @@
 # src/kafka_producer.py
-import os, json, time, math, random
+import os, time, math, random, itertools
 from dataclasses import dataclass
-from datetime import datetime, timezone, timedelta
+from datetime import datetime, timezone
 from typing import Dict, List
-from confluent_kafka import Producer
 from dotenv import load_dotenv
+from src import metrics, wire
 
 load_dotenv()
 BOOTSTRAP = os.getenv("KAFKA_BOOTSTRAP", "localhost:9092")
 TOPIC = os.getenv("KAFKA_TOPIC", "viewer.events")
+WIRE_FORMAT = os.getenv("WIRE_FORMAT", "json")   # json | binary (see src/wire.py)
 
 #Tunable knobs 
 BASE_ARRIVAL_RATE = 15
@@ -25,20 +26,44 @@ COUNTRIES = ["US","IN","BR","GB","DE","FR","SG","AU","ES","IT","MX","CA","JP"]
 COUNTRY_P =   [0.18,0.16,0.10,0.06,0.06,0.05,0.05,0.05,0.08,0.07,0.06,0.04,0.04]
 VIDEOS = [f"v{n:03d}" for n in range(1, 201)]
 
-p = Producer({"bootstrap.servers": BOOTSTRAP})
-print(f"[debug] KAFKA_BOOTSTRAP = {BOOTSTRAP}")
-print(f"Producing to {BOOTSTRAP} topic={TOPIC} (Ctrl+C to stop)")
-
-@dataclass
+@dataclass(slots=True)
 class Session:
     viewer_id: str
     video_id: str
     country: str
-    start_ts: datetime
-    end_ts: datetime
-    next_hb: datetime
+    start_ts: float     # epoch seconds
+    end_ts: float
+    next_hb: float
+
+    def due(self) -> float:
+        """Next instant this session emits: its heartbeat, or its end once none falls before it."""
+        return self.next_hb if self.next_hb < self.end_ts else self.end_ts
+
+# Active sessions live in a timer wheel: one list per epoch second holding the sessions due
+# in it, so a tick walks only the seconds elapsed since the last one and touches only due
+# sessions (O(1) each) instead of scanning all of them. Viewer ids come from one counter
+# ("u" + 11 digits, the binary layout's 12 bytes): a new session never reuses a live id.
+wheel: Dict[int, List[Session]] = {}
+_cursor = None          # last second whose bucket has been drained
+n_active = 0
+_ids = itertools.count()
 
-active: Dict[str, Session] = {}
+def reset():
+    """Drop all sessions and restart ids from the current random state (benchmarks seed it first)."""
+    global _ids, _cursor, n_active
+    wheel.clear()
+    _cursor, n_active = None, 0
+    _ids = itertools.count(10**10 + random.randrange(8 * 10**9))
+
+def schedule(s: Session):
+    due = int(s.due())
+    bucket = wheel.get(due)
+    if bucket is None:
+        wheel[due] = [s]
+    else:
+        bucket.append(s)
+
+reset()
 
 def now_utc() -> datetime:
     return datetime.now(timezone.utc)
@@ -66,46 +91,101 @@ def draw_dwell_seconds() -> int:
     dwell = min(int(dwell), MAX_DWELL_SEC)
     return max(dwell, 10)
 
-def emit(event: dict):
-    event["ts"] = now_utc().isoformat()
-    p.produce(TOPIC, json.dumps(event).encode("utf-8"))
+# where encoded events go; main() points this at Producer.produce, benchmarks at a list
+sink = None
+
+EVENTS = metrics.counter("producer_events_total", "Events handed to the producer", ("event_type",))
+QUEUE_DEPTH = metrics.gauge("producer_queue_depth", "Messages waiting in the local producer queue")
+QUEUE_FULL = metrics.counter("producer_queue_full_total", "produce() calls rejected with BufferError")
+ACTIVE_SESSIONS = metrics.gauge("producer_active_sessions", "Simulated sessions in progress")
+DELIVERY_FAILURES = metrics.counter("producer_delivery_failures_total", "Messages the broker did not accept")
+_events = {e: EVENTS.labels(e) for e in ("view_start", "heartbeat", "view_end")}
+
+def emit(event: dict, t: datetime):
+    # stamped with the tick time, so a simulated clock (benchmarks) yields consistent timestamps
+    sink(wire.encode(event, int(t.timestamp() * 1_000_000), WIRE_FORMAT))
+    _events[event["event_type"]].inc()
+
+def delivery_failed(err, msg):
+    # only called for failures ("delivery.report.only.error"), so successes cost nothing
+    DELIVERY_FAILURES.inc()
+    print("[producer] delivery failed:", err)
+
+def producer_config(**extra) -> dict:
+    return {"bootstrap.servers": BOOTSTRAP, "delivery.report.only.error": True,
+            "on_delivery": delivery_failed, **extra}
 
 def maybe_start_new_sessions(t: datetime):
+    global n_active
     rate = BASE_ARRIVAL_RATE * diurnal_multiplier(t)
+    now = t.timestamp()
     for _ in range(poiss(rate)):
-        viewer = f"u{random.randint(100000, 999999)}"
+        viewer = f"u{next(_ids)}"
         video = random.choice(VIDEOS)
         country = random.choices(COUNTRIES, COUNTRY_P, k=1)[0]
-        start = t
         dwell = draw_dwell_seconds()
-        end = start + timedelta(seconds=dwell)
         hb_in = random.randint(*HEARTBEAT_EVERY)
-        sess = Session(viewer, video, country, start, end, start + timedelta(seconds=hb_in))
-        active[viewer] = sess
-        emit({"event_type":"view_start","viewer_id":viewer,"video_id":video,"country":country})
+        schedule(Session(viewer, video, country, now, now + dwell, now + hb_in))
+        n_active += 1
+        emit({"event_type":"view_start","viewer_id":viewer,"video_id":video,"country":country}, t)
 
 def advance_heartbeats_and_ends(t: datetime):
-    finished: List[str] = []
-    for viewer, s in active.items():
-        # heartbeats
-        if t >= s.next_hb and t < s.end_ts:
-            emit({"event_type":"heartbeat","viewer_id":s.viewer_id,"video_id":s.video_id,"country":s.country})
-            s.next_hb = t + timedelta(seconds=random.randint(*HEARTBEAT_EVERY))
-        # ends
-        if t >= s.end_ts:
-            emit({"event_type":"view_end","viewer_id":s.viewer_id,"video_id":s.video_id,"country":s.country})
-            finished.append(viewer)
-    for v in finished:
-        active.pop(v, None)
-
-try:
-    while True:
-        t = now_utc()
-        maybe_start_new_sessions(t)
-        advance_heartbeats_and_ends(t)
-        p.poll(0)               # flush background delivery callbacks
-        time.sleep(1.0)         # 1-second ticks
-except KeyboardInterrupt:
-    pass
-finally:
-    p.flush(5)
+    global _cursor, n_active
+    now = t.timestamp()
+    sec = int(now)
+    if _cursor is None:
+        _cursor = min(wheel, default=sec) - 1
+    for k in range(_cursor + 1, sec + 1):
+        bucket = wheel.pop(k, None)
+        if bucket is None:
+            continue
+        if k == sec:
+            # the current second: sessions due later in it stay for the next tick
+            due, later = [], []
+            for s in bucket:
+                (due if s.due() <= now else later).append(s)
+            if later:
+                wheel[k] = later
+            bucket = due
+        for s in bucket:
+            if now < s.end_ts:
+                emit({"event_type":"heartbeat","viewer_id":s.viewer_id,"video_id":s.video_id,"country":s.country}, t)
+                s.next_hb = now + random.randint(*HEARTBEAT_EVERY)
+                schedule(s)     # at least HEARTBEAT_EVERY[0] seconds ahead, never this bucket
+            else:
+                emit({"event_type":"view_end","viewer_id":s.viewer_id,"video_id":s.video_id,"country":s.country}, t)
+                n_active -= 1
+    _cursor = sec - 1           # revisit the current second next tick
+
+def main():
+    global sink
+    from confluent_kafka import Producer
+    p = Producer(producer_config())
+    QUEUE_DEPTH.set_function(lambda: len(p))
+    ACTIVE_SESSIONS.set_function(lambda: n_active)
+    metrics.start("producer")
+
+    def sink(value):
+        while True:
+            try:
+                p.produce(TOPIC, value)
+                return
+            except BufferError:
+                QUEUE_FULL.inc()
+                p.poll(0.5)     # local queue full: serve delivery callbacks, then retry
+    print(f"[debug] KAFKA_BOOTSTRAP = {BOOTSTRAP}")
+    print(f"Producing to {BOOTSTRAP} topic={TOPIC} as {WIRE_FORMAT} (Ctrl+C to stop)")
+    try:
+        while True:
+            t = now_utc()
+            maybe_start_new_sessions(t)
+            advance_heartbeats_and_ends(t)
+            p.poll(0)               # flush background delivery callbacks
+            time.sleep(1.0)         # 1-second ticks
+    except KeyboardInterrupt:
+        pass
+    finally:
+        p.flush(5)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+# src/kpi_state.py
+import heapq, json, threading, time
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.request import urlopen
+
+from src.sessions import SESSION_TIMEOUT_SEC
+
+ACTIVE_SEC = 60         # "concurrent" viewers window
+EPS_SEC = 10            # events/sec averaging window
+COUNTRY_SEC = 15 * 60   # top countries window
+DWELL_SEC = 30 * 60     # dwell window
+RING_SEC = 5 * 60       # per-second event counts kept (events/sec chart)
+
+
+class _Expiring:
+    """
+    Last-seen time per key; expire() pops every key last seen before a cutoff. Events
+    arrive out of ts order, so keys are found through a heap of (ts, key) entries: a touch
+    pushes a new entry and the superseded one is skipped when it reaches the top. The heap
+    is rebuilt from `last` when stale entries outnumber live ones.
+    """
+
+    def __init__(self):
+        self.last = {}
+        self.heap = []
+
+    def touch(self, key, ts: float):
+        old = self.last.get(key)
+        if old is not None and ts <= old:
+            return
+        self.last[key] = ts
+        heapq.heappush(self.heap, (ts, key))
+        if len(self.heap) > 2 * len(self.last) + 1024:
+            self.heap = [(t, k) for k, t in self.last.items()]
+            heapq.heapify(self.heap)
+
+    def expire(self, cutoff: float):
+        return [key for key, _ in self.expire_items(cutoff)]
+
+    def expire_items(self, cutoff: float):
+        """Like expire() but (key, last touch) pairs."""
+        out = []
+        while self.heap and self.heap[0][0] < cutoff:
+            ts, key = heapq.heappop(self.heap)
+            if self.last.get(key) == ts:
+                del self.last[key]
+                out.append((key, ts))
+        return out
+
+    def discard(self, key):
+        self.last.pop(key, None)
+
+    def __len__(self):
+        return len(self.last)
+
+
+class KpiState:
+    """
+    Incremental KPI aggregates fed one event at a time by the consumer.
+    Mirrors the dashboard/API KPIs without touching Postgres:
+      - events/sec: per-second ring buffer of counts
+      - active viewers: viewers seen in the last ACTIVE_SEC
+      - top countries: unique viewers per country in the last COUNTRY_SEC
+      - avg dwell: sessions (src/sessions.py rules) that started in the last DWELL_SEC,
+        open sessions measured up to now (same as the SQL path)
+    Every structure is expired lazily, so snapshot() is O(1) amortized.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.ring_sec = [-1] * RING_SEC
+        self.ring_count = [0] * RING_SEC
+        self.active = _Expiring()
+        self.country_seen = _Expiring()
+        self.country_of = {}
+        self.country_n = Counter()
+        self.open_start = {}                # viewer -> view_start epoch
+        self.open_seen = _Expiring()        # open viewer -> last event epoch
+        self.open_order = deque()           # (start, viewer) in start order, may be stale
+        self.open_sum = 0.0                 # sum of open start epochs
+        self.closed = []                    # heap of (start, dwell)
+        self.closed_sum = 0.0
+        self.observed = 0
+
+    def observe(self, ts: float, viewer_id: str, event_type: str, country: str):
+        """Fold one event (epoch seconds) into the aggregates."""
+        if ts < time.time() - DWELL_SEC:
+            return  # replayed backlog: older than every window, and would break expiry order
+        with self.lock:
+            self.observed += 1
+            sec = int(ts)
+            i = sec % RING_SEC
+            if self.ring_sec[i] != sec:
+                self.ring_sec[i], self.ring_count[i] = sec, 0
+            self.ring_count[i] += 1
+
+            self.active.touch(viewer_id, ts)
+            self.country_seen.touch(viewer_id, ts)
+            old = self.country_of.get(viewer_id)
+            if old != country:
+                if old is not None:
+                    self.country_n[old] -= 1
+                self.country_of[viewer_id] = country
+                self.country_n[country] += 1
+
+            start = self.open_start.get(viewer_id)
+            if start is not None and ts - self.open_seen.last[viewer_id] > SESSION_TIMEOUT_SEC:
+                self._close(viewer_id, self.open_seen.last[viewer_id])
+                start = None
+            if event_type == "view_start":
+                if start == ts:
+                    return                  # replayed start
+                if start is not None:
+                    self._close(viewer_id, self.open_seen.last[viewer_id])
+                self.open_start[viewer_id] = ts
+                self.open_sum += ts
+                self.open_seen.touch(viewer_id, ts)
+                self.open_order.append((ts, viewer_id))
+            elif start is not None:
+                if event_type == "view_end":
+                    self._close(viewer_id, ts)
+                else:
+                    self.open_seen.touch(viewer_id, ts)
+
+    def _close(self, viewer_id: str, end: float):
+        start = self.open_start.pop(viewer_id)
+        self.open_sum -= start
+        self.open_seen.discard(viewer_id)
+        dwell = max(end - start, 0.0)
+        heapq.heappush(self.closed, (start, dwell))
+        self.closed_sum += dwell
+
+    def _expire(self, now: float):
+        self.active.expire(now - ACTIVE_SEC)
+        for v in self.country_seen.expire(now - COUNTRY_SEC):
+            self.country_n[self.country_of.pop(v)] -= 1
+        for v, seen in self.open_seen.expire_items(now - SESSION_TIMEOUT_SEC):
+            self._close(v, seen)            # heartbeats stopped: ended at its last event
+        cutoff = now - DWELL_SEC
+        while self.open_order and self.open_order[0][0] < cutoff:
+            start, v = self.open_order.popleft()
+            if self.open_start.get(v) == start:
+                del self.open_start[v]
+                self.open_sum -= start
+                self.open_seen.discard(v)
+        while self.closed and self.closed[0][0] < cutoff:
+            _, dwell = heapq.heappop(self.closed)
+            self.closed_sum -= dwell
+
+    def snapshot(self, now: float = None) -> dict:
+        """Current KPIs in the /kpis + /countries response shape."""
+        now = time.time() if now is None else now
+        with self.lock:
+            self._expire(now)
+            sec = int(now)
+            recent = sum(c for s, c in zip(self.ring_sec, self.ring_count) if sec - EPS_SEC < s <= sec)
+            n_open = len(self.open_start)
+            n = n_open + len(self.closed)
+            dwell_sum = self.closed_sum + max(n_open * now - self.open_sum, 0.0)
+            top = sorted(((c, k) for k, c in self.country_n.items() if c > 0), reverse=True)[:10]
+            return {
+                "ts": now,
+                "active_viewers": len(self.active),
+                "events_per_sec": round(recent / EPS_SEC, 2),
+                "avg_dwell_min": round(dwell_sum / n / 60, 2) if n else 0.0,
+                "countries": [{"country": k, "active_viewers": c} for c, k in top],
+                "observed": self.observed,
+            }
+
+
+def serve(state: KpiState, port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Expose state.snapshot() as JSON on http://host:port/kpis from a daemon thread."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.rstrip("/") != "/kpis":
+                self.send_error(404)
+                return
+            body = json.dumps(state.snapshot()).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def fetch_kpis(url: str, timeout: float = 0.5):
+    """Read a snapshot from a consumer's /kpis endpoint; None if unset or unreachable."""
+    if not url:
+        return None
+    try:
+        with urlopen(url, timeout=timeout) as r:
+            return json.loads(r.read())
+    except Exception:
+        return None
@@ -0,0 +1,117 @@
+# src/live.py
+import os, asyncio, inspect, json, time
+
+# Push-based live updates. One background ticker computes the snapshot once per tick and
+# publishes it to a Hub; every subscriber streams it as Server-Sent Events.
+#
+# Coalescing: a subscriber holds no queue, only "last seq sent". Publishing sets each
+# subscriber's wake-up event, so a slow client never blocks the ticker or other clients; when
+# it catches up it gets the newest state. A client that was exactly one tick behind gets the
+# delta, one that skipped ticks (or just joined) gets the full snapshot.
+# Nothing is computed while nobody is subscribed; the snapshot is dropped when the last
+# subscriber leaves and the first one to join wakes the ticker for a fresh compute.
+
+LIVE_TICK_SEC = float(os.getenv("LIVE_TICK_SEC", "2.0"))   # /stream snapshot interval
+
+
+def diff(prev: dict, cur: dict) -> dict:
+    """
+    Keys of `cur` that changed since `prev`. Lists of points keyed by 'sec' (concurrency)
+    are diffed per point: only new/changed points are sent plus '<key>_from', the first sec
+    still in the window, so clients can drop older points.
+    """
+    out = {}
+    for k, v in cur.items():
+        old = prev.get(k)
+        if v == old:
+            continue
+        if isinstance(v, list) and v and isinstance(v[0], dict) and "sec" in v[0] and isinstance(old, list):
+            seen = {p["sec"]: p for p in old}
+            out[k] = [p for p in v if seen.get(p["sec"]) != p]
+            out[k + "_from"] = v[0]["sec"]
+        else:
+            out[k] = v
+    return out
+
+
+class Subscriber:
+    __slots__ = ("wake", "seq")
+
+    def __init__(self):
+        self.wake = asyncio.Event()
+        self.seq = -1
+
+
+class Hub:
+    """Latest snapshot plus the delta from the one before; fans out to subscribers."""
+
+    def __init__(self):
+        self.subs = set()
+        self.seq = -1
+        self.snapshot = None
+        self.delta = None
+        self.ts = 0.0
+        self.joined = asyncio.Event()   # set when a subscriber joins an idle hub
+
+    def publish(self, snapshot: dict):
+        self.delta = diff(self.snapshot, snapshot) if self.snapshot is not None else None
+        self.snapshot = snapshot
+        self.seq += 1
+        self.ts = time.time()
+        for sub in self.subs:
+            sub.wake.set()
+
+    def message(self, sub: Subscriber) -> str:
+        """SSE frame for `sub`: delta if it saw the previous tick, else the full snapshot."""
+        if sub.seq == self.seq - 1 and self.delta is not None:
+            kind, data = "delta", self.delta
+        else:
+            kind, data = "snapshot", self.snapshot
+        sub.seq = self.seq
+        body = json.dumps({"seq": self.seq, "ts": self.ts, **data}, separators=(",", ":"))
+        return f"event: {kind}\nid: {self.seq}\ndata: {body}\n\n"
+
+    async def stream(self, is_disconnected=None):
+        """Async generator of SSE frames for one client (use with a StreamingResponse)."""
+        sub = Subscriber()
+        if not self.subs:
+            self.joined.set()
+        self.subs.add(sub)
+        try:
+            if self.snapshot is not None:
+                yield self.message(sub)
+            while True:
+                try:
+                    await asyncio.wait_for(sub.wake.wait(), timeout=15)
+                except asyncio.TimeoutError:
+                    if is_disconnected is not None and await is_disconnected():
+                        return
+                    yield ": keep-alive\n\n"
+                    continue
+                sub.wake.clear()
+                yield self.message(sub)
+        finally:
+            self.subs.discard(sub)
+            if not self.subs:
+                self.snapshot = self.delta = None   # stale by the time anyone subscribes again
+
+
+async def run_ticker(hub: Hub, compute, tick: float = LIVE_TICK_SEC):
+    """
+    Publish compute() every `tick` seconds while anyone is subscribed, starting as soon as
+    the first subscriber joins; a coroutine function is awaited, a plain one runs in a
+    worker thread. Errors are logged and the previous snapshot stays current.
+    """
+    while True:
+        if not hub.subs:
+            hub.joined.clear()
+            await hub.joined.wait()
+        started = time.monotonic()
+        try:
+            if inspect.iscoroutinefunction(compute):
+                hub.publish(await compute())
+            else:
+                hub.publish(await asyncio.to_thread(compute))
+        except Exception as ex:
+            print(f"[live] snapshot failed: {ex}")
+        await asyncio.sleep(max(0.0, tick - (time.monotonic() - started)))
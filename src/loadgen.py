@@ -0,0 +1,225 @@
+# src/loadgen.py
+import os, time, argparse
+from datetime import datetime, timezone, timedelta
+import numpy as np
+from dotenv import load_dotenv
+from src import kafka_producer as kp, metrics, wire
+
+load_dotenv()
+
+# Load-generation mode of the producer. Same session model as src/kafka_producer.py
+# (Poisson arrivals with the diurnal cycle, bounce / lognormal dwell, heartbeats every
+# HEARTBEAT_EVERY) but every active session is a row of NumPy arrays and a tick is a few
+# vectorized masks, so one process generates hundreds of thousands of events/sec.
+#   - --eps N scales the arrival rate so the steady state emits ~N events/sec
+#   - --speed X runs the virtual clock X times faster than wall time; --start replays
+#     from a past instant (required with --speed > 1 when running forever)
+#   - --warmup SEC simulates that long before emitting, to start at the steady state
+# Values are 32-byte binary records built in one structured array per tick (--format json
+# falls back to per-event JSON), handed to produce() in batches of LOADGEN_BATCH with a
+# poll(0) between batches; ticks are paced against the wall clock.
+LOADGEN_BATCH = int(os.getenv("LOADGEN_BATCH", "10000"))
+
+
+class VectorSim:
+    """Active sessions as parallel arrays; tick(t) returns the tick's events as columns."""
+
+    def __init__(self, rate_scale: float = 1.0, seed: int = None):
+        self.rng = np.random.default_rng(seed)
+        self.rate_scale = rate_scale
+        self.viewer = np.empty(0, "S12")        # "u" + 11 digits, unique per session
+        self.video = np.empty(0, np.int16)      # index into kp.VIDEOS
+        self.country = np.empty(0, np.int8)     # index into kp.COUNTRIES
+        self.end = np.empty(0, np.float64)      # epoch seconds
+        self.next_hb = np.empty(0, np.float64)
+        self.next_id = 10**10 + int(self.rng.integers(0, 8 * 10**9))
+        self.country_p = np.asarray(kp.COUNTRY_P) / sum(kp.COUNTRY_P)
+
+    def dwell(self, n: int) -> np.ndarray:
+        """Vectorized kp.draw_dwell_seconds()."""
+        bounce = self.rng.random(n) < kp.BOUNCE_PROB
+        long = np.clip(self.rng.lognormal(kp.LOGNORM_MEAN, kp.LOGNORM_SIGMA, n).astype(np.int64), 10, kp.MAX_DWELL_SEC)
+        return np.where(bounce, self.rng.integers(5, 16, n), long)
+
+    def heartbeat_gap(self, n: int) -> np.ndarray:
+        lo, hi = kp.HEARTBEAT_EVERY
+        return self.rng.integers(lo, hi + 1, n).astype(np.float64)
+
+    def tick(self, t: float) -> dict:
+        """
+        Advance to epoch second t: starts, then heartbeats and ends of the sessions active
+        before the tick (the order kp.maybe_start_new_sessions / advance_heartbeats_and_ends
+        emit them). Columns: event (wire code), viewer, video, country.
+        """
+        n_old = len(self.end)
+        k = self.rng.poisson(kp.BASE_ARRIVAL_RATE * self.rate_scale
+                             * kp.diurnal_multiplier(datetime.fromtimestamp(t, timezone.utc)))
+        new_viewer = viewer_ids(self.next_id, k)
+        self.next_id += k
+        new_video = self.rng.integers(0, len(kp.VIDEOS), k).astype(np.int16)
+        new_country = self.rng.choice(len(kp.COUNTRIES), k, p=self.country_p).astype(np.int8)
+
+        hb = (self.next_hb <= t) & (t < self.end)
+        ended = t >= self.end
+        self.next_hb[hb] = t + self.heartbeat_gap(int(hb.sum()))
+        hb_i, end_i = np.flatnonzero(hb), np.flatnonzero(ended)
+
+        codes = wire.EVENT_CODE
+        out = {
+            "event": np.concatenate([np.full(k, codes["view_start"], np.uint8), np.full(len(hb_i), codes["heartbeat"], np.uint8),
+                                     np.full(len(end_i), codes["view_end"], np.uint8)]),
+            "viewer": np.concatenate([new_viewer, self.viewer[hb_i], self.viewer[end_i]]),
+            "video": np.concatenate([new_video, self.video[hb_i], self.video[end_i]]),
+            "country": np.concatenate([new_country, self.country[hb_i], self.country[end_i]]),
+        }
+
+        keep = ~ended
+        if n_old and not keep.all():
+            self.viewer, self.video, self.country = self.viewer[keep], self.video[keep], self.country[keep]
+            self.end, self.next_hb = self.end[keep], self.next_hb[keep]
+        self.viewer = np.concatenate([self.viewer, new_viewer])
+        self.video = np.concatenate([self.video, new_video])
+        self.country = np.concatenate([self.country, new_country])
+        self.end = np.concatenate([self.end, t + self.dwell(k)])
+        self.next_hb = np.concatenate([self.next_hb, t + self.heartbeat_gap(k)])
+        return out
+
+    def __len__(self):
+        return len(self.end)
+
+
+def viewer_ids(first: int, n: int) -> np.ndarray:
+    """n consecutive ids as 12-byte "u<11 digits>" strings (the binary layout's viewer_id)."""
+    ids = first + np.arange(n, dtype=np.int64)
+    chars = np.empty((n, 12), dtype=np.uint8)
+    chars[:, 0] = ord("u")
+    for j in range(11):
+        chars[:, 11 - j] = ids // 10**j % 10 + ord("0")
+    return chars.view("S12").ravel()
+
+
+def events_per_session(n: int = 200_000) -> float:
+    """Mean events one session emits (start + heartbeats + end), by Monte Carlo."""
+    sim = VectorSim(seed=0)
+    lo, hi = kp.HEARTBEAT_EVERY
+    return 2.0 + float(np.mean(sim.dwell(n))) / ((lo + hi) / 2)
+
+
+VIDEO_BYTES = np.array([v.encode() for v in kp.VIDEOS], dtype="S8")
+COUNTRY_BYTES = np.array([c.encode() for c in kp.COUNTRIES], dtype="S2")
+
+
+def encode_binary(ev: dict, ts_us: int) -> bytes:
+    """One tick's events as concatenated wire.RECORD records (32 bytes each)."""
+    rec = np.empty(len(ev["event"]), dtype=wire.RECORD)
+    rec["magic"] = wire.BINARY_MAGIC
+    rec["event"] = ev["event"]
+    rec["country"] = COUNTRY_BYTES[ev["country"]]
+    rec["ts_us"] = ts_us
+    rec["viewer_id"] = ev["viewer"]
+    rec["video_id"] = VIDEO_BYTES[ev["video"]]
+    return rec.tobytes()
+
+
+def encode_values(ev: dict, ts_us: int, fmt: str = "binary") -> list:
+    """Kafka values for one tick's events."""
+    if fmt == "binary":
+        return np.frombuffer(encode_binary(ev, ts_us), dtype=f"V{wire.RECORD.itemsize}").tolist()
+    return [wire.encode_json({"event_type": wire.EVENT_TYPES[e], "viewer_id": v.decode(), "video_id": kp.VIDEOS[vi],
+                              "country": kp.COUNTRIES[c]}, ts_us)
+            for e, v, vi, c in zip(ev["event"].tolist(), ev["viewer"].tolist(), ev["video"].tolist(),
+                                   ev["country"].tolist())]
+
+
+def deliver(produce, poll, values: list, batch: int = LOADGEN_BATCH):
+    """produce() in batches with poll(0) in between; waits on poll when the local queue is full."""
+    for i in range(0, len(values), batch):
+        for v in values[i:i + batch]:
+            while True:
+                try:
+                    produce(v)
+                    break
+                except BufferError:
+                    kp.QUEUE_FULL.inc()
+                    poll(0.05)
+        poll(0)
+
+
+def run(sink_produce, sink_poll, eps: float = 0, speed: float = 1.0, start: datetime = None,
+        seconds: float = 0, warmup: float = 0, fmt: str = "binary", seed: int = None, report_sec: float = 5.0):
+    """Generate and deliver ticks until `seconds` of simulated time (0 = forever)."""
+    scale = eps / (kp.BASE_ARRIVAL_RATE * events_per_session()) if eps else 1.0
+    sim = VectorSim(rate_scale=scale, seed=seed)
+    t = (start or datetime.now(timezone.utc)).timestamp()
+    for w in range(int(warmup)):
+        sim.tick(t - warmup + w)
+    print(f"[loadgen] rate x{scale:.2f} ({eps or 'default'} eps target), speed x{speed}, {fmt}, "
+          f"{len(sim):,} sessions after warm-up")
+
+    t_end = t + seconds if seconds else float("inf")
+    wall0, sent, behind = time.monotonic(), 0, 0.0
+    last_report, sent_report = wall0, 0
+    ticks = 0
+    while t < t_end:
+        ev = sim.tick(t)
+        deliver(sink_produce, sink_poll, encode_values(ev, int(t * 1_000_000), fmt))
+        for code, n in enumerate(np.bincount(ev["event"], minlength=len(wire.EVENT_TYPES)).tolist()):
+            if n:
+                kp.EVENTS.labels(wire.EVENT_TYPES[code]).inc(n)
+        sent += len(ev["event"])
+        ticks += 1
+        t += 1.0
+        sleep = wall0 + ticks / speed - time.monotonic()
+        if sleep > 0:
+            time.sleep(sleep)
+        else:
+            behind = -sleep
+        now = time.monotonic()
+        if now - last_report >= report_sec:
+            print(f"[loadgen] {(sent - sent_report) / (now - last_report):,.0f} events/s delivered, "
+                  f"{len(sim):,} active sessions, {behind:.2f}s behind schedule")
+            last_report, sent_report = now, sent
+    return sent
+
+
+def main():
+    ap = argparse.ArgumentParser(description="vectorized load generator (Kafka producer mode)")
+    ap.add_argument("--eps", type=float, default=0, help="target steady-state events/sec (0 = producer's rate)")
+    ap.add_argument("--speed", type=float, default=1.0, help="simulated seconds per wall second")
+    ap.add_argument("--start", type=str, default=None, help="ISO-8601 start of the virtual clock (replay)")
+    ap.add_argument("--seconds", type=float, default=0, help="simulated seconds to run (0 = forever)")
+    ap.add_argument("--warmup", type=float, default=kp.MAX_DWELL_SEC, help="simulated seconds before emitting")
+    ap.add_argument("--format", choices=["binary", "json"], default="binary")
+    ap.add_argument("--seed", type=int, default=None)
+    ap.add_argument("--dry-run", action="store_true", help="generate and encode only, no Kafka")
+    args = ap.parse_args()
+
+    start = datetime.fromisoformat(args.start) if args.start else None
+    if start is not None and start.tzinfo is None:
+        start = start.replace(tzinfo=timezone.utc)
+    if args.speed > 1 and start is None:
+        if not args.seconds:
+            ap.error("--speed > 1 without --start runs ahead of the wall clock; pass --start or --seconds")
+        start = datetime.now(timezone.utc) - timedelta(seconds=args.seconds)   # ends near now
+
+    if args.dry_run:
+        produce, poll, flush = (lambda v: None), (lambda timeout=0: 0), (lambda timeout=0: 0)
+    else:
+        from confluent_kafka import Producer
+        p = Producer(kp.producer_config(**{"linger.ms": 20, "batch.num.messages": 10000,
+                                           "queue.buffering.max.messages": 1_000_000}))
+        kp.QUEUE_DEPTH.set_function(lambda: len(p))
+        produce, poll, flush = (lambda v: p.produce(kp.TOPIC, v)), p.poll, p.flush
+        print(f"[loadgen] producing to {kp.BOOTSTRAP} topic={kp.TOPIC}")
+    metrics.start("loadgen")
+    try:
+        run(produce, poll, eps=args.eps, speed=args.speed, start=start, seconds=args.seconds,
+            warmup=args.warmup, fmt=args.format, seed=args.seed)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        flush(10)
+
+
+if __name__ == "__main__":
+    main()
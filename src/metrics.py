@@ -0,0 +1,265 @@
+# src/metrics.py
+import os, bisect, cProfile, random, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Prometheus-style counters, gauges and histograms kept in-process (no client library) and
+# rendered in the text exposition format on http://METRICS_HOST:METRICS_PORT/metrics.
+# Updates take one uncontended lock and a dict lookup per labelled child; histograms are
+# cumulative fixed buckets filled with bisect. Components share one .env on one host, so each
+# listens on its own port: METRICS_PORT_<COMPONENT> if set, else METRICS_PORT plus the
+# component's offset in COMPONENT_OFFSETS. Processes that run several workers expose them on
+# that port + worker index.
+#   - profiled(name) times a block into compute_seconds{block=name}; with PROFILE_SAMPLE > 0
+#     that fraction of calls also runs under cProfile and dumps PROFILE_DIR/<name>-<ms>.prof
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))       # 0 = disabled
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+PROFILE_SAMPLE = float(os.getenv("PROFILE_SAMPLE", "0"))  # fraction of profiled() calls under cProfile
+PROFILE_DIR = os.getenv("PROFILE_DIR", "data/profiles")
+COMPONENT_OFFSETS = {"consumer": 0, "producer": 100, "loadgen": 101, "dashboard": 102}   # consumer workers: 0-99
+
+LATENCY_BUCKETS = (.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30)
+SIZE_BUCKETS = (1, 10, 100, 500, 1000, 5000, 10000, 20000, 50000, 100000)
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+class _Timer:
+    __slots__ = ("child", "t0")
+
+    def __init__(self, child):
+        self.child = child
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.child.observe(time.perf_counter() - self.t0)
+
+
+class _Value:
+    __slots__ = ("lock", "value", "fn")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.value = 0.0
+        self.fn = None
+
+    def inc(self, n: float = 1):
+        with self.lock:
+            self.value += n
+
+    def dec(self, n: float = 1):
+        self.inc(-n)
+
+    def set(self, v: float):
+        self.value = v
+
+    def set_function(self, fn):
+        """Gauge read at scrape time (e.g. a queue length)."""
+        self.fn = fn
+
+    def samples(self, name, labels):
+        v = self.value
+        if self.fn is not None:
+            try:
+                v = self.fn()
+            except Exception:
+                return []
+        return [(name, labels, v)]
+
+
+class _Buckets:
+    __slots__ = ("lock", "bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds):
+        self.lock = threading.Lock()
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, v: float):
+        i = bisect.bisect_left(self.bounds, v)
+        with self.lock:
+            self.counts[i] += 1
+            self.sum += v
+            self.count += 1
+
+    def time(self):
+        return _Timer(self)
+
+    def samples(self, name, labels):
+        with self.lock:
+            counts, total, n = list(self.counts), self.sum, self.count
+        out, acc = [], 0
+        for bound, c in zip(list(self.bounds) + ["+Inf"], counts):
+            acc += c
+            out.append((f"{name}_bucket", labels + (("le", _fmt(bound)),), acc))
+        out.append((f"{name}_sum", labels, total))
+        out.append((f"{name}_count", labels, n))
+        return out
+
+
+class Metric:
+    """A named family; labels(*values) returns the child that holds the numbers."""
+    kind = None
+
+    def __init__(self, name: str, help: str, labels=(), buckets=None):
+        self.name, self.help, self.label_names = name, help, tuple(labels)
+        self.buckets = tuple(buckets or LATENCY_BUCKETS)
+        self.children = {}
+        self.lock = threading.Lock()
+        if not self.label_names:
+            # unlabelled metrics: counter.inc(), histogram.observe(), ... act on the only child
+            child = self.labels()
+            for attr in ("inc", "dec", "set", "set_function", "observe", "time"):
+                if hasattr(child, attr):
+                    setattr(self, attr, getattr(child, attr))
+
+    def _new_child(self):
+        return _Buckets(self.buckets) if self.kind == "histogram" else _Value()
+
+    def labels(self, *values):
+        key = tuple(str(v) for v in values)
+        child = self.children.get(key)
+        if child is None:
+            if len(key) != len(self.label_names):
+                raise ValueError(f"{self.name} expects labels {self.label_names}, got {values}")
+            with self.lock:
+                child = self.children.setdefault(key, self._new_child())
+        return child
+
+    def samples(self):
+        for key, child in list(self.children.items()):
+            yield from child.samples(self.name, tuple(zip(self.label_names, key)))
+
+
+class Counter(Metric):
+    kind = "counter"
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+
+def _get(cls, name: str, help: str, labels=(), buckets=None):
+    with _registry_lock:
+        m = _registry.get(name)
+        if m is None:
+            m = _registry[name] = cls(name, help, labels, buckets)
+        elif not isinstance(m, cls) or m.label_names != tuple(labels):
+            raise ValueError(f"metric {name} already registered as {m.kind} {m.label_names}")
+        return m
+
+
+def counter(name: str, help: str, labels=()) -> Counter:
+    return _get(Counter, name, help, labels)
+
+
+def gauge(name: str, help: str, labels=()) -> Gauge:
+    return _get(Gauge, name, help, labels)
+
+
+def histogram(name: str, help: str, labels=(), buckets=None) -> Histogram:
+    return _get(Histogram, name, help, labels, buckets)
+
+
+def _fmt(v) -> str:
+    if isinstance(v, str):
+        return v
+    v = float(v)
+    return str(int(v)) if v.is_integer() else repr(v)
+
+
+def _escape(v: str) -> str:
+    return v.replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\"")
+
+
+def render() -> str:
+    """All registered metrics in the Prometheus text format (version 0.0.4)."""
+    lines = []
+    for name, m in sorted(_registry.items()):
+        lines.append(f"# HELP {name} {m.help}")
+        lines.append(f"# TYPE {name} {m.kind}")
+        for sample, labels, value in m.samples():
+            lab = ",".join(f'{k}="{_escape(v)}"' for k, v in labels)
+            lines.append(f"{sample}{{{lab}}} {_fmt(value)}" if lab else f"{sample} {_fmt(value)}")
+    return "\n".join(lines) + "\n"
+
+
+def serve(port: int, host: str = METRICS_HOST) -> ThreadingHTTPServer:
+    """Expose render() on http://host:port/metrics from a daemon thread."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.rstrip("/") != "/metrics":
+                self.send_error(404)
+                return
+            body = render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
+
+
+def port(component: str) -> int:
+    """Metrics port of a component (see COMPONENT_OFFSETS); 0 = disabled."""
+    override = os.getenv(f"METRICS_PORT_{component.upper()}")
+    if override is not None:
+        return int(override)
+    return METRICS_PORT + COMPONENT_OFFSETS[component] if METRICS_PORT else 0
+
+
+def start(component: str, offset: int = 0):
+    """serve() on port(component) + offset when that is set; None otherwise."""
+    base = port(component)
+    if not base:
+        return None
+    try:
+        server = serve(base + offset)
+    except OSError as ex:
+        print(f"[metrics] cannot listen on {METRICS_HOST}:{base + offset}: {ex}")
+        return None
+    print(f"[metrics] {component} serving on http://{METRICS_HOST}:{base + offset}/metrics")
+    return server
+
+
+COMPUTE_SECONDS = histogram("compute_seconds", "Wall time of profiled() blocks", ("block",))
+
+
+class profiled:
+    """Time a block into compute_seconds{block=name}; cProfile a PROFILE_SAMPLE fraction of calls."""
+
+    def __init__(self, name: str, sample: float = None):
+        self.name = name
+        self.sample = PROFILE_SAMPLE if sample is None else sample
+        self.prof = None
+
+    def __enter__(self):
+        if self.sample > 0 and random.random() < self.sample:
+            self.prof = cProfile.Profile()
+            self.prof.enable()
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        COMPUTE_SECONDS.labels(self.name).observe(time.perf_counter() - self.t0)
+        if self.prof is not None:
+            self.prof.disable()
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            self.prof.dump_stats(os.path.join(PROFILE_DIR, f"{self.name}-{int(time.time() * 1000)}.prof"))
+            self.prof = None
@@ -0,0 +1,150 @@
+# src/models/batch_forecast.py
+import os, argparse, logging, time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+import pandas as pd
+from sqlalchemy import text
+
+from src.db import ENGINE, CREATE_FORECASTS_SQL
+from src.rollups import ROLLUPS
+from src.models.timeseries import FORECAST_COLUMNS, holt_forecast, prophet_fit, prophet_predict
+
+# Starts/min forecasts per country and per video (plus the global series) for capacity
+# planning. All series come out of one grouped query and one pivot into a minutes x series
+# matrix; series with fewer than FORECAST_MIN_STARTS starts in the history are summed into
+# one '(other)' series per dim (dropped if even that stays sparse). Fits run in a process
+# pool of FORECAST_WORKERS and the future minutes replace the dims' rows in `forecasts`.
+#   python -m src.models.batch_forecast --hours 24 --periods 60 [--every 15]
+FORECAST_WORKERS = int(os.getenv("FORECAST_WORKERS", str(os.cpu_count() or 2)))
+FORECAST_MIN_STARTS = int(os.getenv("FORECAST_MIN_STARTS", "100"))
+POOLED_KEY = "(other)"
+
+_FROM_ROLLUP = """
+SELECT bucket AS ts, dim, key, starts FROM rollup_minute
+WHERE bucket > now() - CAST(:window AS interval)
+"""
+
+_FROM_EVENTS = """
+SELECT date_trunc('minute', ts) AS ts, g.dim, g.key, count(*) AS starts
+FROM events, LATERAL (VALUES ('all', ''), ('country', country), ('video', video_id)) AS g(dim, key)
+WHERE event_type = 'view_start' AND ts > now() - CAST(:window AS interval)
+GROUP BY 1, 2, 3
+"""
+
+
+def load_series(window: str = "24 hours") -> pd.DataFrame:
+    """Long ['ts','dim','key','starts'] for every series, ts tz-naive UTC minutes."""
+    df = pd.read_sql(text(_FROM_ROLLUP if ROLLUPS else _FROM_EVENTS), ENGINE,
+                     params={"window": window}, parse_dates={"ts": {"utc": True}})
+    df["ts"] = df["ts"].dt.tz_convert(None)
+    return df
+
+
+def build_series(long: pd.DataFrame, min_starts: int = FORECAST_MIN_STARTS) -> pd.DataFrame:
+    """
+    Minutes x (dim, key) matrix of starts, missing minutes as 0. Sparse keys of each dim
+    are pooled into (dim, POOLED_KEY); the 'all' series is never pooled.
+    """
+    if long.empty:
+        return pd.DataFrame()
+    wide = long.pivot_table(index="ts", columns=["dim", "key"], values="starts", aggfunc="sum", fill_value=0)
+    wide = wide.reindex(pd.date_range(wide.index.min(), wide.index.max(), freq="min"), fill_value=0)
+    totals = wide.sum()
+    dims = totals.index.get_level_values("dim")
+    sparse = (totals < min_starts) & (dims != "all")
+    pooled = wide.loc[:, sparse].T.groupby(level="dim").sum().T
+    pooled.columns = pd.MultiIndex.from_product([pooled.columns, [POOLED_KEY]], names=["dim", "key"])
+    out = pd.concat([wide.loc[:, ~sparse], pooled], axis=1)
+    return out.loc[:, out.sum() >= min_starts]
+
+
+def fit_one(task):
+    """Worker: (dim, key, minutes, starts, periods) -> (dim, key, model, forecast frame)."""
+    dim, key, ts, y, periods = task
+    spm = pd.DataFrame({"ts": ts, "starts": y})
+    logging.getLogger("cmdstanpy").setLevel(logging.WARNING)
+    try:
+        m = prophet_fit(spm)
+        if m is not None:
+            return dim, key, "prophet", prophet_predict(m, periods, include_history=False)
+    except ImportError:
+        pass
+    except Exception as e:
+        print(f"[batch_forecast] prophet failed for {dim}={key} ({e}); using Holt")
+    fc = holt_forecast(spm, periods)
+    return dim, key, "holt", fc.iloc[-periods:]
+
+
+def forecast_all(wide: pd.DataFrame, periods: int = 60, workers: int = FORECAST_WORKERS) -> pd.DataFrame:
+    """Fit every column of build_series() output; returns rows in `forecasts` column order."""
+    ts = wide.index.to_numpy()
+    tasks = [(dim, key, ts, wide[(dim, key)].to_numpy(), periods) for dim, key in wide.columns]
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(fit_one, tasks, chunksize=max(1, len(tasks) // (4 * workers))))
+    else:
+        results = [fit_one(t) for t in tasks]
+    fitted_at = datetime.now(timezone.utc)
+    parts = [fc[FORECAST_COLUMNS].assign(dim=dim, key=key, model=model) for dim, key, model, fc in results]
+    out = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=FORECAST_COLUMNS + ["dim", "key", "model"])
+    out["fitted_at"] = fitted_at
+    return out[["dim", "key", "ds", "yhat", "yhat_lower", "yhat_upper", "model", "fitted_at"]]
+
+
+def store(fc: pd.DataFrame):
+    """Replace the forecast rows of every dim present in `fc` (one transaction)."""
+    from psycopg2.extras import execute_values
+    if fc.empty:
+        return
+    rows = list(zip(fc["dim"], fc["key"], fc["ds"].dt.tz_localize("UTC").astype(object),
+                    fc["yhat"].astype(float), fc["yhat_lower"].astype(float), fc["yhat_upper"].astype(float),
+                    fc["model"], fc["fitted_at"].astype(object)))
+    with ENGINE.begin() as conn:
+        conn.execute(text(CREATE_FORECASTS_SQL))
+        conn.execute(text("DELETE FROM forecasts WHERE dim = ANY(:dims)"), {"dims": sorted(fc["dim"].unique())})
+        with conn.connection.cursor() as cur:
+            execute_values(cur, "INSERT INTO forecasts (dim, key, ds, yhat, yhat_lower, yhat_upper, model, fitted_at) "
+                                "VALUES %s", rows, page_size=1000)
+
+
+def load_forecasts(dim: str = None) -> pd.DataFrame:
+    """Stored forecasts (all dims, or one), ds as tz-naive UTC like the observed series."""
+    sql = "SELECT dim, key, ds, yhat, yhat_lower, yhat_upper, model, fitted_at FROM forecasts"
+    params = {}
+    if dim is not None:
+        sql += " WHERE dim = :dim"
+        params["dim"] = dim
+    # utc=True: an empty result would otherwise come back tz-naive and fail tz_convert
+    df = pd.read_sql(text(sql + " ORDER BY dim, key, ds"), ENGINE, params=params,
+                     parse_dates={"ds": {"utc": True}, "fitted_at": {"utc": True}})
+    df["ds"] = df["ds"].dt.tz_convert(None)
+    return df
+
+
+def run(hours: int = 24, periods: int = 60, workers: int = FORECAST_WORKERS) -> pd.DataFrame:
+    t0 = time.monotonic()
+    long = load_series(f"{hours} hours")
+    wide = build_series(long)
+    t1 = time.monotonic()
+    fc = forecast_all(wide, periods, workers)
+    t2 = time.monotonic()
+    store(fc)
+    n_series = long.groupby(["dim", "key"]).ngroups if not long.empty else 0
+    print(f"[batch_forecast] {wide.shape[1]} series fitted ({n_series} before pooling), "
+          f"load {t1 - t0:.1f}s, fit {t2 - t1:.1f}s on {workers} workers, "
+          f"store {time.monotonic() - t2:.1f}s")
+    return fc
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="per-country / per-video starts forecasts")
+    ap.add_argument("--hours", type=int, default=24, help="history window")
+    ap.add_argument("--periods", type=int, default=60, help="minutes ahead")
+    ap.add_argument("--workers", type=int, default=FORECAST_WORKERS)
+    ap.add_argument("--every", type=float, default=0, help="repeat every N minutes (0 = once)")
+    args = ap.parse_args()
+    while True:
+        run(args.hours, args.periods, args.workers)
+        if not args.every:
+            break
+        time.sleep(args.every * 60)
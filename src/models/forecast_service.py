@@ -0,0 +1,100 @@
+# src/models/forecast_service.py
+import os, threading, time
+import pandas as pd
+
+from src.models.timeseries import FORECAST_COLUMNS, holt_forecast, prophet_fit, prophet_predict, stan_init
+
+# Starts/min forecast fitted off the dashboard's script run. The dashboard hands over the
+# latest series on every refresh (cheap) and reads back whatever is cached; a daemon thread
+# refits Prophet when the series' watermark (its newest minute) has moved, at most once per
+# FORECAST_REFIT_SEC, warm-started from the previous fit's parameters.
+FORECAST_REFIT_SEC = float(os.getenv("FORECAST_REFIT_SEC", "60"))
+FORECAST_PERIODS = int(os.getenv("FORECAST_PERIODS", "60"))     # minutes ahead
+
+
+class ForecastService:
+    def __init__(self, periods: int = FORECAST_PERIODS, refit_sec: float = FORECAST_REFIT_SEC):
+        self.periods = periods
+        self.refit_sec = refit_sec
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.spm = None                 # latest series handed over by update()
+        self.watermark = None           # its newest minute
+        self.fitted = None              # (watermark, forecast frame) of the last Prophet fit
+        self.fallback = None            # (watermark, Holt forecast frame)
+        self.init = None                # stan_init() of the last fit, for warm starts
+        self.fitted_at = float("-inf")
+        self.error = None               # set when Prophet cannot run at all
+        self.thread = None
+
+    def update(self, spm: pd.DataFrame):
+        """Hand over the latest ['ts','starts'] series; wakes the worker if it has new minutes."""
+        if spm is None or spm.empty:
+            return
+        wm = spm["ts"].max()
+        with self.lock:
+            if wm == self.watermark:
+                return
+            self.spm, self.watermark = spm, wm
+            if self.thread is None and self.error is None:
+                self.thread = threading.Thread(target=self._run, name="forecast", daemon=True)
+                self.thread.start()
+        self.wake.set()
+
+    def forecast(self):
+        """
+        (frame, kind): kind is 'prophet' for the cached fit (its watermark may trail the
+        series by up to one refit), 'holt' while no fit exists yet, None without data.
+        """
+        with self.lock:
+            fitted, fallback, spm, wm = self.fitted, self.fallback, self.spm, self.watermark
+        if fitted is not None:
+            return fitted[1], "prophet"
+        if spm is None:
+            return pd.DataFrame(columns=FORECAST_COLUMNS), None
+        if fallback is None or fallback[0] != wm:
+            fallback = (wm, holt_forecast(spm, self.periods))
+            with self.lock:
+                self.fallback = fallback
+        return fallback[1], "holt"
+
+    def _run(self):
+        while True:
+            self.wake.wait()
+            time.sleep(max(self.fitted_at + self.refit_sec - time.monotonic(), 0))
+            self.wake.clear()
+            with self.lock:
+                spm, wm = self.spm, self.watermark
+            if self.fitted is not None and self.fitted[0] == wm:
+                continue
+            t0 = time.monotonic()
+            try:
+                m = self._fit(spm)
+            except ImportError:
+                print("[forecast] prophet not installed; serving Holt smoothing")
+                self.error = "prophet not installed"
+                return
+            self.fitted_at = time.monotonic()
+            if m is None:
+                continue
+            fc = prophet_predict(m, self.periods)
+            with self.lock:
+                warm = self.init is not None
+                self.fitted, self.init = (wm, fc), stan_init(m)
+            print(f"[forecast] {'warm' if warm else 'cold'} fit of {len(spm)} minutes up to {wm} "
+                  f"in {self.fitted_at - t0:.2f}s")
+
+    def _fit(self, spm: pd.DataFrame):
+        if self.init is not None:
+            try:
+                return prophet_fit(spm, init=self.init)
+            except Exception as e:
+                # e.g. fewer changepoints than the previous fit on a short series
+                print(f"[forecast] warm start failed ({e}); refitting cold")
+        try:
+            return prophet_fit(spm)
+        except ImportError:
+            raise
+        except Exception as e:
+            print(f"[forecast] fit failed: {e}")
+            return None
@@ -1,64 +1,28 @@
 # src/models/survival.py
+import heapq, threading, time
 import numpy as np
 import pandas as pd
 from lifelines import KaplanMeierFitter
 
-def dwell_label(events: pd.DataFrame, now: pd.Timestamp) -> pd.DataFrame:
+from src.sessions import SESSION_TIMEOUT_SEC, sessionize
+
+def dwell_label(events: pd.DataFrame, now: pd.Timestamp, sessions: pd.DataFrame = None) -> pd.DataFrame:
     """
-    Build per-view dwell durations and churn flags from raw events.
-    Expects columns: ['ts','viewer_id','event_type'] with event_type in {'view_start','view_end'}.
+    Build per-session dwell durations and churn flags from raw events.
+    Expects columns: ['ts','viewer_id','event_type'] (see src/sessions.py for the rules).
     Returns a DataFrame with: ['viewer_id','start','end','dwell_sec','churned'].
-      - dwell_sec: seconds watched for that viewer in the window
-      - churned: 1 if we saw a 'view_end' (i.e., observed end), 0 if still active (right-censored)
-    Notes:
-      - If multiple starts/ends exist per viewer in the window, we take the earliest start
-        and the latest end to form one session-like interval (simple & robust).
-      - Active viewers (no end yet) get end=now and churned=0.
+      - dwell_sec: seconds watched in that session
+      - churned: 1 if the session ended (view_end or heartbeat timeout), 0 if still active
+        (right-censored, end=now)
+    Pass `sessions` (sessions.sessionize() output) to reuse a session table built once per refresh.
     """
-    if events is None or events.empty:
-        return pd.DataFrame(columns=["viewer_id", "start", "end", "dwell_sec", "churned"])
-
-    df = events.copy()
-    df["ts"] = pd.to_datetime(df["ts"], utc=True)
-
-    # earliest start per viewer
-    starts = (
-        df[df["event_type"] == "view_start"]
-        .groupby("viewer_id")["ts"].min()
-        .rename("start")
-    )
-
-    # latest end per viewer (if any)
-    ends = (
-        df[df["event_type"] == "view_end"]
-        .groupby("viewer_id")["ts"].max()
-        .rename("end")
-    )
-
-    aligned = pd.concat([starts, ends], axis=1).reset_index()
-
-    # if no start for a viewer, drop (cannot compute dwell)
-    aligned = aligned.dropna(subset=["start"])
-
-    # fill missing end with 'now' (still active → right-censored)
-    aligned["end"] = aligned["end"].fillna(now)
-
-    # ensure utc + correct ordering
-    aligned["start"] = pd.to_datetime(aligned["start"], utc=True)
-    aligned["end"]   = pd.to_datetime(aligned["end"],   utc=True)
-
-    # compute dwell
-    aligned["dwell_sec"] = (aligned["end"] - aligned["start"]).dt.total_seconds()
-
-    # clean bad rows
-    aligned = aligned.replace([np.inf, -np.inf], np.nan)
-    aligned = aligned.dropna(subset=["dwell_sec"])
-    aligned = aligned[aligned["dwell_sec"] >= 0]
-
-    # churned flag: 1 if we actually saw an end event
-    aligned["churned"] = (aligned["end"] != now).astype(int)
-
-    return aligned[["viewer_id", "start", "end", "dwell_sec", "churned"]]
+    if sessions is None:
+        sessions = sessionize(events, now)
+    out = sessions.copy()
+    out["start"] = pd.to_datetime(out["start"], unit="us", utc=True)
+    out["end"] = pd.to_datetime(out["end"], unit="us", utc=True)
+    out["churned"] = out["churned"].astype(int)
+    return out[["viewer_id", "start", "end", "dwell_sec", "churned"]]
 
 def fit_km(dwell_df: pd.DataFrame):
     """
@@ -86,3 +50,135 @@ def fit_km(dwell_df: pd.DataFrame):
                          "timeline": "sec"})
     )
     return kmf, sf
+
+def km_from_bins(events: np.ndarray, censored: np.ndarray, bin_sec: float = 1.0) -> pd.DataFrame:
+    """
+    Kaplan–Meier curve from per-duration-bin counts (bin i covers [i, i+1) * bin_sec).
+    Returns ['sec','survival'] like fit_km(): 1.0 at 0, then one row per bin with removals.
+    """
+    n = max(len(events), len(censored))
+    d = np.zeros(n, dtype=np.int64); d[:len(events)] = events
+    c = np.zeros(n, dtype=np.int64); c[:len(censored)] = censored
+    removed = d + c
+    idx = np.flatnonzero(removed)
+    if len(idx) == 0:
+        return pd.DataFrame({"sec": [0.0], "survival": [1.0]})
+    at_risk = removed.sum() - np.concatenate([[0], np.cumsum(removed)[:-1]])
+    surv = np.cumprod(np.where(d > 0, 1.0 - d / np.maximum(at_risk, 1), 1.0))
+    sec, surv = idx * bin_sec, surv[idx]
+    if idx[0] != 0:
+        sec, surv = np.r_[0.0, sec], np.r_[1.0, surv]
+    return pd.DataFrame({"sec": sec.astype(float), "survival": surv})
+
+class IncrementalKM:
+    """
+    Kaplan–Meier state updated as events arrive instead of refit per page load.
+    Keeps, for sessions that started in the last `window_sec`:
+      - churn counts per duration bin for closed sessions,
+      - open sessions' start and last-seen times; at curve() time they are churned at their
+        last event if silent for `timeout_sec`, else censored at `now`, re-binned with one
+        bincount per call (O(open sessions), not O(history)).
+    Sessions follow the src/sessions.py rules, applied one event at a time in ts order
+    (each batch is sorted first: ids commit out of order), so curve() equals a fit on
+    sessionize() of the same events. Closed sessions leave the window from a start-ordered heap.
+    As an EventCache listener, call hold() before subscribing and bootstrap() with the history
+    up to the returned watermark; batches that arrive in between are folded in with it.
+    """
+
+    def __init__(self, window_sec: float = 24 * 3600, bin_sec: float = 1.0, timeout_sec: float = SESSION_TIMEOUT_SEC):
+        self.window_sec = window_sec
+        self.bin_sec = bin_sec
+        self.timeout_sec = timeout_sec
+        self.open = {}                          # viewer_id -> [start, last seen] (epoch s)
+        self.closed = []                        # heap of (start, bin)
+        self.events = np.zeros(3600, dtype=np.int64)
+        self.lock = threading.Lock()            # observe() and curve() come from different sessions
+        self.pending = None                     # listener batches held until bootstrap()
+
+    def observe(self, ts_us, viewer_ids, event_types):
+        """Fold a batch of events (epoch µs, ids, types), sorted by ts first."""
+        with self.lock:
+            self._observe_sorted(ts_us, viewer_ids, event_types)
+
+    def _observe_sorted(self, ts_us, viewer_ids, event_types):
+        ts = np.asarray(ts_us, dtype=np.int64)
+        order = np.argsort(ts, kind="stable")
+        self._observe((ts[order] / 1e6).tolist(), np.asarray(viewer_ids, dtype=object)[order].tolist(),
+                      np.asarray(event_types, dtype=object)[order].tolist())
+
+    def _observe(self, ts, viewer_ids, event_types):
+        for t, v, e in zip(ts, viewer_ids, event_types):
+            cur = self.open.get(v)
+            if cur is not None and t - cur[1] > self.timeout_sec:
+                self._close(cur[0], cur[1])         # heartbeats stopped: ended at last event
+                del self.open[v]
+                cur = None
+            if e == "view_start":
+                if cur is not None:
+                    if t == cur[0]:
+                        continue                    # replayed start
+                    self._close(cur[0], cur[1])
+                self.open[v] = [t, t]
+            elif cur is not None:
+                if e == "view_end":
+                    self._close(cur[0], t)
+                    del self.open[v]
+                else:
+                    cur[1] = max(cur[1], t)
+
+    def _close(self, start: float, end: float):
+        b = int((end - start) // self.bin_sec)
+        if b < 0:
+            return
+        if b >= len(self.events):
+            self.events = np.concatenate([self.events, np.zeros(max(b + 1, 2 * len(self.events)) - len(self.events),
+                                                                dtype=np.int64)])
+        self.events[b] += 1
+        heapq.heappush(self.closed, (start, b))
+
+    def observe_cols(self, cols):
+        """EventCache listener: cols has 'ts' (µs), 'viewer_id', 'event_type'."""
+        with self.lock:
+            if self.pending is not None:
+                self.pending.append(cols)
+                return
+            self._observe_sorted(cols["ts"], cols["viewer_id"], cols["event_type"])
+
+    def hold(self):
+        """Hold listener batches until bootstrap()."""
+        with self.lock:
+            self.pending = []
+
+    def bootstrap(self, ts_us, viewer_ids, event_types):
+        """Fold the history plus every batch held since hold() as one ts-ordered batch."""
+        with self.lock:
+            held, self.pending = self.pending or [], None
+            self._observe_sorted(
+                np.concatenate([np.asarray(ts_us, dtype=np.int64)] + [np.asarray(c["ts"], dtype=np.int64) for c in held]),
+                np.concatenate([np.asarray(viewer_ids, dtype=object)] + [np.asarray(c["viewer_id"], dtype=object) for c in held]),
+                np.concatenate([np.asarray(event_types, dtype=object)] + [np.asarray(c["event_type"], dtype=object) for c in held]))
+
+    def _expire(self, now: float):
+        cutoff = now - self.window_sec
+        while self.closed and self.closed[0][0] < cutoff:
+            _, b = heapq.heappop(self.closed)
+            self.events[b] -= 1
+        stale = [v for v, (s, _) in self.open.items() if s < cutoff]
+        for v in stale:
+            del self.open[v]
+
+    def curve(self, now: float = None):
+        """(survival_df, n, churned, censored) as of `now` (epoch s)."""
+        now = time.time() if now is None else now
+        with self.lock:
+            self._expire(now)
+            bounds = np.array(list(self.open.values()), dtype=np.float64).reshape(-1, 2)
+            events = self.events.copy()
+        bounds = bounds[bounds[:, 0] <= now]
+        start, seen = bounds[:, 0], bounds[:, 1]
+        silent = now - seen > self.timeout_sec
+        timed_out = np.bincount(((seen - start)[silent] // self.bin_sec).astype(np.int64), minlength=len(events))
+        timed_out[:len(events)] += events
+        censored = np.bincount(((now - start)[~silent] // self.bin_sec).astype(np.int64), minlength=1)
+        churned, n_open = int(timed_out.sum()), int((~silent).sum())
+        return km_from_bins(timed_out, censored, self.bin_sec), churned + n_open, churned, n_open
@@ -1,4 +1,5 @@
 # src/models/timeseries.py
+import numpy as np
 import pandas as pd
 
 def starts_per_minute(events: pd.DataFrame) -> pd.DataFrame:
@@ -32,17 +33,22 @@ def starts_per_minute(events: pd.DataFrame) -> pd.DataFrame:
     return spm
 
 
-def prophet_forecast(spm: pd.DataFrame, periods: int = 60) -> pd.DataFrame:
+def session_starts_per_minute(sessions: pd.DataFrame) -> pd.DataFrame:
     """
-    Simple Prophet forecast on starts/min.
-    Input spm columns: ['ts','starts'] with ts tz-naive.
-    Returns dataframe with ['ds','yhat','yhat_lower','yhat_upper'].
+    starts_per_minute() from a sessions.sessionize() table (start as epoch µs), so a refresh
+    that already sessionized its events does not scan them again; replayed starts count once.
     """
-    from prophet import Prophet  # lazy import
+    if sessions is None or sessions.empty:
+        return pd.DataFrame(columns=["ts", "starts"])
+    minute = pd.to_datetime(sessions["start"] // 60_000_000 * 60, unit="s")   # tz-naive
+    return minute.value_counts().sort_index().rename_axis("ts").rename("starts").reset_index()
 
-    if spm is None or spm.empty:
-        return pd.DataFrame(columns=["ds", "yhat", "yhat_lower", "yhat_upper"])
 
+FORECAST_COLUMNS = ["ds", "yhat", "yhat_lower", "yhat_upper"]
+
+
+def prophet_frame(spm: pd.DataFrame) -> pd.DataFrame:
+    """spm ['ts','starts'] -> Prophet's ['ds','y']: tz-naive, one row per ds, sorted."""
     df_p = spm.rename(columns={"ts": "ds", "starts": "y"}).copy()
 
     # Ensure tz-naive for Prophet
@@ -55,19 +61,87 @@ def prophet_forecast(spm: pd.DataFrame, periods: int = 60) -> pd.DataFrame:
 
     # Guard against duplicates & sort
     df_p = df_p.dropna(subset=["ds", "y"])
-    df_p = df_p.groupby("ds", as_index=False)["y"].sum().sort_values("ds")
+    return df_p.groupby("ds", as_index=False)["y"].sum().sort_values("ds")
 
-    if len(df_p) < 10:
-        # Not enough history to fit
-        return pd.DataFrame(columns=["ds", "yhat", "yhat_lower", "yhat_upper"])
 
+def prophet_fit(spm: pd.DataFrame, init: dict = None):
+    """
+    Fit Prophet on starts/min; `init` (stan_init() of an earlier model) warm-starts the
+    optimizer so a refit on a slightly longer series converges in a few iterations.
+    Returns the fitted model, or None with fewer than 10 points.
+    """
+    from prophet import Prophet  # lazy import
+
+    df_p = prophet_frame(spm) if spm is not None and not spm.empty else None
+    if df_p is None or len(df_p) < 10:
+        # Not enough history to fit
+        return None
     m = Prophet(interval_width=0.8, daily_seasonality=True, weekly_seasonality=True)
-    m.fit(df_p)
+    if init is not None:
+        m.fit(df_p, init=init)
+    else:
+        m.fit(df_p)
+    return m
 
+
+def stan_init(m) -> dict:
+    """A fitted Prophet model's parameters in the shape fit(init=...) expects."""
+    res = {}
+    for pname in ["k", "m", "sigma_obs"]:
+        res[pname] = float(m.params[pname][0][0])
+    for pname in ["delta", "beta"]:
+        res[pname] = m.params[pname][0]
+    return res
+
+
+def prophet_predict(m, periods: int = 60, include_history: bool = True) -> pd.DataFrame:
+    """History (optionally) plus `periods` future minutes from a fitted model."""
     # Build naive-datetime future minutes
-    future = m.make_future_dataframe(periods=periods, freq="min", include_history=True)
+    future = m.make_future_dataframe(periods=periods, freq="min", include_history=include_history)
     # make_future_dataframe already produces tz-naive; enforce just in case:
     future["ds"] = pd.to_datetime(future["ds"]).dt.tz_localize(None)
+    return m.predict(future)[FORECAST_COLUMNS]
+
+
+def prophet_forecast(spm: pd.DataFrame, periods: int = 60, init: dict = None) -> pd.DataFrame:
+    """
+    Simple Prophet forecast on starts/min.
+    Input spm columns: ['ts','starts'] with ts tz-naive.
+    Returns dataframe with ['ds','yhat','yhat_lower','yhat_upper'].
+    """
+    m = prophet_fit(spm, init=init)
+    if m is None:
+        return pd.DataFrame(columns=FORECAST_COLUMNS)
+    return prophet_predict(m, periods)
+
 
-    fc = m.predict(future)[["ds", "yhat", "yhat_lower", "yhat_upper"]]
-    return fc
+def holt_forecast(spm: pd.DataFrame, periods: int = 60, alpha: float = 0.3, beta: float = 0.05) -> pd.DataFrame:
+    """
+    Holt's linear exponential smoothing on starts/min, same output as prophet_forecast().
+    Milliseconds on a day of minutes; shown while the first Prophet fit runs. History rows
+    carry the one-step-ahead fit, the band is ±1.28 residual sd (≈80%) widening with sqrt(h).
+    """
+    if spm is None or spm.empty:
+        return pd.DataFrame(columns=FORECAST_COLUMNS)
+    df_p = prophet_frame(spm)
+    if len(df_p) < 2:
+        return pd.DataFrame(columns=FORECAST_COLUMNS)
+    # fill missing minutes with 0 starts so steps are one minute
+    idx = pd.date_range(df_p["ds"].iloc[0], df_p["ds"].iloc[-1], freq="min")
+    y = df_p.set_index("ds")["y"].reindex(idx, fill_value=0).to_numpy(dtype=float)
+
+    fit = np.empty(len(y))
+    level, trend = y[0], y[1] - y[0]
+    for i, v in enumerate(y):
+        fit[i] = level + trend
+        prev = level
+        level = alpha * v + (1 - alpha) * (level + trend)
+        trend = beta * (level - prev) + (1 - beta) * trend
+    fit[0] = y[0]
+    sd = float(np.std(y[1:] - fit[1:])) if len(y) > 2 else 0.0
+
+    h = np.arange(1, periods + 1)
+    ds = idx.append(pd.date_range(idx[-1] + pd.Timedelta(minutes=1), periods=periods, freq="min"))
+    yhat = np.r_[fit, level + h * trend]
+    band = 1.28 * sd * np.r_[np.ones(len(y)), np.sqrt(h)]
+    return pd.DataFrame({"ds": ds, "yhat": yhat, "yhat_lower": yhat - band, "yhat_upper": yhat + band})
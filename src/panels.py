@@ -0,0 +1,103 @@
+# src/panels.py
+import io
+from dataclasses import dataclass, field
+import pandas as pd
+from src.db import ENGINE, KEYED, VIEWER_KEY
+from src.async_db import KPIS_SQL, COUNTRIES_SQL
+
+# Dashboard query planner. Each panel declares the window it looks at and either the raw
+# columns it needs (projection) or a server-side aggregate (sql); plan() turns that into one
+# SELECT and load() streams the result with COPY ... TO STDOUT into pd.read_csv, so nothing
+# is materialized as per-row Python objects. Column types on arrival:
+#   ts / *_us     int64 epoch microseconds (ts_datetime() converts when a panel needs it)
+#   event_type, country, video_id   pandas categoricals
+#   viewer_id     str (int64 dim_viewer key in the keyed layout: ids only need to be told apart)
+
+# raw column -> (select expression, dtype)
+PROJECTION = {
+    "ts": ("(extract(epoch FROM ts) * 1000000)::bigint AS ts", "int64"),
+    "viewer_id": (f"{VIEWER_KEY} AS viewer_id", "int64" if KEYED else "str"),
+    "video_id": ("video_id", "category"),
+    "event_type": ("event_type", "category"),
+    "country": ("country", "category"),
+}
+
+
+@dataclass(frozen=True)
+class Panel:
+    name: str
+    window: str                         # Postgres interval the panel covers
+    columns: tuple = ()                 # projection of raw events in the window ...
+    sql: str = None                     # ... or an aggregate query (%(window)s is bound)
+    dtypes: dict = field(default_factory=dict)
+    where: str = None                   # extra filter for a projection
+    cached: bool = True                 # projection may be served from a dashboard EventCache
+
+
+PANELS = {p.name: p for p in (
+    Panel("recent", "24 hours",
+          sql="SELECT EXISTS (SELECT 1 FROM events WHERE ts > now() - CAST(%(window)s AS interval)) AS any",
+          dtypes={"any": "str"}),
+    # active viewers (60s), events in the last 10s, avg dwell seconds (30m): one row
+    Panel("kpis", "30 minutes", sql=KPIS_SQL, dtypes={"active": "int64", "last_10s": "int64", "dwell": "float64"}),
+    Panel("eps", "5 minutes",
+          sql="SELECT floor(extract(epoch FROM ts))::bigint AS sec, count(*) AS events FROM events "
+              "WHERE ts > now() - CAST(%(window)s AS interval) GROUP BY 1 ORDER BY 1",
+          dtypes={"sec": "int64", "events": "int64"}),
+    Panel("concurrency", "15 minutes", columns=("ts", "viewer_id")),
+    Panel("countries", "15 minutes", sql=COUNTRIES_SQL, dtypes={"country": "category", "viewers": "int64"}),
+    # bootstraps survival.IncrementalKM once (the event cache feeds it after); heartbeats
+    # included, sessions time out without them (src/sessions.py)
+    Panel("session_events", "24 hours", columns=("ts", "viewer_id", "event_type"), cached=False),
+    Panel("starts_per_minute", "24 hours",
+          sql="SELECT (extract(epoch FROM date_trunc('minute', ts)))::bigint AS minute, count(*) AS starts "
+              "FROM events WHERE event_type = 'view_start' AND ts > now() - CAST(%(window)s AS interval) "
+              "GROUP BY 1 ORDER BY 1",
+          dtypes={"minute": "int64", "starts": "int64"}),
+)}
+
+
+def plan(panel: Panel, max_id: int = None):
+    """(sql, params, dtypes) for one panel; max_id limits a projection to ids <= max_id."""
+    if panel.sql is not None:
+        return panel.sql, {"window": panel.window}, panel.dtypes
+    exprs, dtypes = zip(*(PROJECTION[c] for c in panel.columns))
+    where = "ts > now() - CAST(%(window)s AS interval)"
+    if panel.where:
+        where += f" AND {panel.where}"
+    if max_id is not None:
+        where += " AND id <= %(max_id)s"
+    sql = f"SELECT {', '.join(exprs)} FROM events WHERE {where} ORDER BY ts"
+    return sql, {"window": panel.window, "max_id": max_id}, dict(zip(panel.columns, dtypes))
+
+
+def window_sec(panel: Panel) -> float:
+    return pd.Timedelta(panel.window).total_seconds()
+
+
+def load(panel, engine=ENGINE, max_id: int = None) -> pd.DataFrame:
+    """Run a panel's query (a Panel or a PANELS name) and return it typed as declared."""
+    if isinstance(panel, str):
+        panel = PANELS[panel]
+    return copy_frame(*plan(panel, max_id), engine=engine)
+
+
+def copy_frame(sql: str, params: dict, dtypes: dict, engine=ENGINE) -> pd.DataFrame:
+    """Stream a query's result through COPY ... TO STDOUT (CSV) into a typed DataFrame."""
+    conn = engine.raw_connection()
+    try:
+        with conn.cursor() as cur:
+            query = cur.mogrify(sql, params).decode()
+            buf = io.StringIO()
+            cur.copy_expert(f"COPY ({query}) TO STDOUT WITH (FORMAT csv, HEADER)", buf)
+        conn.commit()
+    finally:
+        conn.close()
+    buf.seek(0)
+    return pd.read_csv(buf, dtype=dtypes, keep_default_na=False, na_values={c: [""] for c, t in dtypes.items()
+                                                                           if t in ("Int64", "float64")})
+
+
+def ts_datetime(us) -> pd.Series:
+    """int64 epoch microseconds -> tz-aware UTC datetimes."""
+    return pd.to_datetime(us, unit="us", utc=True)
@@ -0,0 +1,246 @@
+# src/rollups.py
+import os, argparse
+from datetime import datetime, timedelta, timezone
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+from src.db import ENGINE, ROLLUP_TABLES, VIEWER_KEY
+from src import sketch
+
+ROLLUPS = os.getenv("ROLLUPS", "1") == "1"                      # consumer upserts + dashboard reads
+ROLLUP_LOOKBACK_MIN = int(os.getenv("ROLLUP_LOOKBACK_MIN", "5"))  # minutes re-compacted per run
+ROLLUP_SECOND_RETENTION_HOURS = int(os.getenv("ROLLUP_SECOND_RETENTION_HOURS", "2"))
+DISTINCT_MODE = os.getenv("DISTINCT_MODE", "hll")   # hll (mergeable sketches) | exact (COUNT DISTINCT)
+
+GRAIN_STEP = {"second": timedelta(seconds=1), "minute": timedelta(minutes=1), "hour": timedelta(hours=1)}
+FINER = {"minute": "second", "hour": "minute"}
+
+# rollup_second is additive: every consumer flush adds its own per-second counts in the same
+# transaction as the raw rows. viewers there is distinct per flush, so a viewer whose events
+# in one second land in two flushes is counted twice (rare: heartbeats are 5-10s apart).
+UPSERT_SECOND_SQL = """
+INSERT INTO rollup_second (bucket, dim, key, events, starts, ends, heartbeats, viewers) VALUES %s
+ON CONFLICT (bucket, dim, key) DO UPDATE SET
+  events = rollup_second.events + EXCLUDED.events,
+  starts = rollup_second.starts + EXCLUDED.starts,
+  ends = rollup_second.ends + EXCLUDED.ends,
+  heartbeats = rollup_second.heartbeats + EXCLUDED.heartbeats,
+  viewers = rollup_second.viewers + EXCLUDED.viewers
+"""
+
+# Coarse grains are replaced, never added to, so re-running a range is idempotent.
+# Counts are summed from the next finer grain. Unique viewers are not additive: in exact
+# mode they come from one COUNT(DISTINCT) over the raw rows of the range; in hll mode minute
+# sketches are built from the raw rows (sketch.REGISTERS_SQL) and hour sketches are merged
+# from the minute ones, and viewers holds the sketch estimate.
+_REPLACE = """
+ON CONFLICT (bucket, dim, key) DO UPDATE SET
+  events = EXCLUDED.events, starts = EXCLUDED.starts, ends = EXCLUDED.ends,
+  heartbeats = EXCLUDED.heartbeats, viewers = EXCLUDED.viewers
+"""
+
+_VIEWERS = """
+  SELECT date_trunc(:grain, ts) AS bucket, g.dim, g.key, count(DISTINCT {viewer}) AS viewers
+  FROM events, LATERAL (VALUES ('all', ''), ('country', country), ('video', video_id)) AS g(dim, key)
+  WHERE ts >= :lo AND ts < :hi GROUP BY 1, 2, 3
+"""
+
+COMPACT_SQL = """
+INSERT INTO {dst} (bucket, dim, key, events, starts, ends, heartbeats, viewers)
+SELECT c.bucket, c.dim, c.key, c.events, c.starts, c.ends, c.heartbeats, {viewers}
+FROM (
+  SELECT date_trunc(:grain, bucket) AS bucket, dim, key, sum(events) AS events, sum(starts) AS starts,
+         sum(ends) AS ends, sum(heartbeats) AS heartbeats
+  FROM {src} WHERE bucket >= :lo AND bucket < :hi GROUP BY 1, 2, 3
+) c
+{join}
+""" + _REPLACE
+
+REBUILD_SQL = """
+INSERT INTO {dst} (bucket, dim, key, events, starts, ends, heartbeats, viewers)
+SELECT date_trunc(:grain, ts), g.dim, g.key, count(*),
+       count(*) FILTER (WHERE event_type = 'view_start'), count(*) FILTER (WHERE event_type = 'view_end'),
+       count(*) FILTER (WHERE event_type = 'heartbeat'), {viewers}
+FROM events, LATERAL (VALUES ('all', ''), ('country', country), ('video', video_id)) AS g(dim, key)
+WHERE ts >= :lo AND ts < :hi GROUP BY 1, 2, 3
+""" + _REPLACE
+
+DIMS = (("all", None), ("country", "country"), ("video", "video_id"))
+AGG_COLUMNS = ["bucket", "dim", "key", "events", "starts", "ends", "heartbeats", "viewers"]
+
+
+def second_rows(cols) -> list:
+    """
+    Per-second aggregates of one flush, from decoded columns (see src/wire.py):
+    tuples in AGG_COLUMNS order with bucket as epoch seconds, one per (second, dim, key).
+    """
+    et = cols["event_type"]
+    df = pd.DataFrame({
+        "bucket": cols["ts_us"] // 1_000_000,
+        "viewer_id": cols["viewer_id"], "country": cols["country"], "video_id": cols["video_id"],
+        "starts": et == "view_start", "ends": et == "view_end", "heartbeats": et == "heartbeat",
+    })
+    parts = []
+    for dim, col in DIMS:
+        g = (df.groupby(["bucket"] + ([col] if col else []), sort=False)
+               .agg(events=("viewer_id", "size"), starts=("starts", "sum"), ends=("ends", "sum"),
+                    heartbeats=("heartbeats", "sum"), viewers=("viewer_id", "nunique"))
+               .reset_index())
+        g["key"] = g[col] if col else ""
+        g["dim"] = dim
+        parts.append(g[AGG_COLUMNS])
+    agg = pd.concat(parts, ignore_index=True)
+    return list(zip(*(agg[c].tolist() for c in AGG_COLUMNS)))
+
+
+def upsert_seconds(cur, agg_rows):
+    """Add second_rows() output to rollup_second (run inside the flush transaction)."""
+    from psycopg2.extras import execute_values
+    if agg_rows:
+        execute_values(cur, UPSERT_SECOND_SQL, agg_rows,
+                       template="(to_timestamp(%s), %s, %s, %s, %s, %s, %s, %s)", page_size=1000)
+
+
+def _floor(t: datetime, grain: str) -> datetime:
+    t = t.astimezone(timezone.utc)
+    if grain == "hour":
+        return t.replace(minute=0, second=0, microsecond=0)
+    return t.replace(second=0, microsecond=0)
+
+
+def compact(grain: str, lo: datetime, hi: datetime, from_events: bool = False):
+    """
+    Replace `grain` ('minute' | 'hour') buckets in [lo, hi) from the next finer rollup,
+    or entirely from raw events with from_events=True (backfill). Idempotent.
+    """
+    lo = _floor(lo, grain)
+    hll = DISTINCT_MODE == "hll"
+    if from_events:
+        sql = REBUILD_SQL.format(dst=ROLLUP_TABLES[grain], viewers="0" if hll else f"count(DISTINCT {VIEWER_KEY})")
+    elif hll:
+        sql = COMPACT_SQL.format(dst=ROLLUP_TABLES[grain], src=ROLLUP_TABLES[FINER[grain]], viewers="0", join="")
+    else:
+        sql = COMPACT_SQL.format(dst=ROLLUP_TABLES[grain], src=ROLLUP_TABLES[FINER[grain]],
+                                 viewers="COALESCE(v.viewers, 0)",
+                                 join=f"LEFT JOIN ({_VIEWERS.format(viewer=VIEWER_KEY)}) v USING (bucket, dim, key)")
+    params = {"grain": grain, "lo": lo, "hi": hi}
+    with ENGINE.begin() as conn:
+        conn.execute(text(sql), params)
+        if hll:
+            if grain == "minute" or from_events:
+                keys, regs = _sketches_from_events(conn, params)
+            else:
+                keys, regs = _sketches_from_rollup(conn, FINER[grain], grain, lo, hi)
+            _store_sketches(conn, ROLLUP_TABLES[grain], keys, regs)
+
+
+def _sketches_from_events(conn, params):
+    """HLL registers per (bucket, dim, key) built in SQL from the raw rows."""
+    r = pd.read_sql(text(sketch.REGISTERS_SQL), conn, params=params)
+    if r.empty:
+        return pd.DataFrame(columns=["bucket", "dim", "key"]), np.zeros((0, 1 << sketch.HLL_P), np.uint8)
+    codes, keys = pd.MultiIndex.from_frame(r[["bucket", "dim", "key"]]).factorize()
+    regs = sketch.build(codes, r["idx"].to_numpy(), r["rank"].to_numpy(np.uint8), len(keys))
+    return keys.to_frame(index=False), regs
+
+
+def _sketches_from_rollup(conn, src_grain: str, grain: str, lo: datetime, hi: datetime):
+    """Merge the finer grain's stored sketches into `grain` buckets."""
+    r = pd.read_sql(
+        text(f"SELECT date_trunc(:grain, bucket) AS bucket, dim, key, viewers_hll FROM {ROLLUP_TABLES[src_grain]} "
+             f"WHERE bucket >= :lo AND bucket < :hi AND viewers_hll IS NOT NULL"),
+        conn, params={"grain": grain, "lo": lo, "hi": hi})
+    if r.empty:
+        return pd.DataFrame(columns=["bucket", "dim", "key"]), np.zeros((0, 1 << sketch.HLL_P), np.uint8)
+    codes, keys = pd.MultiIndex.from_frame(r[["bucket", "dim", "key"]]).factorize()
+    regs = np.zeros((len(keys), 1 << sketch.HLL_P), dtype=np.uint8)
+    for code, data in zip(codes, r["viewers_hll"]):
+        np.maximum(regs[code], sketch.from_bytes(data), out=regs[code])
+    return keys.to_frame(index=False), regs
+
+
+def _store_sketches(conn, table: str, keys: pd.DataFrame, regs: np.ndarray):
+    """Write sketches and their estimates onto rows the compaction just replaced."""
+    from psycopg2.extras import execute_values
+    if keys.empty:
+        return
+    est = np.rint(sketch.estimate(regs)).astype(np.int64).tolist()
+    rows = [(b, d, k, n, sketch.to_bytes(reg))
+            for (b, d, k), n, reg in zip(keys.itertuples(index=False, name=None), est, regs)]
+    with conn.connection.cursor() as cur:
+        execute_values(cur, f"""
+            UPDATE {table} AS r SET viewers = v.viewers, viewers_hll = v.hll
+            FROM (VALUES %s) AS v(bucket, dim, key, viewers, hll)
+            WHERE r.bucket = v.bucket AND r.dim = v.dim AND r.key = v.key
+        """, rows, template="(%s::timestamptz, %s, %s, %s::bigint, %s::bytea)", page_size=500)
+
+
+def distinct_viewers(window: str, dim: str = "country", grain: str = "minute") -> pd.DataFrame:
+    """
+    Unique viewers per key of `dim` over the last `window` (a Postgres interval) by
+    merging stored sketches, e.g. 15 minute sketches per country for '15 minutes'.
+    Returns columns ['key','viewers'] sorted descending.
+    """
+    r = pd.read_sql(
+        text(f"SELECT key, viewers_hll FROM {ROLLUP_TABLES[grain]} WHERE dim = :dim "
+             f"AND bucket > now() - CAST(:window AS interval) AND viewers_hll IS NOT NULL"),
+        ENGINE, params={"dim": dim, "window": window})
+    if r.empty:
+        return pd.DataFrame(columns=["key", "viewers"])
+    codes, keys = pd.factorize(r["key"])
+    regs = np.zeros((len(keys), 1 << sketch.HLL_P), dtype=np.uint8)
+    for code, data in zip(codes, r["viewers_hll"]):
+        np.maximum(regs[code], sketch.from_bytes(data), out=regs[code])
+    out = pd.DataFrame({"key": keys, "viewers": np.rint(sketch.estimate(regs)).astype(np.int64)})
+    return out.sort_values("viewers", ascending=False, ignore_index=True)
+
+
+_last_hour = None
+
+def compact_recent(now: datetime = None):
+    """
+    Periodic job: re-compact the last ROLLUP_LOOKBACK_MIN minutes (including the partial
+    current minute), the previous hour once it has closed, and expire old second buckets.
+    """
+    global _last_hour
+    now = now or datetime.now(timezone.utc)
+    compact("minute", now - timedelta(minutes=ROLLUP_LOOKBACK_MIN), now)
+    hour = _floor(now, "hour")
+    if _last_hour != hour:
+        compact("hour", hour - timedelta(hours=1), hour)
+        _last_hour = hour
+    with ENGINE.begin() as conn:
+        conn.execute(text("DELETE FROM rollup_second WHERE bucket < :cutoff"),
+                     {"cutoff": now - timedelta(hours=ROLLUP_SECOND_RETENTION_HOURS)})
+
+
+def backfill(hours: int, now: datetime = None):
+    """Rebuild minute and hour rollups for the last `hours` from raw events."""
+    now = now or datetime.now(timezone.utc)
+    lo = now - timedelta(hours=hours)
+    compact("minute", lo, now, from_events=True)
+    compact("hour", lo, now, from_events=True)
+
+
+def load_rollup(grain: str, window: str, dim: str = "all", key: str = "",
+                columns=("events", "starts", "ends", "heartbeats", "viewers")) -> pd.DataFrame:
+    """
+    Rows of one rollup series over the last `window` (a Postgres interval, e.g. '5 minutes').
+    bucket is tz-aware UTC even when no rows match (a naive empty column breaks .dt.tz_convert).
+    """
+    return pd.read_sql(
+        text(f"SELECT bucket, {', '.join(columns)} FROM {ROLLUP_TABLES[grain]} "
+             f"WHERE dim = :dim AND key = :key AND bucket > now() - CAST(:window AS interval) ORDER BY bucket"),
+        ENGINE, params={"dim": dim, "key": key, "window": window}, parse_dates={"bucket": {"utc": True}},
+    )
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="rollup maintenance")
+    ap.add_argument("command", choices=["compact", "backfill"])
+    ap.add_argument("--hours", type=int, default=24, help="backfill window")
+    args = ap.parse_args()
+    if args.command == "compact":
+        compact_recent()
+    else:
+        backfill(args.hours)
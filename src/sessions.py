@@ -0,0 +1,89 @@
+# src/sessions.py
+import os
+import time
+import numpy as np
+import pandas as pd
+
+# Sessionizer shared by the KPI, survival and forecast code. One session is one viewing of
+# one viewer; rules (also followed by KPIS_SQL in src/async_db.py, survival.IncrementalKM and
+# kpi_state.KpiState, which see the same events one at a time):
+#   - a session opens at a view_start; a repeated view_start of the same viewer closes the
+#     previous session at its last event and opens a new one
+#   - it closes at its view_end, or at its last event once no heartbeat arrived for
+#     SESSION_TIMEOUT_SEC (the producer sends one every 5-10 s)
+#   - events before a viewer's first view_start in the window, or after a closed session
+#     without a new view_start, belong to no session
+#   - replayed events (same viewer, ts and type) count once
+# Closed sessions are churned (an observed end); open ones run to `now` and are censored.
+SESSION_TIMEOUT_SEC = float(os.getenv("SESSION_TIMEOUT_SEC", "30"))
+
+COLUMNS = ["viewer_id", "start", "end", "dwell_sec", "churned"]
+
+
+def empty() -> pd.DataFrame:
+    return pd.DataFrame({"viewer_id": np.empty(0, object), "start": np.empty(0, np.int64),
+                         "end": np.empty(0, np.int64), "dwell_sec": np.empty(0, np.float64),
+                         "churned": np.empty(0, np.int8)})
+
+
+def to_us(ts) -> np.ndarray:
+    """int64 epoch µs from int64 µs (src/panels.py, EventCache) or datetimes."""
+    ts = pd.Series(ts)
+    if pd.api.types.is_integer_dtype(ts):
+        return ts.to_numpy(dtype=np.int64)
+    ts = pd.to_datetime(ts, utc=True)
+    return ((ts - pd.Timestamp(0, tz="UTC")) // pd.Timedelta(microseconds=1)).to_numpy(dtype=np.int64)
+
+
+def sessionize(events: pd.DataFrame, now=None, timeout_sec: float = SESSION_TIMEOUT_SEC) -> pd.DataFrame:
+    """
+    Compact session table from raw events.
+    Expects columns: ['ts','viewer_id','event_type'] (ts as epoch µs or datetimes).
+    Returns one row per session: ['viewer_id','start','end','dwell_sec','churned'] with
+    start/end as int64 epoch µs (panels.ts_datetime converts), end = now when still open.
+    Notes:
+      - One lexsort by (viewer, ts, start < heartbeat < end); a session boundary is a flag
+        per row and cumulative position gives each session's first/last row, so the
+        cost is the sort, with no per-viewer or per-session Python work.
+    """
+    if events is None or events.empty:
+        return empty()
+    now = time.time() if now is None else now
+    now_us = int((now.timestamp() if isinstance(now, pd.Timestamp) else now) * 1_000_000)
+    timeout_us = int(timeout_sec * 1_000_000)
+
+    ts = to_us(events["ts"])
+    viewer, names = pd.factorize(np.asarray(events["viewer_id"], dtype=object))
+    etype = np.asarray(events["event_type"], dtype=object)
+    rank = np.where(etype == "view_start", 0, np.where(etype == "view_end", 2, 1)).astype(np.int8)
+
+    order = np.lexsort((rank, ts, viewer))
+    ts, viewer, rank = ts[order], viewer[order], rank[order]
+    same_viewer = np.r_[False, viewer[1:] == viewer[:-1]]
+    dup = same_viewer & np.r_[False, (ts[1:] == ts[:-1]) & (rank[1:] == rank[:-1])]
+    if dup.any():
+        keep = ~dup
+        ts, viewer, rank, same_viewer = ts[keep], viewer[keep], rank[keep], same_viewer[keep]
+        same_viewer[0] = False
+        same_viewer[1:] = viewer[1:] == viewer[:-1]
+
+    # a new session starts at a viewer change, a view_start, after a view_end or a timeout gap
+    brk = ~same_viewer | (rank == 0)
+    brk[1:] |= (rank[:-1] == 2) | (ts[1:] - ts[:-1] > timeout_us)
+    first = np.flatnonzero(brk)
+    last = np.r_[first[1:] - 1, len(ts) - 1]
+    followed = np.r_[same_viewer[first[1:]], False]      # the same viewer's next session
+
+    ok = rank[first] == 0
+    first, last, followed = first[ok], last[ok], followed[ok]
+    start, seen = ts[first], ts[last]
+    closed = (rank[last] == 2) | followed | (now_us - seen > timeout_us)
+    end = np.where(closed, seen, np.maximum(now_us, start))
+
+    return pd.DataFrame({"viewer_id": names[viewer[first]], "start": start, "end": end,
+                         "dwell_sec": (end - start) / 1e6, "churned": closed.astype(np.int8)})
+
+
+def avg_dwell_sec(sessions: pd.DataFrame) -> float:
+    """Mean dwell over the session table (open sessions measured up to now)."""
+    return float(sessions["dwell_sec"].mean()) if len(sessions) else 0.0
@@ -0,0 +1,78 @@
+# src/sketch.py
+import hashlib, zlib
+import numpy as np
+import pandas as pd
+
+# HyperLogLog distinct counts. Registers are uint8 arrays of length 2**HLL_P, stored
+# zlib-compressed in the rollup tables' viewers_hll column; merging sketches is an
+# element-wise max, so per-minute sketches combine into any longer window.
+#
+# Hash: the first 32 bits of md5(viewer_id). The low HLL_P bits pick the register and
+# the rank is the leading-zero count of the remaining bits + 1. REGISTERS_SQL computes
+# exactly the same in Postgres, so sketches built in SQL and here are interchangeable.
+HLL_P = 12                  # 4096 registers, ~1.6% standard error
+HASH_BITS = 32
+
+
+def hash32(values) -> np.ndarray:
+    return np.fromiter((int(hashlib.md5(v.encode()).hexdigest()[:8], 16) for v in values),
+                       dtype=np.uint64, count=len(values))
+
+
+def index_rank(h: np.ndarray, p: int = HLL_P):
+    idx = (h & np.uint64((1 << p) - 1)).astype(np.int64)
+    w = (h >> np.uint64(p)).astype(np.float64)          # < 2**(32-p): exact in float64
+    bitlen = np.where(w > 0, np.frexp(w)[1], 0)
+    return idx, (HASH_BITS - p - bitlen + 1).astype(np.uint8)
+
+
+# (bucket, dim, key, idx, rank) per register touched in [lo, hi); see src/rollups.py.
+REGISTERS_SQL = """
+SELECT date_trunc(:grain, ts) AS bucket, g.dim, g.key, r.idx, max(r.rank) AS rank
+FROM events,
+     LATERAL (SELECT ('x' || substr(md5(viewer_id), 1, 8))::bit(32)::bigint AS h) hh,
+     LATERAL (SELECT hh.h & {mask} AS idx,
+                     {bits} - length(ltrim((hh.h >> {p})::bit(32)::text, '0')) + 1 AS rank) r,
+     LATERAL (VALUES ('all', ''), ('country', country), ('video', video_id)) AS g(dim, key)
+WHERE ts >= :lo AND ts < :hi
+GROUP BY 1, 2, 3, 4
+""".format(mask=(1 << HLL_P) - 1, bits=HASH_BITS - HLL_P, p=HLL_P)
+
+
+def build(groups: np.ndarray, idx: np.ndarray, rank: np.ndarray, n_groups: int, p: int = HLL_P) -> np.ndarray:
+    """Registers for n_groups sketches at once: shape (n_groups, 2**p)."""
+    regs = np.zeros(n_groups << p, dtype=np.uint8)
+    np.maximum.at(regs, (groups.astype(np.int64) << p) + idx, rank)
+    return regs.reshape(n_groups, 1 << p)
+
+
+def sketch_by(groups: np.ndarray, viewer_ids, n_groups: int, p: int = HLL_P) -> np.ndarray:
+    """Registers per group code (0..n_groups-1) from raw viewer ids."""
+    codes, uniq = pd.factorize(np.asarray(viewer_ids, dtype=object))   # hash each id once
+    idx, rank = index_rank(hash32(uniq), p)
+    return build(groups, idx[codes], rank[codes], n_groups, p)
+
+
+def estimate(regs: np.ndarray) -> np.ndarray:
+    """Cardinality estimate per row of a (n, m) register array (or a single sketch)."""
+    regs = np.atleast_2d(regs)
+    m = regs.shape[1]
+    alpha = 0.7213 / (1 + 1.079 / m)
+    raw = alpha * m * m / np.sum(np.exp2(-regs.astype(np.float64)), axis=1)
+    zeros = np.count_nonzero(regs == 0, axis=1)
+    # small-range correction (linear counting) while registers are still sparse
+    small = (raw <= 2.5 * m) & (zeros > 0)
+    linear = m * np.log(m / np.maximum(zeros, 1))
+    return np.where(small, linear, raw)
+
+
+def merge(sketches) -> np.ndarray:
+    return np.maximum.reduce(list(sketches))
+
+
+def to_bytes(regs: np.ndarray) -> bytes:
+    return zlib.compress(regs.astype(np.uint8).tobytes(), 1)
+
+
+def from_bytes(data: bytes) -> np.ndarray:
+    return np.frombuffer(zlib.decompress(data), dtype=np.uint8)
@@ -0,0 +1,80 @@
+# src/sqlite_store.py
+import os, sqlite3, argparse
+
+# SQLite store of the lightweight mode (event_sim.py writes, app.py reads through
+# src/event_cache.sqlite_source). ts is INTEGER epoch microseconds with an index, so the
+# dashboard's first windowed load is an index range scan and later refreshes read the rowid
+# range above their watermark. Writers open the file in WAL mode: the simulator's commits
+# append to the log and never block the dashboard's readers; synchronous=NORMAL syncs at
+# checkpoints only (a crash can lose the last commits, not corrupt the file). Rows go in one
+# transaction per batch with executemany.
+#   python -m src.sqlite_store info data/viewer.db
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")       # FULL | NORMAL | OFF
+SQLITE_BUSY_TIMEOUT_SEC = float(os.getenv("SQLITE_BUSY_TIMEOUT_SEC", "5"))
+
+CREATE_EVENTS_SQL = """
+CREATE TABLE IF NOT EXISTS events(
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  ts INTEGER NOT NULL,        -- epoch microseconds, UTC
+  viewer_id TEXT NOT NULL,
+  video_id TEXT NOT NULL,
+  event_type TEXT NOT NULL,   -- view_start | heartbeat | view_end
+  country TEXT NOT NULL
+)
+"""
+CREATE_INDEX_SQL = "CREATE INDEX IF NOT EXISTS idx_events_ts ON events(ts)"
+INSERT_SQL = "INSERT INTO events(ts, viewer_id, video_id, event_type, country) VALUES(?,?,?,?,?)"
+
+# ISO-8601 text -> epoch µs (julianday keeps millisecond precision)
+_TEXT_TS_US = "CAST(round((julianday(ts) - 2440587.5) * 86400000000) AS INTEGER)"
+
+
+def connect(path: str) -> sqlite3.Connection:
+    """Writer connection: WAL journal, SQLITE_SYNCHRONOUS, schema ensured."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    con = sqlite3.connect(path, timeout=SQLITE_BUSY_TIMEOUT_SEC, check_same_thread=False)
+    con.execute("PRAGMA journal_mode=WAL")
+    con.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+    ensure_schema(con)
+    return con
+
+
+def ensure_schema(con: sqlite3.Connection):
+    """Create events, converting a store with ISO-8601 TEXT ts (old event_sim.py) in place."""
+    cols = {row[1]: row[2].upper() for row in con.execute("PRAGMA table_info(events)")}
+    with con:
+        if cols.get("ts") == "TEXT":
+            con.execute("ALTER TABLE events RENAME TO events_text")
+            con.execute(CREATE_EVENTS_SQL)
+            n = con.execute(f"INSERT INTO events(id, ts, viewer_id, video_id, event_type, country) "
+                            f"SELECT id, {_TEXT_TS_US}, viewer_id, video_id, event_type, country "
+                            f"FROM events_text").rowcount
+            con.execute("DROP TABLE events_text")
+            print(f"[sqlite] converted {n:,} events to epoch-µs ts")
+        con.execute(CREATE_EVENTS_SQL)
+        con.execute(CREATE_INDEX_SQL)
+
+
+def insert_many(con: sqlite3.Connection, rows):
+    """Insert (ts_us, viewer_id, video_id, event_type, country) tuples in one transaction."""
+    with con:
+        con.executemany(INSERT_SQL, rows)
+
+
+def rows_from_cols(cols) -> list:
+    """Row tuples for insert_many() from wire.decode_batch() columns."""
+    return list(zip(cols["ts_us"].tolist(), cols["viewer_id"], cols["video_id"], cols["event_type"], cols["country"]))
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="SQLite demo store")
+    ap.add_argument("command", choices=["ensure", "info"])
+    ap.add_argument("path", nargs="?", default=os.environ.get("VIEWER_DB", "data/viewer.db"))
+    args = ap.parse_args()
+    con = connect(args.path)
+    if args.command == "info":
+        n, lo, hi = con.execute("SELECT count(*), min(ts), max(ts) FROM events").fetchone()
+        mode = con.execute("PRAGMA journal_mode").fetchone()[0]
+        print(f"[sqlite] {args.path}: {n:,} events, journal={mode}, "
+              f"span={(hi - lo) / 3.6e9 if n else 0:.1f}h, {os.path.getsize(args.path) / 2**20:.1f} MB")
+    con.close()
@@ -0,0 +1,115 @@
+# src/wire.py
+import json, struct
+from datetime import datetime, timezone
+import numpy as np
+
+# Every Kafka value is either a JSON object (first byte '{') or one fixed-layout binary
+# record whose first byte is BINARY_MAGIC. Consumers accept both, so producers can switch
+# formats without a coordinated deploy.
+BINARY_MAGIC = 0xB1
+EVENT_TYPES = ["", "view_start", "heartbeat", "view_end"]    # code = index
+EVENT_CODE = {name: i for i, name in enumerate(EVENT_TYPES) if name}
+
+# magic | event code | country | ts (epoch µs) | viewer_id | video_id   (32 bytes, little-endian)
+RECORD = np.dtype([("magic", "u1"), ("event", "u1"), ("country", "S2"), ("ts_us", "<i8"),
+                   ("viewer_id", "S12"), ("video_id", "S8")])
+_PACK = struct.Struct("<BB2sq12s8s")
+assert _PACK.size == RECORD.itemsize
+# byte positions of the text fields (ASCII only; checked on decode)
+_TEXT_BYTES = np.concatenate([np.arange(RECORD.fields[f][1], RECORD.fields[f][1] + RECORD[f].itemsize)
+                              for f in ("country", "viewer_id", "video_id")])
+
+
+def iso_from_us(ts_us: int) -> str:
+    return datetime.fromtimestamp(ts_us / 1e6, timezone.utc).isoformat()
+
+
+def encode_json(event: dict, ts_us: int) -> bytes:
+    return json.dumps({**event, "ts": iso_from_us(ts_us)}).encode("utf-8")
+
+
+def encode_binary(event: dict, ts_us: int) -> bytes:
+    """Pack one event; ValueError if a field does not fit the fixed layout (ASCII ids only)."""
+    viewer, video = event["viewer_id"].encode(), event["video_id"].encode()
+    country = event.get("country", "US").encode()
+    if len(viewer) > 12 or len(video) > 8 or len(country) != 2 or not (viewer + video + country).isascii():
+        raise ValueError(f"event does not fit the binary layout: {event}")
+    return _PACK.pack(BINARY_MAGIC, EVENT_CODE[event["event_type"]], country, ts_us, viewer, video)
+
+
+def encode(event: dict, ts_us: int, fmt: str = "json") -> bytes:
+    """Encode with fmt ('json' | 'binary'); events that don't fit the binary layout go as JSON."""
+    if fmt == "binary":
+        try:
+            return encode_binary(event, ts_us)
+        except (ValueError, KeyError):
+            pass
+    return encode_json(event, ts_us)
+
+
+def decode_batch(values):
+    """
+    Decode a list of Kafka values (mixed formats) into columnar arrays.
+    Returns (cols, bad) where cols has 'ts_us' (int64) and object arrays
+    'viewer_id', 'video_id', 'event_type', 'country' in input order, and bad lists
+    (index, exception) for values that could not be decoded. Binary records are decoded
+    together with one np.frombuffer over the joined batch. JSON timestamps without an
+    offset are UTC.
+    """
+    bins, bin_idx, bad = [], [], []
+    json_idx, ts, viewer, video, etype, country = [], [], [], [], [], []
+    for i, v in enumerate(values):
+        if v and v[0] == BINARY_MAGIC:
+            if len(v) == RECORD.itemsize:
+                bins.append(v)
+                bin_idx.append(i)
+            else:
+                bad.append((i, ValueError(f"binary record of {len(v)} bytes")))
+            continue
+        try:
+            e = json.loads(v)
+            dt = datetime.fromisoformat(e["ts"])
+            if dt.tzinfo is None:
+                dt = dt.replace(tzinfo=timezone.utc)
+            t = int(dt.timestamp() * 1_000_000)
+            fields = (e["viewer_id"], e["video_id"], e["event_type"], e.get("country", "US"))
+            # reject here what Postgres would reject for the whole batch (NOT NULL, enum)
+            if not all(isinstance(f, str) for f in fields):
+                raise TypeError(f"non-string field in {e}")
+            if fields[2] not in EVENT_CODE:
+                raise ValueError(f"unknown event_type {fields[2]!r}")
+            json_idx.append(i)
+            ts.append(t); viewer.append(fields[0]); video.append(fields[1])
+            etype.append(fields[2]); country.append(fields[3])
+        except Exception as ex:
+            bad.append((i, ex))
+
+    buf = b"".join(bins)
+    rec = np.frombuffer(buf, dtype=RECORD)
+    known = (rec["event"] > 0) & (rec["event"] < len(EVENT_TYPES))
+    ascii_ = (np.frombuffer(buf, dtype=np.uint8).reshape(-1, RECORD.itemsize)[:, _TEXT_BYTES] < 0x80).all(axis=1)
+    ok = known & ascii_
+    if not ok.all():
+        bad.extend((bin_idx[j], ValueError(f"unknown event code {rec['event'][j]}" if not known[j]
+                                           else "non-ASCII id in binary record")) for j in np.flatnonzero(~ok))
+        rec = rec[ok]
+        bin_idx = np.asarray(bin_idx)[ok]
+    cols = {
+        "ts_us": np.concatenate([rec["ts_us"], np.asarray(ts, dtype="int64")]),
+        "viewer_id": np.concatenate([rec["viewer_id"].astype("U12").astype(object), np.asarray(viewer, dtype=object)]),
+        "video_id": np.concatenate([rec["video_id"].astype("U8").astype(object), np.asarray(video, dtype=object)]),
+        "event_type": np.concatenate([np.asarray(EVENT_TYPES, dtype=object)[rec["event"]], np.asarray(etype, dtype=object)]),
+        "country": np.concatenate([rec["country"].astype("U2").astype(object), np.asarray(country, dtype=object)]),
+    }
+    if len(rec) and json_idx:
+        # mixed batch: back to input order (events of one partition stay in sequence)
+        order = np.argsort(np.concatenate([np.asarray(bin_idx, dtype=np.int64), np.asarray(json_idx, dtype=np.int64)]),
+                           kind="stable")
+        cols = {k: v[order] for k, v in cols.items()}
+    return cols, bad
+
+
+def to_rows(cols):
+    """Row tuples in writers.COLUMNS order, with ISO-8601 UTC timestamps."""
+    ts = np.datetime_as_string(cols["ts_us"].astype("datetime64[us]"), unit="us", timezone="UTC")
+    return list(zip(ts.tolist(), cols["viewer_id"], cols["video_id"], cols["event_type"], cols["country"]))
@@ -0,0 +1,95 @@
+# src/writers.py
+import csv, io
+from sqlalchemy import text
+
+COLUMNS = ("ts", "viewer_id", "video_id", "event_type", "country")
+
+# Writers insert `columns` (COLUMNS unless given); make_writer(..., keyed=True) wraps one
+# built over src/dims.FACT_COLUMNS so callers keep passing rows in COLUMNS order.
+# Every writer takes `hooks`: callables fn(cursor) run inside the same transaction after
+# the rows are written (e.g. rollup upserts), so both commit or roll back together.
+
+
+class ExecuteManyWriter:
+    """SQLAlchemy executemany of a parameterized INSERT (the original ingest path)."""
+    name = "executemany"
+
+    def __init__(self, engine, table: str = "events", columns=COLUMNS):
+        self.engine = engine
+        self.columns = columns
+        self.sql = text(f"INSERT INTO {table} ({', '.join(columns)}) "
+                        f"VALUES ({', '.join(':' + c for c in columns)})")
+
+    def write(self, rows, hooks=()):
+        """Insert row tuples (in columns order) and commit."""
+        with self.engine.begin() as conn:
+            conn.execute(self.sql, [dict(zip(self.columns, r)) for r in rows])
+            if hooks:
+                cur = conn.connection.cursor()
+                for hook in hooks:
+                    hook(cur)
+
+
+class _RawWriter:
+    """Runs write_rows(cursor, rows) and the hooks in one psycopg2 transaction."""
+
+    def __init__(self, engine):
+        self.engine = engine
+
+    def write(self, rows, hooks=()):
+        conn = self.engine.raw_connection()
+        try:
+            with conn.cursor() as cur:
+                self.write_rows(cur, rows)
+                for hook in hooks:
+                    hook(cur)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+
+class ExecuteValuesWriter(_RawWriter):
+    """psycopg2 execute_values: multi-row VALUES lists, page_size rows per statement."""
+    name = "values"
+
+    def __init__(self, engine, table: str = "events", columns=COLUMNS, page_size: int = 1000):
+        super().__init__(engine)
+        self.page_size = page_size
+        self.sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES %s"
+
+    def write_rows(self, cur, rows):
+        from psycopg2.extras import execute_values
+        execute_values(cur, self.sql, rows, page_size=self.page_size)
+
+
+class CopyWriter(_RawWriter):
+    """COPY ... FROM STDIN (CSV): one text buffer per batch, no per-row parameter binding."""
+    name = "copy"
+
+    def __init__(self, engine, table: str = "events", columns=COLUMNS):
+        super().__init__(engine)
+        self.sql = f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)"
+
+    def write_rows(self, cur, rows):
+        buf = io.StringIO()
+        csv.writer(buf, lineterminator="\n").writerows(rows)
+        buf.seek(0)
+        cur.copy_expert(self.sql, buf)
+
+
+WRITERS = {w.name: w for w in (ExecuteManyWriter, ExecuteValuesWriter, CopyWriter)}
+
+
+def make_writer(name: str, engine, table: str = "events", keyed: bool = False):
+    """Writer backend by name: 'executemany' | 'values' | 'copy'; keyed writes fact rows into `table`."""
+    try:
+        cls = WRITERS[name]
+    except KeyError:
+        raise ValueError(f"unknown writer {name!r}; expected one of {sorted(WRITERS)}") from None
+    if not keyed:
+        return cls(engine, table=table)
+    from src.dims import FACT_COLUMNS, KeyCache, KeyedWriter
+    return KeyedWriter(cls(engine, table=table, columns=FACT_COLUMNS), KeyCache(engine))